@@ -0,0 +1,107 @@
+"""
+Bytes on the wire and CPU cost of compressing typical Khipu payloads.
+
+Builds a `Payments.create` body whose `custom` field carries an XML shopping
+cart, and the matching `Payments.get` answer that repeats it back. For each
+codec it prints the body size and the time to compress and decompress it,
+which is what `CompressionPolicy(request_threshold=...)` and the
+`Accept-Encoding` negotiation trade against each other.
+
+    python benchmarks/compression.py --items 50
+"""
+
+import argparse
+import gzip
+import json
+import time
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _cart(items):
+    lines = ["<?xml version='1.0' encoding='UTF-8'?>", "<cart>"]
+    for i in range(items):
+        lines.append(
+            f'  <item sku="SKU-{i:05d}" qty="{1 + i % 3}"><name>Producto de prueba {i}</name>'
+            f"<price currency='CLP'>{1000 + i * 10}</price></item>"
+        )
+    lines.append("</cart>")
+    return "\n".join(lines)
+
+
+def _payloads(items):
+    create = {
+        "amount": 125990,
+        "currency": "CLP",
+        "subject": "Compra en tienda de prueba",
+        "transaction_id": "ORDER-2024-000123",
+        "payer_email": "cliente@example.cl",
+        "return_url": "https://tienda.example.cl/khipu/retorno",
+        "notify_url": "https://tienda.example.cl/khipu/notificacion",
+        "custom": _cart(items),
+    }
+    payment = {
+        **create,
+        "payment_id": "gqzdy6chjne9",
+        "payment_url": "https://khipu.com/payment/info/gqzdy6chjne9",
+        "simplified_transfer_url": "https://app.khipu.com/payment/simplified/gqzdy6chjne9",
+        "status": "done",
+        "status_detail": "normal",
+        "receiver_id": 985101,
+        "bank": "DemoBank",
+        "bank_id": "Bawdf",
+        "conciliation_date": "2024-06-01T12:00:00.000Z",
+    }
+    return {
+        "Payments.create body": json.dumps(create).encode("utf-8"),
+        "Payments.get answer": json.dumps(payment).encode("utf-8"),
+    }
+
+
+def _codecs():
+    codecs = [
+        ("identity", lambda b: b, lambda b: b),
+        ("gzip-1", lambda b: gzip.compress(b, 1, mtime=0), gzip.decompress),
+        ("gzip-6", lambda b: gzip.compress(b, 6, mtime=0), gzip.decompress),
+        ("deflate-6", lambda b: zlib.compress(b, 6), zlib.decompress),
+    ]
+    if brotli is not None:
+        codecs.append(("br-4", lambda b: brotli.compress(b, quality=4), brotli.decompress))
+    return codecs
+
+
+def _time(func, data, rounds):
+    start = time.process_time()
+    for _ in range(rounds):
+        func(data)
+    return (time.process_time() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=50, help="items in the XML cart")
+    parser.add_argument("--rounds", type=int, default=500)
+    args = parser.parse_args()
+
+    for name, payload in _payloads(args.items).items():
+        print(f"{name}, {args.items} cart items")
+        print(f"{'codec':<12} {'bytes':>8} {'ratio':>7} {'compress us':>12} {'decompress us':>14}")
+        for codec, compress, decompress in _codecs():
+            compressed = compress(payload)
+            assert decompress(compressed) == payload
+            print(
+                f"{codec:<12} {len(compressed):>8} {len(payload) / len(compressed):>7.1f} "
+                f"{_time(compress, payload, args.rounds) * 1e6:>12.1f} "
+                f"{_time(decompress, compressed, args.rounds) * 1e6:>14.1f}"
+            )
+        print()
+    if brotli is None:
+        print("brotli is not installed, br was skipped (pip install khipu-tools[brotli])")
+
+
+if __name__ == "__main__":
+    main()
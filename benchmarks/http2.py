@@ -0,0 +1,171 @@
+"""
+HTTP/1.1 vs HTTP/2 for a burst of concurrent `Payments.get` style polls.
+
+Runs two local stand-ins that answer every request after the same simulated
+server latency: a threaded HTTP/1.1 server used through `RequestsClient` and
+an h2 (cleartext, prior knowledge) server used through
+`HTTPXClient(http2=True)`, on both its sync and async paths. For each run it
+prints the wall time and the number of TCP connections the server accepted.
+
+    pip install -e .[http2]
+    python benchmarks/http2.py --requests 200 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import h2.config
+import h2.connection
+import h2.events
+
+from khipu_tools._http_client import HTTPXClient, RequestsClient
+
+BODY = json.dumps({"payment_id": "gqzdy6chjne9", "status": "pending"}).encode("utf-8")
+
+
+class _H1Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+
+class _H1Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+    connections = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+
+class _H2Protocol(asyncio.Protocol):
+    def __init__(self, server):
+        self.server = server
+
+    def connection_made(self, transport):
+        self.server.connections += 1
+        self.transport = transport
+        self.conn = h2.connection.H2Connection(config=h2.config.H2Configuration(client_side=False))
+        self.conn.initiate_connection()
+        self.transport.write(self.conn.data_to_send())
+
+    def data_received(self, data):
+        for event in self.conn.receive_data(data):
+            if isinstance(event, h2.events.RequestReceived):
+                asyncio.get_event_loop().call_later(self.server.latency, self._respond, event.stream_id)
+            elif isinstance(event, h2.events.DataReceived):
+                self.conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+        self.transport.write(self.conn.data_to_send())
+
+    def _respond(self, stream_id):
+        if self.transport.is_closing():
+            return
+        self.conn.send_headers(
+            stream_id,
+            [(":status", "200"), ("content-type", "application/json"), ("content-length", str(len(BODY)))],
+        )
+        self.conn.send_data(stream_id, BODY, end_stream=True)
+        self.transport.write(self.conn.data_to_send())
+
+
+class _H2Server:
+    def __init__(self, latency):
+        self.latency = latency
+        self.connections = 0
+        self.port = None
+        self._ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._run, daemon=True).start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        server = self._loop.run_until_complete(self._loop.create_server(lambda: _H2Protocol(self), "127.0.0.1", 0))
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+
+def _sync_burst(client, url, total, concurrency):
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        start = time.perf_counter()
+        results = list(executor.map(lambda _: client.request("get", url, {}), range(total)))
+        elapsed = time.perf_counter() - start
+    assert all(code == 200 for _, code, _ in results)
+    return elapsed
+
+
+def _async_burst(client, url, total, concurrency):
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                return await client.request_async("get", url, {})
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*[one() for _ in range(total)])
+        elapsed = time.perf_counter() - start
+        await client.close_async()
+        return elapsed, results
+
+    elapsed, results = asyncio.run(run())
+    assert all(code == 200 for _, code, _ in results)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02, help="simulated server time, in seconds")
+    args = parser.parse_args()
+
+    h1 = _H1Server(("127.0.0.1", 0), _H1Handler)
+    h1.latency = args.latency
+    threading.Thread(target=h1.serve_forever, daemon=True).start()
+    h1_url = "http://127.0.0.1:%d/v3/payments/gqzdy6chjne9" % h1.server_port
+
+    h2_server = _H2Server(args.latency)
+    h2_url = "http://127.0.0.1:%d/v3/payments/gqzdy6chjne9" % h2_server.port
+
+    rows = []
+
+    client = RequestsClient(pool_maxsize=args.concurrency)
+    elapsed = _sync_burst(client, h1_url, args.requests, args.concurrency)
+    client.close()
+    rows.append(("requests, HTTP/1.1, threads", elapsed, h1.connections))
+
+    client = HTTPXClient(http2=True, http1=False, allow_sync_methods=True)
+    elapsed = _sync_burst(client, h2_url, args.requests, args.concurrency)
+    client.close()
+    rows.append(("httpx, HTTP/2, threads", elapsed, h2_server.connections))
+
+    before = h2_server.connections
+    client = HTTPXClient(http2=True, http1=False)
+    elapsed = _async_burst(client, h2_url, args.requests, args.concurrency)
+    rows.append(("httpx, HTTP/2, asyncio", elapsed, h2_server.connections - before))
+
+    print(f"{args.requests} GETs, concurrency {args.concurrency}, server latency {args.latency * 1000:.0f}ms")
+    print(f"{'transport':<30} {'wall (s)':>10} {'req/s':>10} {'connections':>12}")
+    for name, elapsed, connections in rows:
+        print(f"{name:<30} {elapsed:>10.3f} {args.requests / elapsed:>10.0f} {connections:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Cost of the library's own request path, with the network taken out.
+
+Runs `Payments.get`, `Payments.create` and `Predict.get` against an HTTP client that answers
+from memory, so what is left is the work `_APIRequestor` does per call:
+splitting the options out of the params, picking the requestor, building the
+headers, the URL and the body, and turning the answer into a `KhipuObject`.
+The `setup` rows time the steps before the HTTP client is called, alone,
+and `protocol` the whole call through `khipu_tools._protocol` with no HTTP
+client at all.
+`subscription` creates a payment with `Payments.create` and `prepared` sends
+the same one from a `Payments.prepare` template. The `middleware` rows run
+`Payments.get` through an empty `MiddlewareChain` and through three
+middleware that pass the call on. `log_debug (off)` is one log call with
+logging disabled, the default, and `logging on` is `Payments.get` with the
+"khipu" logger at DEBUG.
+For each call it prints the time per call and, measured with `tracemalloc`,
+the memory a call holds at its peak.
+
+    python benchmarks/request_overhead.py --calls 20000
+"""
+
+import argparse
+import json
+import logging
+import time
+import tracemalloc
+
+import khipu_tools
+from khipu_tools._api_requestor import _APIRequestor
+from khipu_tools._http_client import HTTPClient
+from khipu_tools._protocol import parse_response, to_khipu_object
+from khipu_tools._request_options import extract_options_from_dict
+from khipu_tools._util import log_debug, logger
+
+BODY = json.dumps({"payment_id": "gqzdy6chjne9", "status": "pending", "amount": 1000})
+
+
+class _CannedClient(HTTPClient):
+    name = "canned"
+
+    def request(self, method, url, headers, post_data=None, *, timeout=None, read_timeout=None, _usage=None):
+        return BODY, 200, {}
+
+    def close(self):
+        pass
+
+
+def _setup(params, method="get", url="/v3/payments/gqzdy6chjne9", schema=None):
+    # What happens before the HTTP client is called, on its own.
+    options, params = extract_options_from_dict(params)
+    if schema is not None:
+        params = schema.encode(params)
+    requestor = _APIRequestor._global_instance()._replace_options(options)
+    return requestor._build_request(method, url, params, options, base_address="api", api_mode="V3")
+
+
+def _protocol():
+    # Payments.get without I/O: build the request, parse a canned answer.
+    requestor = _APIRequestor._global_instance()
+    request = requestor._build_request("get", "/v3/payments/gqzdy6chjne9", {}, None, base_address="api")
+    return to_khipu_object(request, parse_response(BODY, 200, {}), requestor)
+
+
+def _with_middleware(chain):
+    def call():
+        khipu_tools.middleware = chain
+        try:
+            return khipu_tools.Payments.get(payment_id="gqzdy6chjne9")
+        finally:
+            khipu_tools.middleware = None
+
+    return call
+
+
+def _with_logging():
+    logger.setLevel(logging.DEBUG)
+    try:
+        return khipu_tools.Payments.get(payment_id="gqzdy6chjne9")
+    finally:
+        logger.setLevel(logging.NOTSET)
+
+
+def _calls():
+    template = khipu_tools.Payments.prepare(
+        currency="CLP",
+        subject="Suscripción mensual",
+        notify_url="https://tienda.example.cl/khipu/notificacion",
+        return_url="https://tienda.example.cl/khipu/retorno",
+        send_email=True,
+        payer_name="Cliente",
+    )
+    varying = {"amount": "9990", "transaction_id": "SUB-000123", "payer_email": "cliente@example.cl"}
+    return {
+        "setup": lambda: _setup({}),
+        "setup (api_key)": lambda: _setup({"api_key": "other"}),
+        "setup (subscription)": lambda: _setup(
+            {**template._constant, **varying}, "post", "/v3/payments", khipu_tools.Payments._create_schema
+        ),
+        "setup (prepared)": lambda: template._prepare_call(varying),
+        "protocol": _protocol,
+        "Payments.get": lambda: khipu_tools.Payments.get(payment_id="gqzdy6chjne9"),
+        "middleware (empty)": _with_middleware(khipu_tools.MiddlewareChain()),
+        "middleware (3)": _with_middleware(
+            khipu_tools.MiddlewareChain([type(f"Pass{i}", (khipu_tools.Middleware,), {})() for i in range(3)])
+        ),
+        "log_debug (off)": lambda: log_debug("API response body", body=BODY),
+        "logging on": _with_logging,
+        "Payments.create": lambda: khipu_tools.Payments.create(amount=1000, currency="CLP", subject="Prueba"),
+        "subscription": lambda: khipu_tools.Payments.create(**template._constant, **varying),
+        "prepared": lambda: template.send(**varying),
+        "Predict.get": lambda: khipu_tools.Predict.get(
+            payer_email="ana@example.cl", bank_id="SDdGj", amount="1000", currency="CLP"
+        ),
+    }
+
+
+def _time_per_call(call, total):
+    started = time.perf_counter()
+    for _ in range(total):
+        call()
+    return (time.perf_counter() - started) / total
+
+
+def _allocations_per_call(call, total):
+    """
+    Bytes allocated at the peak of one call, above what was live before it,
+    averaged over `total` calls.
+    """
+    peak = 0
+    tracemalloc.start()
+    for _ in range(total):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        call()
+        peak += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return peak / total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+
+    khipu_tools.api_key = "bench"
+    khipu_tools.default_http_client = _CannedClient()
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    print(f"{'call':<22} {'us/call':>10} {'peak KiB/call':>15}")
+    for name, call in _calls().items():
+        for _ in range(200):
+            call()
+        per_call = _time_per_call(call, args.calls)
+        peak = _allocations_per_call(call, max(args.calls // 10, 100))
+        print(f"{name:<22} {per_call * 1e6:>10.1f} {peak / 1024:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Per-request client overhead of `RequestsClient` vs `Urllib3Client`.
+
+Serves a `Payments.get` style answer from a keep-alive HTTP/1.1 server running
+in a separate process, then polls it sequentially from one thread with each
+transport. Since the server doesn't share the process, the CPU time measured
+here is the client's own cost per request (building the request, going through
+the pool, parsing the answer).
+
+    python benchmarks/transport_overhead.py --requests 5000
+"""
+
+import argparse
+import json
+import multiprocessing
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from khipu_tools._http_client import RequestsClient, Urllib3Client
+
+BODY = json.dumps({"payment_id": "gqzdy6chjne9", "status": "pending", "amount": 1000}).encode("utf-8")
+HEADERS = {"User-Agent": "khipu_tools/bench", "x-api-key": "bench", "Content-Type": "application/json"}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+
+def _serve(port_queue):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+def _run(client, url, total):
+    for _ in range(50):
+        client.request("get", url, HEADERS)
+    wall, cpu = time.perf_counter(), time.process_time()
+    for _ in range(total):
+        _, code, _ = client.request("get", url, HEADERS)
+        assert code == 200
+    return time.perf_counter() - wall, time.process_time() - cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve, args=(port_queue,), daemon=True)
+    server.start()
+    url = "http://127.0.0.1:%d/v3/payments/gqzdy6chjne9" % port_queue.get()
+
+    rows = []
+    for name, client in (("requests", RequestsClient()), ("urllib3", Urllib3Client())):
+        wall, cpu = _run(client, url, args.requests)
+        client.close()
+        rows.append((name, wall, cpu))
+    server.terminate()
+
+    print(f"{args.requests} sequential GETs over one keep-alive connection")
+    print(f"{'transport':<12} {'wall (s)':>10} {'us/req':>10} {'cpu us/req':>12}")
+    for name, wall, cpu in rows:
+        print(f"{name:<12} {wall:>10.3f} {wall / args.requests * 1e6:>10.0f} {cpu / args.requests * 1e6:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
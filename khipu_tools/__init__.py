@@ -3,10 +3,13 @@ from khipu_tools._payments import Payments as Payments
 from khipu_tools._banks import Banks as Banks
 from khipu_tools._http_client import (
     new_default_http_client as new_default_http_client,
+    new_http_client_async_fallback,
 )
 from khipu_tools._api_resource import APIResource as APIResource
 from khipu_tools._khipu_client import KhipuClient as KhipuClient
-from typing import Optional
+from khipu_tools._khipu_client import AsyncKhipuClient as AsyncKhipuClient
+from collections.abc import Sequence
+from typing import Optional, Union
 
 from typing import Literal
 
@@ -19,23 +22,48 @@ from khipu_tools._version import VERSION as VERSION
 DEFAULT_API_BASE: str = "https://payment-api.khipu.com"
 
 api_key: Optional[str] = None
-api_base: str = DEFAULT_API_BASE
+# One URL, or several equivalent ones (a list or an `EndpointSet`) to spread calls over.
+api_base: Union[str, Sequence[str], "EndpointSet"] = DEFAULT_API_BASE
 api_version: str = _ApiVersion.CURRENT
 default_http_client: Optional["HTTPClient"] = None
+# Build default_http_client as an HTTP/2 HTTPXClient (requires khipu-tools[http2]).
+http2: bool = False
+# Off by default: Khipu has no idempotency keys, so retries are opted into per client or per call.
+max_network_retries: int = 0
+rate_limiter: Optional["RateLimiter"] = None
+priority_lanes: Optional["PriorityLanes"] = None
+middleware: Optional["MiddlewareChain"] = None
 app_info: Optional[AppInfo] = None
+# None picks orjson when it's installed and the standard library otherwise.
+json_codec: Optional["JSONCodec"] = None
 
 
-def ensure_default_http_client():
-    _init_default_http_client()
+def ensure_default_http_client(warmup: bool = False, connections: int = 1) -> "HTTPClient":
+    """
+    Creates `default_http_client` if it doesn't exist yet. With `warmup=True`
+    it also resolves `api_base` and opens `connections` keep-alive connections
+    to it, e.g. when a worker boots and before it takes traffic.
+    """
+    if default_http_client is None:
+        _init_default_http_client()
+    assert default_http_client is not None
+    if warmup:
+        default_http_client.warmup(_endpoint_urls(_as_endpoints(api_base)), connections)
+    return default_http_client
 
 
 def _init_default_http_client():
     global default_http_client
 
-    default_http_client = new_default_http_client()
+    default_http_client = new_default_http_client(
+        http2=http2,
+        async_fallback_client=None if http2 else new_http_client_async_fallback(),
+    )
 
 
 log: Optional[Literal["debug", "info"]] = None
+# None redacts the payer's data and cuts bodies at 2048 characters.
+log_policy: Optional["LogPolicy"] = None
 
 
 def set_app_info(
@@ -52,3 +80,28 @@ def set_app_info(
 
 
 # Infrastructure types
+from khipu_tools._http_client import (  # noqa: E402
+    HTTPClient as HTTPClient,
+    HTTPXClient as HTTPXClient,
+    RequestsClient as RequestsClient,
+    Urllib3Client as Urllib3Client,
+)
+from khipu_tools._retry import RetryBudget as RetryBudget  # noqa: E402
+from khipu_tools._circuit_breaker import CircuitBreaker as CircuitBreaker  # noqa: E402
+from khipu_tools._hedging import HedgePolicy as HedgePolicy  # noqa: E402
+from khipu_tools._rate_limiter import RateLimiter as RateLimiter  # noqa: E402
+from khipu_tools._concurrency import AdaptiveConcurrencyLimiter as AdaptiveConcurrencyLimiter  # noqa: E402
+from khipu_tools._adaptive_timeouts import AdaptiveTimeouts as AdaptiveTimeouts  # noqa: E402
+from khipu_tools._dns import DNSCache as DNSCache  # noqa: E402
+from khipu_tools._compression import CompressionPolicy as CompressionPolicy  # noqa: E402
+from khipu_tools._endpoints import EndpointSet as EndpointSet  # noqa: E402
+from khipu_tools._endpoints import _as_endpoints, _endpoint_urls  # noqa: E402
+from khipu_tools._lanes import Lane as Lane  # noqa: E402
+from khipu_tools._lanes import PriorityLanes as PriorityLanes  # noqa: E402
+from khipu_tools._json import JSONCodec as JSONCodec  # noqa: E402
+from khipu_tools._json import OrjsonCodec as OrjsonCodec  # noqa: E402
+from khipu_tools._json import StdlibJSONCodec as StdlibJSONCodec  # noqa: E402
+from khipu_tools._prepared import PreparedRequest as PreparedRequest  # noqa: E402
+from khipu_tools._middleware import Middleware as Middleware  # noqa: E402
+from khipu_tools._middleware import MiddlewareChain as MiddlewareChain  # noqa: E402
+from khipu_tools._log_policy import LogPolicy as LogPolicy  # noqa: E402
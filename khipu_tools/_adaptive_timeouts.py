@@ -0,0 +1,88 @@
+import threading
+from collections.abc import Mapping
+from typing import Optional
+
+from khipu_tools import _fork
+from khipu_tools._latency import LatencyHistogram
+
+
+class AdaptiveTimeouts:
+    """
+    Read timeouts learned per route from the latencies the client observes:
+    `multiplier` times the route's `percentile` latency, clamped to
+    `[min_timeout, max_timeout]`. Fast endpoints such as `Banks.get` end up
+    with a tight timeout while slow ones keep room to answer.
+
+    A route gets a learned timeout once `min_samples` latencies were recorded
+    for it, and the value is refreshed every `refresh_every` new samples.
+    Until then the client's own timeout applies, or a value restored with
+    `load()`. `snapshot()` returns the learned values so they can be persisted
+    and loaded back on the next start.
+    """
+
+    def __init__(
+        self,
+        multiplier: float = 3.0,
+        percentile: float = 99.0,
+        min_timeout: float = 1.0,
+        max_timeout: Optional[float] = None,
+        min_samples: int = 50,
+        refresh_every: int = 20,
+    ):
+        if multiplier <= 0:
+            raise ValueError("multiplier must be > 0")
+        self.multiplier = multiplier
+        self.percentile = percentile
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.min_samples = min_samples
+        self.refresh_every = refresh_every
+        self._learned: dict[str, float] = {}
+        self._counts: dict[str, int] = {}
+        self._lock = threading.Lock()
+        _fork.register(self)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+
+    def _clamp(self, timeout: float) -> float:
+        timeout = max(self.min_timeout, timeout)
+        if self.max_timeout is not None:
+            timeout = min(self.max_timeout, timeout)
+        return timeout
+
+    def read_timeout(self, route: str, histogram: LatencyHistogram) -> Optional[float]:
+        """
+        The read timeout to use for the next call to `route`, or None to keep
+        the client's default.
+        """
+        count = histogram.count
+        if count >= self.min_samples and abs(count - self._counts.get(route, 0)) >= self.refresh_every:
+            latency = histogram.percentile(self.percentile)
+            if latency is not None:
+                with self._lock:
+                    self._learned[route] = self._clamp(latency * self.multiplier)
+                    self._counts[route] = count
+        return self._learned.get(route)
+
+    def snapshot(self) -> dict[str, float]:
+        """
+        Learned read timeout per route, in seconds.
+        """
+        with self._lock:
+            return dict(self._learned)
+
+    def load(self, timeouts: Mapping[str, float]) -> None:
+        """
+        Restores timeouts saved with `snapshot()`. They are used until the
+        route has enough fresh samples to learn its own value again.
+        """
+        with self._lock:
+            for route, timeout in timeouts.items():
+                self._learned[route] = self._clamp(float(timeout))
+                self._counts[route] = 0
+
+    def reset(self) -> None:
+        with self._lock:
+            self._learned.clear()
+            self._counts.clear()
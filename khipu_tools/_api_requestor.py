@@ -1,7 +1,7 @@
-import json
-from collections.abc import Mapping
-from typing import TYPE_CHECKING, Any, ClassVar, Optional, cast
-from urllib.parse import parse_qs, urlencode, urlsplit, urlunsplit
+import time
+from collections.abc import AsyncIterator, Iterator, Mapping
+from contextlib import asynccontextmanager, contextmanager
+from typing import TYPE_CHECKING, Any, ClassVar, Optional
 
 from typing import Literal
 from typing_extensions import Unpack
@@ -9,23 +9,36 @@ from typing_extensions import Unpack
 # breaking circular dependency
 import khipu_tools
 import khipu_tools._error as error
+from khipu_tools import _fork
 from khipu_tools._api_mode import ApiMode
 from khipu_tools._base_address import BaseAddress
-from khipu_tools._encode import _api_encode, _json_encode_date_callback
+from khipu_tools._deadline import Deadline
+from khipu_tools._endpoints import EndpointSet
 from khipu_tools._http_client import (
+    IDEMPOTENT_METHODS,
     HTTPClient,
     new_default_http_client,
     new_http_client_async_fallback,
 )
 from khipu_tools._khipu_response import KhipuResponse
-from khipu_tools._request_options import RequestOptions, merge_options
-from khipu_tools._requestor_options import RequestorOptions, _GlobalRequestorOptions
-from khipu_tools._util import (
-    _convert_to_khipu_object,
-    get_api_mode,
-    log_debug,
-    log_info,
+from khipu_tools._lanes import PriorityLanes
+from khipu_tools._log_policy import get_log_policy
+from khipu_tools._middleware import MiddlewareChain
+from khipu_tools._protocol import (
+    KhipuRequest,
+    build_request,
+    parse_response,
+    request_headers,
+    to_khipu_object,
 )
+from khipu_tools._rate_limiter import RateLimiter
+from khipu_tools._request_options import RequestOptions
+from khipu_tools._requestor_options import (
+    RequestorOptions,
+    _GlobalRequestorOptions,
+    _OverriddenRequestorOptions,
+)
+from khipu_tools._util import get_api_mode, log_debug, log_enabled, log_info
 
 if TYPE_CHECKING:
     from khipu_tools._khipu_object import KhipuObject
@@ -35,6 +48,12 @@ HttpVerb = Literal["get", "post", "delete"]
 # Lazily initialized
 _default_proxy: Optional[str] = None
 
+# Answers that say the endpoint (a proxy or gateway) failed, not the request.
+_FAILOVER_STATUS_CODES = frozenset([502, 503, 504])
+
+# Bounds the requestors kept per API key and retries override.
+_MAX_CACHED = 64
+
 
 class _APIRequestor:
     _instance: ClassVar["_APIRequestor|None"] = None
@@ -43,11 +62,18 @@ class _APIRequestor:
         self,
         options: Optional[RequestorOptions] = None,
         client: Optional[HTTPClient] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        lanes: Optional[PriorityLanes] = None,
+        middleware: Optional[MiddlewareChain] = None,
     ):
         if options is None:
             options = RequestorOptions()
         self._options = options
         self._client = client
+        self._rate_limiter = rate_limiter
+        self._lanes = lanes
+        self._middleware = middleware
+        self._overrides: dict[tuple[Optional[str], Optional[int]], _APIRequestor] = {}
 
     def _get_http_client(self) -> HTTPClient:
         client = self._client
@@ -60,7 +86,8 @@ class _APIRequestor:
                     "proxy": None,
                 }
                 khipu_tools.default_http_client = new_default_http_client(
-                    async_fallback_client=new_http_client_async_fallback(**kwargs),
+                    http2=khipu_tools.http2,
+                    async_fallback_client=None if khipu_tools.http2 else new_http_client_async_fallback(**kwargs),
                     **kwargs,
                 )
                 _default_proxy = None
@@ -78,15 +105,93 @@ class _APIRequestor:
             return khipu_tools.default_http_client
         return client
 
+    def _get_rate_limiter(self) -> Optional[RateLimiter]:
+        if self._rate_limiter is not None:
+            return self._rate_limiter
+        # Module level calls follow the module level configuration.
+        if self._client is None:
+            return khipu_tools.rate_limiter
+        return None
+
+    def _get_lanes(self) -> Optional[PriorityLanes]:
+        if self._lanes is not None:
+            return self._lanes
+        if self._client is None:
+            return khipu_tools.priority_lanes
+        return None
+
+    def _get_middleware(self) -> Optional[MiddlewareChain]:
+        if self._middleware is not None:
+            return self._middleware
+        if self._client is None:
+            return khipu_tools.middleware
+        return None
+
+    @contextmanager
+    def _lane_client(self, request_options: RequestOptions, deadline: Optional[Deadline]) -> Iterator[HTTPClient]:
+        """
+        The HTTP client for this call: the one of its priority lane, holding
+        a slot in the lane until the call is done, or the usual one.
+        """
+        lanes = self._get_lanes()
+        if lanes is None:
+            yield self._get_http_client()
+            return
+        lane = lanes.acquire(
+            request_options.get("priority"),
+            timeout=deadline.remaining() if deadline is not None else None,
+        )
+        try:
+            yield lane.http_client
+        finally:
+            lanes.release(lane)
+
+    @asynccontextmanager
+    async def _lane_client_async(
+        self, request_options: RequestOptions, deadline: Optional[Deadline]
+    ) -> AsyncIterator[HTTPClient]:
+        lanes = self._get_lanes()
+        if lanes is None:
+            yield self._get_http_client()
+            return
+        lane = await lanes.acquire_async(
+            request_options.get("priority"),
+            self._get_http_client().sleep_async,
+            timeout=deadline.remaining() if deadline is not None else None,
+        )
+        try:
+            yield lane.http_client
+        finally:
+            lanes.release(lane)
+
     def _replace_options(self, options: Optional[RequestOptions]) -> "_APIRequestor":
-        options = options or {}
-        new_options = self._options.to_dict()
-        for key in [
-            "api_key",
-        ]:
-            if key in options and options[key] is not None:
-                new_options[key] = options[key]
-        return _APIRequestor(options=RequestorOptions(**new_options), client=self._client)
+        """
+        This requestor with the API key and retries of `options`. Requestors
+        don't change once built, so the same one is handed out for the same
+        overrides, and this one when there are none.
+        """
+        if not options:
+            return self
+        api_key = options.get("api_key")
+        max_network_retries = options.get("max_network_retries")
+        if api_key is None and max_network_retries is None:
+            return self
+        key = (api_key, max_network_retries)
+        requestor = self._overrides.get(key)
+        if requestor is None:
+            if len(self._overrides) >= _MAX_CACHED:
+                self._overrides.clear()
+            requestor = self._overrides.setdefault(
+                key,
+                _APIRequestor(
+                    options=_OverriddenRequestorOptions(self._options, api_key, max_network_retries),
+                    client=self._client,
+                    rate_limiter=self._rate_limiter,
+                    lanes=self._lanes,
+                    middleware=self._middleware,
+                ),
+            )
+        return requestor
 
     @property
     def api_key(self):
@@ -96,6 +201,10 @@ class _APIRequestor:
     def base_addresses(self):
         return self._options.base_addresses
 
+    @classmethod
+    def _after_fork(cls) -> None:
+        cls._instance = None
+
     @classmethod
     def _global_instance(cls):
         if cls._instance is None:
@@ -108,15 +217,6 @@ class _APIRequestor:
     ) -> "_APIRequestor":
         return _APIRequestor._global_instance()._replace_options(params)
 
-    @classmethod
-    def _format_app_info(cls, info):
-        str = info["name"]
-        if info["version"]:
-            str += "/{}".format(info["version"])
-        if info["url"]:
-            str += " ({})".format(info["url"])
-        return str
-
     def request(
         self,
         method: str,
@@ -126,41 +226,51 @@ class _APIRequestor:
         *,
         base_address: BaseAddress,
     ) -> "KhipuObject":
-        api_mode = get_api_mode(url)
         requestor = self._replace_options(options)
-        rbody, rcode, rheaders = requestor.request_raw(
-            method.lower(),
+        request = requestor._build_request(method.lower(), url, params, options, base_address=base_address)
+        timings: dict[str, float] = {}
+        rbody, rcode, rheaders = requestor._send(request, timings)
+        return to_khipu_object(request, parse_response(rbody, rcode, rheaders, timings), requestor)
+
+    async def request_async(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Mapping[str, Any]] = None,
+        options: Optional[RequestOptions] = None,
+        *,
+        base_address: BaseAddress,
+    ) -> "KhipuObject":
+        requestor = self._replace_options(options)
+        request = requestor._build_request(method.lower(), url, params, options, base_address=base_address)
+        timings: dict[str, float] = {}
+        rbody, rcode, rheaders = await requestor._send_async(request, timings)
+        return to_khipu_object(request, parse_response(rbody, rcode, rheaders, timings), requestor)
+
+    def request_headers(self, method: HttpVerb, api_mode: ApiMode, options: RequestOptions) -> Mapping[str, str]:
+        return request_headers(options.get("api_key"))
+
+    def _build_request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Mapping[str, Any]] = None,
+        options: Optional[RequestOptions] = None,
+        *,
+        base_address: BaseAddress,
+        api_mode: Optional[ApiMode] = None,
+    ) -> KhipuRequest:
+        return build_request(
+            self._options,
+            method,
             url,
             params,
-            api_mode=api_mode,
+            options,
             base_address=base_address,
+            api_mode=api_mode or get_api_mode(url),
         )
-        resp = requestor._interpret_response(rbody, rcode, rheaders, api_mode)
 
-        obj = _convert_to_khipu_object(
-            resp=resp,
-            params=params,
-            requestor=requestor,
-            api_mode=api_mode,
-        )
-
-        return obj
-
-    def request_headers(self, method: HttpVerb, api_mode: ApiMode, options: RequestOptions):
-        user_agent = f"khipu_tools/{khipu_tools.VERSION}"
-        if khipu_tools.app_info:
-            user_agent += " " + self._format_app_info(khipu_tools.app_info)
-
-        headers: dict[str, str] = {
-            "User-Agent": user_agent,
-            "x-api-key": options.get("api_key"),
-        }
-
-        headers["Content-Type"] = "application/json"
-
-        return headers
-
-    def _args_for_request_with_retries(
+    def request_raw(
         self,
         method: str,
         url: str,
@@ -169,94 +279,105 @@ class _APIRequestor:
         *,
         base_address: BaseAddress,
         api_mode: ApiMode,
-    ):
+        timings: Optional[dict[str, float]] = None,
+    ) -> tuple[object, int, Mapping[str, str]]:
+        request = self._build_request(method, url, params, options, base_address=base_address, api_mode=api_mode)
+        return self._send(request, timings)
+
+    def _send(
+        self, request: KhipuRequest, timings: Optional[dict[str, float]] = None
+    ) -> tuple[object, int, Mapping[str, str]]:
         """
-        Mechanism for issuing an API call.  Used by request_raw and request_raw_async.
+        Sends `request` through the middleware chain, if any, recording the
+        time of each middleware in `timings`.
         """
-        request_options = merge_options(self._options, options)
-
-        if request_options.get("api_key") is None:
-            raise error.AuthenticationError("No API key provided.")
+        middleware = self._get_middleware()
+        if not middleware:
+            return self._transmit(request)
+        return middleware.send(request, self._transmit, timings)
 
-        abs_url = "{}{}".format(
-            self._options.base_addresses.get(base_address),
-            url,
-        )
+    def _transmit(self, request: KhipuRequest) -> tuple[object, int, Mapping[str, str]]:
+        """
+        Sends `request` and returns the raw answer. This and
+        `_transmit_async` are the only parts that do I/O: the rate limiter,
+        the priority lanes, the endpoint failover and the HTTP client.
+        """
+        sampled = self._log_request(request)
+
+        options = request.options
+        deadline = request.deadline
+        rate_limiter = self._get_rate_limiter()
+        if rate_limiter is not None:
+            rate_limiter.acquire(
+                options["api_key"],
+                block=options.get("rate_limit_block"),
+                timeout=deadline.remaining() if deadline is not None else None,
+            )
 
-        params = params or {}
-        if params and (method == "get" or method == "delete"):
-            # if we're sending params in the querystring, then we have to make sure we're not
-            # duplicating anything we got back from the server already (like in a list iterator)
-            # so, we parse the querystring the server sends back so we can merge with
-            # what we (or the user) are trying to send
-            existing_params = {}
-            for k, v in parse_qs(urlsplit(url).query).items():
-                # note: server sends back "expand[]" but users supply "expand", so we
-                # strip the brackets from the key name
-                if k.endswith("[]"):
-                    existing_params[k[:-2]] = v
-                else:
-                    # all querystrings are pulled out as lists.
-                    # We want to keep the querystrings that actually are lists, but flatten
-                    # the ones that are single values
-                    existing_params[k] = v[0] if len(v) == 1 else v
-
-            params = {
-                **existing_params,
-                # user_supplied params take precedence over server params
-                **params,
-            }
-
-        encoded_params = urlencode(list(_api_encode(params or {}, api_mode)))
-
-        # Don't use strict form encoding by changing the square bracket control
-        # characters back to their literals. This is fine by the server, and
-        # makes these parameter strings easier to read.
-        encoded_params = encoded_params.replace("%5B", "[").replace("%5D", "]")
-
-        encoded_body = json.dumps(params or {}, default=_json_encode_date_callback)
-
-        supplied_headers = None
-        if "headers" in request_options and request_options["headers"] is not None:
-            supplied_headers = dict(request_options["headers"])
-
-        headers = self.request_headers(
-            # this cast is safe because the blocks below validate that `method` is one of the allowed values
-            cast(HttpVerb, method),
-            api_mode,
-            request_options,
-        )
+        endpoints = self._options.base_addresses.get(request.base_address)
+        with self._lane_client(options, deadline) as client:
+            if isinstance(endpoints, EndpointSet):
+                (rcontent, rcode, rheaders) = self._request_with_failover(
+                    client,
+                    endpoints,
+                    request.method,
+                    request.url,
+                    request.headers,
+                    request.body,
+                    request.max_network_retries,
+                    deadline,
+                )
+            else:
+                (rcontent, rcode, rheaders) = client.request_with_retries(
+                    request.method,
+                    request.url,
+                    request.headers,
+                    request.body,
+                    max_network_retries=request.max_network_retries,
+                    deadline=deadline,
+                )
+        if rate_limiter is not None:
+            rate_limiter.update_from_headers(options["api_key"], rcode, rheaders)
+        self._log_response(request, sampled, rcontent, rcode)
 
-        if method == "get" or method == "delete":
-            if params:
-                # if we're sending query params, we've already merged the incoming ones with the server's "url"
-                # so we can overwrite the whole thing
-                scheme, netloc, path, _, fragment = urlsplit(abs_url)
-
-                abs_url = urlunsplit((scheme, netloc, path, encoded_params, fragment))
-            post_data = None
-        elif method == "post":
-            post_data = encoded_body
-            print(f"_api_requestor.py:399> {post_data=}")
-        else:
-            raise error.APIConnectionError(f"Unrecognized HTTP method {method!r}.")
+        return rcontent, rcode, rheaders
 
-        if supplied_headers is not None:
-            for key, value in supplied_headers.items():
-                headers[key] = value
+    @staticmethod
+    def _log_request(request: KhipuRequest) -> bool:
+        """
+        Logs the request if the log policy samples it, and returns whether
+        it did. Nothing is formatted while logging is off.
+        """
+        if not log_enabled("info"):
+            return False
+        policy = get_log_policy()
+        if not policy.sampled(request.url):
+            return False
+        log_info("Request to Khipu api", method=request.method, url=policy.url(request.url))
+        if log_enabled("debug"):
+            log_debug(
+                "Payload",
+                post_data=policy.body(request.payload),
+                api_version=khipu_tools._ApiVersion.CURRENT,
+                api_mode=request.api_mode,
+            )
+        return True
 
-        return (
-            # Actual args
-            method,
-            abs_url,
-            headers,
-            post_data,
-            # For logging
-            encoded_params,
-            khipu_tools._ApiVersion.CURRENT,
-        )
+    @staticmethod
+    def _log_response(request: KhipuRequest, sampled: bool, rcontent: object, rcode: int) -> None:
+        # Failed calls are logged even when their request wasn't sampled.
+        if not log_enabled("info") or not (sampled or rcode >= 400):
+            return
+        policy = get_log_policy()
+        url = policy.url(request.url)
+        if sampled:
+            log_info("Khipu API response", path=url, response_code=rcode)
+        else:
+            log_info("Khipu API response", method=request.method, path=url, response_code=rcode)
+        if log_enabled("debug"):
+            log_debug("API response body", body=policy.body(rcontent))
 
-    def request_raw(
+    async def request_raw_async(
         self,
         method: str,
         url: str,
@@ -265,62 +386,166 @@ class _APIRequestor:
         *,
         base_address: BaseAddress,
         api_mode: ApiMode,
+        timings: Optional[dict[str, float]] = None,
     ) -> tuple[object, int, Mapping[str, str]]:
-        (
-            method,
-            abs_url,
-            headers,
-            post_data,
-            encoded_params,
-            api_version,
-        ) = self._args_for_request_with_retries(
-            method,
-            url,
-            params,
-            options,
-            base_address=base_address,
-            api_mode=api_mode,
-        )
+        request = self._build_request(method, url, params, options, base_address=base_address, api_mode=api_mode)
+        return await self._send_async(request, timings)
 
-        log_info("Request to Khipu api", method=method, url=abs_url)
-        log_debug(
-            "Payload",
-            post_data=encoded_params,
-            api_version=api_version,
-            api_mode=api_mode,
-        )
+    async def _send_async(
+        self, request: KhipuRequest, timings: Optional[dict[str, float]] = None
+    ) -> tuple[object, int, Mapping[str, str]]:
+        middleware = self._get_middleware()
+        if not middleware:
+            return await self._transmit_async(request)
+        return await middleware.send_async(request, self._transmit_async, timings)
+
+    async def _transmit_async(self, request: KhipuRequest) -> tuple[object, int, Mapping[str, str]]:
+        sampled = self._log_request(request)
+
+        options = request.options
+        deadline = request.deadline
+        rate_limiter = self._get_rate_limiter()
+        if rate_limiter is not None:
+            await rate_limiter.acquire_async(
+                options["api_key"],
+                self._get_http_client().sleep_async,
+                block=options.get("rate_limit_block"),
+                timeout=deadline.remaining() if deadline is not None else None,
+            )
 
-        (rcontent, rcode, rheaders) = self._get_http_client().request_with_retries(
-            method,
-            abs_url,
-            headers,
-            post_data,
-        )
-        log_info("Khipu API response", path=abs_url, response_code=rcode)
-        log_debug("API response body", body=rcontent)
+        endpoints = self._options.base_addresses.get(request.base_address)
+        async with self._lane_client_async(options, deadline) as client:
+            if isinstance(endpoints, EndpointSet):
+                (rcontent, rcode, rheaders) = await self._request_with_failover_async(
+                    client,
+                    endpoints,
+                    request.method,
+                    request.url,
+                    request.headers,
+                    request.body,
+                    request.max_network_retries,
+                    deadline,
+                )
+            else:
+                (rcontent, rcode, rheaders) = await client.request_with_retries_async(
+                    request.method,
+                    request.url,
+                    request.headers,
+                    request.body,
+                    max_network_retries=request.max_network_retries,
+                    deadline=deadline,
+                )
+        if rate_limiter is not None:
+            rate_limiter.update_from_headers(options["api_key"], rcode, rheaders)
+        self._log_response(request, sampled, rcontent, rcode)
 
         return rcontent, rcode, rheaders
 
+    def _request_with_failover(
+        self,
+        client: HTTPClient,
+        endpoints: EndpointSet,
+        method: str,
+        abs_url: str,
+        headers: Mapping[str, str],
+        post_data: Any,
+        max_network_retries: Optional[int],
+        deadline: Optional[Deadline],
+    ) -> tuple[Any, int, Mapping[str, str]]:
+        path = abs_url[len(endpoints.urls[0]) :]
+        tried: list[str] = []
+        while True:
+            base = endpoints.choose(exclude=tried)
+            tried.append(base)
+            last_chance = len(tried) >= len(endpoints)
+            started = time.monotonic()
+            try:
+                response = client.request_with_retries(
+                    method,
+                    base + path,
+                    headers,
+                    post_data,
+                    max_network_retries=max_network_retries,
+                    deadline=deadline,
+                )
+            except error.APIConnectionError as e:
+                if not self._fails_over_on_error(endpoints, base, method, e) or last_chance:
+                    raise
+                log_info("Endpoint failed, trying the next one", url=base, error=type(e).__name__)
+                continue
+            if not self._fails_over_on_status(endpoints, base, method, response[1], started) or last_chance:
+                return response
+            log_info("Endpoint failed, trying the next one", url=base, response_code=response[1])
+
+    async def _request_with_failover_async(
+        self,
+        client: HTTPClient,
+        endpoints: EndpointSet,
+        method: str,
+        abs_url: str,
+        headers: Mapping[str, str],
+        post_data: Any,
+        max_network_retries: Optional[int],
+        deadline: Optional[Deadline],
+    ) -> tuple[Any, int, Mapping[str, str]]:
+        path = abs_url[len(endpoints.urls[0]) :]
+        tried: list[str] = []
+        while True:
+            base = endpoints.choose(exclude=tried)
+            tried.append(base)
+            last_chance = len(tried) >= len(endpoints)
+            started = time.monotonic()
+            try:
+                response = await client.request_with_retries_async(
+                    method,
+                    base + path,
+                    headers,
+                    post_data,
+                    max_network_retries=max_network_retries,
+                    deadline=deadline,
+                )
+            except error.APIConnectionError as e:
+                if not self._fails_over_on_error(endpoints, base, method, e) or last_chance:
+                    raise
+                log_info("Endpoint failed, trying the next one", url=base, error=type(e).__name__)
+                continue
+            if not self._fails_over_on_status(endpoints, base, method, response[1], started) or last_chance:
+                return response
+            log_info("Endpoint failed, trying the next one", url=base, response_code=response[1])
+
+    @staticmethod
+    def _fails_over_on_error(endpoints: EndpointSet, base: str, method: str, e: error.APIConnectionError) -> bool:
+        """
+        Records a failed call to `base` and tells whether it may be sent to
+        another endpoint. Like retries, a POST only moves on when it surely
+        didn't reach the server.
+        """
+        if isinstance(e, (error.DeadlineExceededError, error.ConcurrencyLimitExceededError)):
+            # Local: the endpoint wasn't called, and the others would fare no better.
+            return False
+        if isinstance(e, error.CircuitBreakerOpenError):
+            # Nothing was sent, and the breaker already knows about the endpoint.
+            return True
+        endpoints.record(base, ok=False)
+        return method in IDEMPOTENT_METHODS or e.connect_failed
+
+    @staticmethod
+    def _fails_over_on_status(endpoints: EndpointSet, base: str, method: str, rcode: int, started: float) -> bool:
+        # A POST answered by a gateway may have been processed behind it, so
+        # only idempotent calls are sent again to another endpoint.
+        failed = rcode in _FAILOVER_STATUS_CODES
+        endpoints.record(base, ok=not failed, latency=time.monotonic() - started)
+        return failed and method in IDEMPOTENT_METHODS
+
     def _interpret_response(
         self,
         rbody: object,
         rcode: int,
         rheaders: Mapping[str, str],
         api_mode: ApiMode,
+        timings: Optional[Mapping[str, float]] = None,
     ) -> KhipuResponse:
+        return parse_response(rbody, rcode, rheaders, timings)
 
-        try:
-            resp = KhipuResponse(
-                cast(str, rbody),
-                rcode,
-                rheaders,
-            )
-        except Exception:
-            raise error.APIError(
-                f"Invalid response body from API: {rcode} -- " f"HTTP response  was: {rbody})",
-                cast(bytes, rbody),
-                rcode,
-                cast(bytes, rbody),
-                rheaders,
-            )
-        return resp
+
+_fork.register(_APIRequestor)
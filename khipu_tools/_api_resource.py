@@ -5,9 +5,13 @@ from khipu_tools._api_requestor import _APIRequestor
 from khipu_tools._base_address import BaseAddress
 from khipu_tools._khipu_object import KhipuObject
 from khipu_tools._request_options import extract_options_from_dict
+from khipu_tools._schema import ParamSchema
 
 T = TypeVar("T", bound=KhipuObject)
 
+# Resource paths, built once per class.
+_class_urls: dict[type, str] = {}
+
 
 class APIResource(KhipuObject, Generic[T]):
     OBJECT_NAME: ClassVar[str]
@@ -20,10 +24,13 @@ class APIResource(KhipuObject, Generic[T]):
                 "APIResource is an abstract class.  You should perform "
                 "actions on its subclasses (e.g. Payment, Predict, etc)"
             )
-        # Namespaces are separated in object names with periods (.) and in URLs
-        # with forward slashes (/), so replace the former with the latter.
-        base = cls.OBJECT_NAME.replace(".", "/")
-        return f"/{cls.OBJECT_PREFIX}/{base}"
+        url = _class_urls.get(cls)
+        if url is None:
+            # Namespaces are separated in object names with periods (.) and in URLs
+            # with forward slashes (/), so replace the former with the latter.
+            base = cls.OBJECT_NAME.replace(".", "/")
+            url = _class_urls[cls] = f"/{cls.OBJECT_PREFIX}/{base}"
+        return url
 
     @classmethod
     def _static_request(
@@ -33,8 +40,11 @@ class APIResource(KhipuObject, Generic[T]):
         params: Optional[Mapping[str, Any]] = None,
         *,
         base_address: BaseAddress = "api",
+        schema: Optional[ParamSchema] = None,
     ):
         request_options, request_params = extract_options_from_dict(params)
+        if schema is not None:
+            request_params = schema.encode(request_params)
         return _APIRequestor._global_instance().request(
             method_,
             url_,
@@ -42,3 +52,24 @@ class APIResource(KhipuObject, Generic[T]):
             options=request_options,
             base_address=base_address,
         )
+
+    @classmethod
+    async def _static_request_async(
+        cls,
+        method_,
+        url_,
+        params: Optional[Mapping[str, Any]] = None,
+        *,
+        base_address: BaseAddress = "api",
+        schema: Optional[ParamSchema] = None,
+    ):
+        request_options, request_params = extract_options_from_dict(params)
+        if schema is not None:
+            request_params = schema.encode(request_params)
+        return await _APIRequestor._global_instance().request_async(
+            method_,
+            url_,
+            params=request_params,
+            options=request_options,
+            base_address=base_address,
+        )
@@ -49,3 +49,17 @@ class Banks(APIResource[T]):
             raise TypeError("Expected KhipuObject object from API, got %s" % (type(result).__name__))
 
         return result
+
+    @classmethod
+    async def get_async(cls) -> KhipuObject["Banks"]:
+        """
+        Versión asíncrona de `get`.
+        """
+        result = await cls._static_request_async(
+            "get",
+            cls.class_url(),
+        )
+        if not isinstance(result, KhipuObject):
+            raise TypeError("Expected KhipuObject object from API, got %s" % (type(result).__name__))
+
+        return result
@@ -1,8 +1,12 @@
-from typing import Literal, TypedDict, Optional
+from collections.abc import Sequence
+from typing import TYPE_CHECKING, Literal, TypedDict, Optional, Union
 from typing_extensions import NotRequired
 
+if TYPE_CHECKING:
+    from khipu_tools._endpoints import EndpointSet
+
 BaseAddress = Literal["api"]
 
 
 class BaseAddresses(TypedDict):
-    api: NotRequired[Optional[str]]
+    api: NotRequired[Optional[Union[str, Sequence[str], "EndpointSet"]]]
@@ -0,0 +1,169 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Literal, Optional
+
+from khipu_tools import _fork
+from khipu_tools._error import CircuitBreakerOpenError
+from khipu_tools._util import log_info
+
+CircuitState = Literal["closed", "open", "half_open"]
+StateListener = Callable[[str, CircuitState, CircuitState], None]
+
+
+class _RouteCircuit:
+    def __init__(self, window_size: int):
+        self.state: CircuitState = "closed"
+        self.outcomes: deque[tuple[bool, bool]] = deque(maxlen=window_size)
+        self.opened_at = 0.0
+        self.probes = 0
+
+
+class CircuitBreaker:
+    """
+    Keeps one circuit per route (base address + endpoint, e.g.
+    `https://payment-api.khipu.com/v3/payments`), so a failing endpoint
+    doesn't take the healthy ones down with it.
+
+    A circuit opens once at least `minimum_calls` of the last `window_size`
+    calls were seen and either the share of failures (connection errors and
+    5xx answers) reaches `failure_rate_threshold`, or the share of calls slower
+    than `slow_call_duration` seconds reaches `slow_call_rate_threshold`.
+    While open, calls fail fast with `CircuitBreakerOpenError`. After
+    `open_duration` seconds up to `half_open_max_calls` probes go through: if
+    they all succeed the circuit closes, otherwise it opens again.
+
+    Listeners registered with `add_listener` (or passed as `on_state_change`)
+    are called with `(route, old_state, new_state)` on every transition.
+    """
+
+    def __init__(
+        self,
+        failure_rate_threshold: float = 0.5,
+        slow_call_duration: Optional[float] = None,
+        slow_call_rate_threshold: float = 0.5,
+        minimum_calls: int = 10,
+        window_size: int = 50,
+        open_duration: float = 30.0,
+        half_open_max_calls: int = 1,
+        on_state_change: Optional[StateListener] = None,
+        _clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_duration = slow_call_duration
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.window_size = window_size
+        self.open_duration = open_duration
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = _clock
+        self._lock = threading.Lock()
+        self._circuits: dict[str, _RouteCircuit] = {}
+        self._listeners: list[StateListener] = []
+        if on_state_change is not None:
+            self._listeners.append(on_state_change)
+        _fork.register(self)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener: StateListener) -> None:
+        self._listeners.append(listener)
+
+    def state(self, route: str) -> CircuitState:
+        with self._lock:
+            circuit = self._circuits.get(route)
+            if circuit is None:
+                return "closed"
+            if circuit.state == "open" and self._clock() - circuit.opened_at >= self.open_duration:
+                return "half_open"
+            return circuit.state
+
+    def states(self) -> dict[str, CircuitState]:
+        return {route: self.state(route) for route in list(self._circuits)}
+
+    def before_call(self, route: str) -> None:
+        """
+        Raises `CircuitBreakerOpenError` if `route` must not be called now.
+        """
+        transition = None
+        with self._lock:
+            circuit = self._circuits.get(route)
+            if circuit is None:
+                circuit = self._circuits[route] = _RouteCircuit(self.window_size)
+
+            if circuit.state == "open":
+                remaining = self.open_duration - (self._clock() - circuit.opened_at)
+                if remaining > 0:
+                    raise CircuitBreakerOpenError(
+                        f"Circuit for {route} is open after repeated failures, not calling Khipu.",
+                        route=route,
+                        retry_after=remaining,
+                    )
+                transition = self._transition(circuit, "half_open")
+
+            if circuit.state == "half_open":
+                if circuit.probes >= self.half_open_max_calls:
+                    raise CircuitBreakerOpenError(
+                        f"Circuit for {route} is half open and already probing, not calling Khipu.",
+                        route=route,
+                        retry_after=0.0,
+                    )
+                circuit.probes += 1
+
+        if transition is not None:
+            self._notify(route, *transition)
+
+    def record(self, route: str, success: bool, duration: float) -> None:
+        slow = self.slow_call_duration is not None and duration >= self.slow_call_duration
+        transition = None
+        with self._lock:
+            circuit = self._circuits.get(route)
+            if circuit is None:
+                circuit = self._circuits[route] = _RouteCircuit(self.window_size)
+
+            if circuit.state == "half_open":
+                circuit.probes = max(0, circuit.probes - 1)
+                if not success or slow:
+                    transition = self._transition(circuit, "open")
+                elif circuit.probes == 0:
+                    transition = self._transition(circuit, "closed")
+            elif circuit.state == "closed":
+                circuit.outcomes.append((success, slow))
+                if self._should_trip(circuit):
+                    transition = self._transition(circuit, "open")
+
+        if transition is not None:
+            self._notify(route, *transition)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._circuits.clear()
+
+    def _should_trip(self, circuit: _RouteCircuit) -> bool:
+        calls = len(circuit.outcomes)
+        if calls < self.minimum_calls:
+            return False
+        failures = sum(1 for success, _ in circuit.outcomes if not success)
+        if failures / calls >= self.failure_rate_threshold:
+            return True
+        if self.slow_call_duration is not None:
+            slow_calls = sum(1 for _, slow in circuit.outcomes if slow)
+            return slow_calls / calls >= self.slow_call_rate_threshold
+        return False
+
+    def _transition(self, circuit: _RouteCircuit, new_state: CircuitState) -> tuple[CircuitState, CircuitState]:
+        old_state = circuit.state
+        circuit.state = new_state
+        if new_state == "open":
+            circuit.opened_at = self._clock()
+            circuit.probes = 0
+        elif new_state == "closed":
+            circuit.outcomes.clear()
+            circuit.probes = 0
+        return old_state, new_state
+
+    def _notify(self, route: str, old_state: CircuitState, new_state: CircuitState) -> None:
+        log_info("Circuit breaker state change", route=route, old_state=old_state, new_state=new_state)
+        for listener in list(self._listeners):
+            listener(route, old_state, new_state)
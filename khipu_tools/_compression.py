@@ -0,0 +1,68 @@
+import gzip
+from collections.abc import Mapping
+from typing import Any, Optional
+
+try:
+    import brotli  # noqa: F401
+
+    _HAS_BROTLI = True
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+
+        _HAS_BROTLI = True
+    except ImportError:
+        _HAS_BROTLI = False
+
+# Encodings requests, urllib3 and httpx can all decode on their own.
+DEFAULT_ACCEPT_ENCODING = "gzip, deflate, br" if _HAS_BROTLI else "gzip, deflate"
+
+
+class CompressionPolicy:
+    """
+    Compression settings of an HTTP client.
+
+    `accept_encoding` is sent with every request so Khipu can compress its
+    answers; the transports decode them transparently. The default, None,
+    leaves the header to the transport: requests and httpx already send
+    gzip and deflate, plus br when `brotli` or `brotlicffi` is installed
+    (`khipu-tools[brotli]`), and `Urllib3Client` sends
+    `DEFAULT_ACCEPT_ENCODING` itself.
+
+    With `request_threshold` set, request bodies of at least that many bytes
+    are gzip-compressed at `level` and sent with `Content-Encoding: gzip`.
+    This is off by default since the server has to accept compressed bodies.
+    """
+
+    def __init__(
+        self,
+        accept_encoding: Optional[str] = None,
+        request_threshold: Optional[int] = None,
+        level: int = 6,
+    ):
+        self.accept_encoding = accept_encoding
+        self.request_threshold = request_threshold
+        self.level = level
+
+    def apply(self, headers: Mapping[str, str], post_data: Any) -> tuple[Mapping[str, str], Any]:
+        """
+        Returns the headers and body to send, done once per call so retries
+        reuse the compressed body. The headers are copied only when a header
+        is added, so the shared read-only ones usually go through as they are.
+        """
+        if self.accept_encoding is None and self.request_threshold is None:
+            return headers, post_data
+
+        names = {name.lower() for name in headers}
+        added = {}
+        if self.accept_encoding and "accept-encoding" not in names:
+            added["Accept-Encoding"] = self.accept_encoding
+
+        if self.request_threshold is not None and post_data is not None and "content-encoding" not in names:
+            body = post_data.encode("utf-8") if isinstance(post_data, str) else post_data
+            if isinstance(body, (bytes, bytearray)) and len(body) >= self.request_threshold:
+                post_data = gzip.compress(body, compresslevel=self.level, mtime=0)
+                added["Content-Encoding"] = "gzip"
+        if added:
+            headers = {**headers, **added}
+        return headers, post_data
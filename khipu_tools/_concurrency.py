@@ -0,0 +1,177 @@
+import math
+import threading
+import time
+from typing import Awaitable, Callable, Literal, Optional
+
+from khipu_tools import _fork
+from khipu_tools._error import ConcurrencyLimitExceededError
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits how many calls to Khipu are in flight at once and adapts that limit
+    to the latency Khipu is showing.
+
+    With `algorithm="aimd"` the limit grows by one while calls keep it busy and
+    latency stays within `tolerance` times the best latency seen, and is
+    multiplied by `backoff_ratio` when latency rises or a call fails. With
+    `algorithm="gradient"` the limit follows the ratio between the long term
+    and the recent latency, plus a small headroom of `sqrt(limit)`.
+
+    Calls over the limit wait in a queue of at most `max_queue` callers for up
+    to `max_wait` seconds (or the `timeout` passed to `acquire`, if shorter);
+    past that they are shed with `ConcurrencyLimitExceededError`.
+
+    An HTTP client holds a slot per attempt, not per call: the slot is free
+    while a call backs off before a retry, and the latency reported is that
+    of the attempt alone.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 20,
+        min_limit: int = 1,
+        max_limit: int = 200,
+        algorithm: Literal["aimd", "gradient"] = "aimd",
+        backoff_ratio: float = 0.9,
+        tolerance: float = 2.0,
+        smoothing: float = 0.2,
+        max_queue: int = 100,
+        max_wait: float = 5.0,
+    ):
+        if algorithm not in ("aimd", "gradient"):
+            raise ValueError(f"Unknown concurrency algorithm {algorithm!r}")
+        self.algorithm = algorithm
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._queued = 0
+        self._min_latency: Optional[float] = None
+        self._short_latency: Optional[float] = None
+        self._long_latency: Optional[float] = None
+        self._condition = threading.Condition()
+        _fork.register(self)
+
+    def _after_fork(self) -> None:
+        # Calls in flight belong to the parent's threads, not to this process.
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._queued = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    def _try_enter(self) -> bool:
+        if self._in_flight < int(self._limit):
+            self._in_flight += 1
+            return True
+        return False
+
+    def _shed(self, reason: str) -> ConcurrencyLimitExceededError:
+        return ConcurrencyLimitExceededError(
+            f"Request shed: {reason} (limit={int(self._limit)}, in_flight={self._in_flight}, queued={self._queued})."
+        )
+
+    def _max_wait(self, timeout: Optional[float]) -> float:
+        return self.max_wait if timeout is None else min(self.max_wait, timeout)
+
+    def acquire(self, timeout: Optional[float] = None) -> None:
+        with self._condition:
+            if self._try_enter():
+                return
+            if self._queued >= self.max_queue:
+                raise self._shed("queue is full")
+            self._queued += 1
+            try:
+                deadline = time.monotonic() + self._max_wait(timeout)
+                while not self._try_enter():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self._shed("timed out waiting for a slot")
+                    self._condition.wait(remaining)
+            finally:
+                self._queued -= 1
+
+    async def acquire_async(self, sleep: Callable[[float], Awaitable[None]], timeout: Optional[float] = None) -> None:
+        # A threading.Condition can't be awaited, so async callers poll with
+        # a short, growing pause.
+        with self._condition:
+            if self._try_enter():
+                return
+            if self._queued >= self.max_queue:
+                raise self._shed("queue is full")
+            self._queued += 1
+        try:
+            deadline = time.monotonic() + self._max_wait(timeout)
+            pause = 0.001
+            while True:
+                with self._condition:
+                    if self._try_enter():
+                        return
+                if time.monotonic() >= deadline:
+                    raise self._shed("timed out waiting for a slot")
+                await sleep(pause)
+                pause = min(pause * 2, 0.05)
+        finally:
+            with self._condition:
+                self._queued -= 1
+
+    def release(self, latency: float, success: bool) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            if self.algorithm == "aimd":
+                self._update_aimd(latency, success)
+            else:
+                self._update_gradient(latency, success)
+            self._condition.notify()
+
+    def cancel(self) -> None:
+        """
+        Frees a slot without reporting a latency, for an attempt that was
+        turned down locally (e.g. by the circuit breaker) and never reached
+        Khipu, so it says nothing about how loaded Khipu is.
+        """
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+
+    def _clamp(self, limit: float) -> float:
+        return min(float(self.max_limit), max(float(self.min_limit), limit))
+
+    def _update_aimd(self, latency: float, success: bool) -> None:
+        if self._min_latency is None or latency < self._min_latency:
+            self._min_latency = latency
+        if not success or latency > self._min_latency * self.tolerance:
+            self._limit = self._clamp(self._limit * self.backoff_ratio)
+        elif self._in_flight * 2 >= self._limit:
+            # Only grow while the current limit is actually being used.
+            self._limit = self._clamp(self._limit + 1)
+
+    def _update_gradient(self, latency: float, success: bool) -> None:
+        if not success:
+            self._limit = self._clamp(self._limit * self.backoff_ratio)
+            return
+        if self._short_latency is None or self._long_latency is None:
+            self._short_latency = self._long_latency = latency
+            return
+        self._short_latency += self.smoothing * (latency - self._short_latency)
+        self._long_latency += (self.smoothing / 10) * (latency - self._long_latency)
+        gradient = max(0.5, min(1.0, self._long_latency / self._short_latency))
+        new_limit = self._limit * gradient + math.sqrt(self._limit)
+        self._limit = self._clamp((1 - self.smoothing) * self._limit + self.smoothing * new_limit)
@@ -0,0 +1,275 @@
+import socket
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Optional, TypedDict
+
+import urllib3
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+
+from khipu_tools._tls import _ResumingSSLContext
+
+if TYPE_CHECKING:
+    from khipu_tools._dns import DNSCache
+
+
+class PoolStats(TypedDict):
+    open: int
+    """Connections currently open (idle + in use)."""
+    idle: int
+    """Open connections parked in the pool, ready for reuse."""
+    in_use: int
+    """Connections checked out by an in-flight request."""
+    checkouts: int
+    """Total number of times a connection was handed to a request."""
+    wait_time: float
+    """Cumulative seconds requests spent waiting to get a connection."""
+    max_wait_time: float
+    """Longest single wait for a connection, in seconds."""
+    stale_closed: int
+    """Idle connections closed before reuse because they sat longer than `max_idle`."""
+    replays: int
+    """GET/DELETE calls sent again because the connection was reset before any response."""
+
+
+class _PoolCounters:
+    """
+    Counters shared by every urllib3 pool that belongs to one HTTP client.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.checkouts = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.stale_closed = 0
+        self.replays = 0
+
+    def record_checkout(self, waited: float) -> None:
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.wait_time += waited
+            if waited > self.max_wait_time:
+                self.max_wait_time = waited
+
+    def record_checkin(self) -> None:
+        with self._lock:
+            if self.in_use > 0:
+                self.in_use -= 1
+
+    def record_stale_closed(self) -> None:
+        with self._lock:
+            self.stale_closed += 1
+
+    def record_replay(self) -> None:
+        with self._lock:
+            self.replays += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self.in_use = 0
+            self.checkouts = 0
+            self.wait_time = 0.0
+            self.max_wait_time = 0.0
+            self.stale_closed = 0
+            self.replays = 0
+
+
+def _keepalive_socket_options(idle: float, interval: float = 10.0, probes: int = 3) -> list[tuple[int, int, int]]:
+    """
+    Socket options turning on TCP keepalive: after `idle` seconds without
+    traffic the OS sends a probe every `interval` seconds and drops the
+    connection after `probes` unanswered ones. Probing more often than the
+    load balancer's idle timeout keeps pooled connections from being
+    silently forgotten.
+    """
+    options = list(HTTPConnection.default_socket_options)
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    if hasattr(socket, "TCP_KEEPIDLE"):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, max(1, int(idle))))
+    elif hasattr(socket, "TCP_KEEPALIVE"):
+        # macOS names the idle option differently.
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPALIVE, max(1, int(idle))))
+    if hasattr(socket, "TCP_KEEPINTVL"):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, int(interval))))
+    if hasattr(socket, "TCP_KEEPCNT"):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPCNT, probes))
+    return options
+
+
+class _CachedDNSConnectionMixin:
+    _khipu_dns_cache: Optional["DNSCache"] = None
+
+    def _new_conn(self):
+        cache = self._khipu_dns_cache
+        if cache is None:
+            return super()._new_conn()  # type: ignore[misc]
+        # Connect to the cached address; `host` is untouched so TLS still
+        # checks the certificate against the real hostname.
+        host = self._dns_host  # type: ignore[has-type]
+        self._dns_host = cache.resolve(host, self.port)  # type: ignore[attr-defined]
+        try:
+            return super()._new_conn()  # type: ignore[misc]
+        except NewConnectionError:
+            cache.invalidate(host, self.port)  # type: ignore[attr-defined]
+            raise
+        finally:
+            self._dns_host = host
+
+
+class _CachedDNSHTTPConnection(_CachedDNSConnectionMixin, HTTPConnection):
+    pass
+
+
+class _CachedDNSHTTPSConnection(_CachedDNSConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _InstrumentedPoolMixin:
+    _khipu_counters: Optional[_PoolCounters] = None
+    _khipu_dns_cache: Optional["DNSCache"] = None
+    _khipu_max_idle: Optional[float] = None
+
+    def _new_conn(self):
+        conn = super()._new_conn()  # type: ignore[misc]
+        conn._khipu_dns_cache = self._khipu_dns_cache
+        return conn
+
+    def _get_conn(self, timeout: Optional[float] = None):
+        start = time.perf_counter()
+        conn = super()._get_conn(timeout)  # type: ignore[misc]
+        if self._khipu_counters is not None:
+            self._khipu_counters.record_checkout(time.perf_counter() - start)
+        self._close_if_stale(conn)
+        return conn
+
+    def _put_conn(self, conn) -> None:
+        if self._khipu_counters is not None:
+            self._khipu_counters.record_checkin()
+        if conn is not None:
+            conn._khipu_idle_since = time.monotonic()
+            context = getattr(conn, "ssl_context", None)
+            if isinstance(context, _ResumingSSLContext):
+                # TLS 1.3 tickets arrive after the handshake, keep the latest session.
+                context.remember(conn.sock)
+        super()._put_conn(conn)  # type: ignore[misc]
+
+    def _close_if_stale(self, conn) -> None:
+        # urllib3 already discards connections the peer closed with a FIN.
+        # A load balancer that times out an idle connection may just forget
+        # it, and the next request would only find out from a reset, so
+        # connections idle for longer than `max_idle` are reopened instead.
+        max_idle = self._khipu_max_idle
+        if max_idle is None or getattr(conn, "sock", None) is None:
+            return
+        idle_since = getattr(conn, "_khipu_idle_since", None)
+        if idle_since is not None and time.monotonic() - idle_since > max_idle:
+            conn.close()
+            if self._khipu_counters is not None:
+                self._khipu_counters.record_stale_closed()
+
+    def _open_connections(self, count: int) -> int:
+        """
+        Connects up to `count` pooled connections (at most the pool size)
+        ahead of traffic and parks them idle. Returns how many are open.
+        """
+        count = min(count, self.pool.maxsize)  # type: ignore[attr-defined]
+        conns = []
+        opened = 0
+        try:
+            for _ in range(count):
+                # Bypass the counters, warming up is not a checkout.
+                conn = HTTPConnectionPool._get_conn(self)  # type: ignore[arg-type]
+                conns.append(conn)
+                if getattr(conn, "sock", None) is not None:
+                    opened += 1
+                    continue
+                conn.connect()
+                conn._khipu_idle_since = time.monotonic()
+                opened += 1
+        finally:
+            for conn in conns:
+                HTTPConnectionPool._put_conn(self, conn)  # type: ignore[arg-type]
+        return opened
+
+    def _idle_connections(self) -> int:
+        queue = getattr(self.pool, "queue", None)  # type: ignore[attr-defined]
+        if queue is None:
+            return 0
+        return sum(1 for conn in list(queue) if conn is not None and getattr(conn, "sock", None) is not None)
+
+
+class _InstrumentedHTTPConnectionPool(_InstrumentedPoolMixin, HTTPConnectionPool):
+    ConnectionCls = _CachedDNSHTTPConnection
+
+
+class _InstrumentedHTTPSConnectionPool(_InstrumentedPoolMixin, HTTPSConnectionPool):
+    ConnectionCls = _CachedDNSHTTPSConnection
+
+
+class _InstrumentedPoolManager(urllib3.PoolManager):
+    """
+    PoolManager whose per-host pools report into a shared `_PoolCounters`
+    and, when given a `DNSCache`, connect to the cached addresses. Pooled
+    connections idle for more than `max_idle` seconds are reconnected before
+    reuse.
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        counters: _PoolCounters,
+        dns_cache: Optional["DNSCache"] = None,
+        max_idle: Optional[float] = None,
+        **kwargs: Any,
+    ):
+        super().__init__(*args, **kwargs)
+        self.pool_classes_by_scheme = {
+            "http": _InstrumentedHTTPConnectionPool,
+            "https": _InstrumentedHTTPSConnectionPool,
+        }
+        self._khipu_counters = counters
+        self._khipu_dns_cache = dns_cache
+        self._khipu_max_idle = max_idle
+
+    def _new_pool(self, scheme: str, host: str, port: int, request_context=None):
+        pool = super()._new_pool(scheme, host, port, request_context=request_context)
+        pool._khipu_counters = self._khipu_counters
+        pool._khipu_dns_cache = self._khipu_dns_cache
+        pool._khipu_max_idle = self._khipu_max_idle
+        return pool
+
+    def _pools(self) -> list:
+        with self.pools.lock:
+            return list(self.pools._container.values())
+
+    def set_dns_cache(self, dns_cache: Optional["DNSCache"]) -> None:
+        self._khipu_dns_cache = dns_cache
+        for pool in self._pools():
+            pool._khipu_dns_cache = dns_cache
+
+    def open_connections(self, url: str, count: int) -> int:
+        pool = self.connection_from_url(url)
+        if not isinstance(pool, _InstrumentedPoolMixin):
+            return 0
+        return pool._open_connections(count)
+
+    def stats(self) -> PoolStats:
+        pools = self._pools()
+        idle = sum(pool._idle_connections() for pool in pools if isinstance(pool, _InstrumentedPoolMixin))
+        counters = self._khipu_counters
+        with counters._lock:
+            in_use = counters.in_use
+            return {
+                "open": idle + in_use,
+                "idle": idle,
+                "in_use": in_use,
+                "checkouts": counters.checkouts,
+                "wait_time": counters.wait_time,
+                "max_wait_time": counters.max_wait_time,
+                "stale_closed": counters.stale_closed,
+                "replays": counters.replays,
+            }
@@ -0,0 +1,46 @@
+import time
+from typing import Optional
+
+from khipu_tools._error import DeadlineExceededError
+
+
+class Deadline:
+    """
+    The point in time by which a call to Khipu must be finished, on the
+    monotonic clock. Built from the `timeout` (seconds from now) and
+    `deadline` (a `time.time()` timestamp) request options; when both are
+    given the earliest one wins.
+    """
+
+    __slots__ = ("expires_at",)
+
+    def __init__(self, expires_at: float):
+        self.expires_at = expires_at
+
+    @classmethod
+    def from_options(cls, timeout: Optional[float] = None, deadline: Optional[float] = None) -> Optional["Deadline"]:
+        if timeout is None and deadline is None:
+            return None
+        now = time.monotonic()
+        candidates = []
+        if timeout is not None:
+            candidates.append(now + timeout)
+        if deadline is not None:
+            candidates.append(now + (deadline - time.time()))
+        return cls(min(candidates))
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self, what: str) -> None:
+        """
+        Raises `DeadlineExceededError` if there is no time left for `what`.
+        """
+        if self.expired():
+            raise DeadlineExceededError(f"Deadline exceeded before {what}.")
+
+    def __repr__(self):
+        return f"Deadline(remaining={self.remaining():.3f}s)"
@@ -0,0 +1,154 @@
+import ipaddress
+import socket
+import threading
+import time
+from typing import Callable, Optional
+
+from khipu_tools import _fork
+from khipu_tools._util import log_debug, log_info
+
+
+class _DNSEntry:
+    __slots__ = ("addresses", "expires_at", "used_at")
+
+    def __init__(self, addresses: list[str], expires_at: float, used_at: float):
+        self.addresses = addresses
+        self.expires_at = expires_at
+        self.used_at = used_at
+
+
+class DNSCache:
+    """
+    Caches name resolution for the hosts an HTTP client connects to, so new
+    connections don't pay a DNS lookup.
+
+    `getaddrinfo` doesn't report record TTLs, so entries live for `ttl`
+    seconds. With `refresh=True` a background thread re-resolves entries
+    before they expire, as long as they were used in the last `idle_ttl`
+    seconds; a failed lookup keeps serving the previous addresses.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 60.0,
+        refresh: bool = True,
+        idle_ttl: float = 600.0,
+        _resolver: Callable[..., list] = socket.getaddrinfo,
+    ):
+        self.ttl = ttl
+        self.refresh = refresh
+        self.idle_ttl = idle_ttl
+        self._resolver = _resolver
+        self._entries: dict[tuple[str, int], _DNSEntry] = {}
+        self._lock = threading.Lock()
+        self._refresher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        _fork.register(self)
+
+    def _after_fork(self) -> None:
+        # The refresh thread didn't survive the fork, it restarts on the next lookup.
+        self._lock = threading.Lock()
+        self._refresher = None
+        self._stop = threading.Event()
+
+    def resolve(self, host: str, port: int) -> str:
+        """
+        Address to connect to for `host`, from the cache when possible.
+        """
+        if _is_ip_address(host):
+            return host
+        now = time.monotonic()
+        entry = self._entries.get((host, port))
+        if entry is not None and now < entry.expires_at:
+            entry.used_at = now
+            return entry.addresses[0]
+        try:
+            return self._lookup(host, port)[0]
+        except OSError:
+            if entry is None:
+                raise
+            log_info("DNS lookup failed, using cached addresses", host=host)
+            entry.used_at = now
+            return entry.addresses[0]
+
+    def prefetch(self, host: str, port: int) -> list[str]:
+        """
+        Resolves `host` now and keeps the answer cached.
+        """
+        return self._lookup(host, port)
+
+    def _lookup(self, host: str, port: int) -> list[str]:
+        infos = self._resolver(host, port, 0, socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        if not addresses:
+            raise OSError(f"No addresses found for {host}")
+        now = time.monotonic()
+        with self._lock:
+            self._entries[(host, port)] = _DNSEntry(addresses, now + self.ttl, now)
+        log_debug("Resolved host", host=host, addresses=",".join(addresses))
+        if self.refresh:
+            self._ensure_refresher()
+        return addresses
+
+    def invalidate(self, host: str, port: Optional[int] = None) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == host and (port is None or key[1] == port)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def hosts(self) -> dict[str, list[str]]:
+        """
+        Cached addresses per `host:port`.
+        """
+        with self._lock:
+            return {f"{host}:{port}": list(entry.addresses) for (host, port), entry in self._entries.items()}
+
+    def _ensure_refresher(self) -> None:
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+        with self._lock:
+            if self._refresher is not None and self._refresher.is_alive():
+                return
+            self._stop.clear()
+            self._refresher = threading.Thread(target=self._refresh_loop, name="khipu-dns-refresh", daemon=True)
+            self._refresher.start()
+
+    def _refresh_loop(self) -> None:
+        # Wake up a few times per TTL and renew what is about to expire.
+        interval = max(1.0, self.ttl / 4)
+        while not self._stop.wait(interval):
+            now = time.monotonic()
+            with self._lock:
+                due = [
+                    key
+                    for key, entry in self._entries.items()
+                    if entry.expires_at - now <= interval and now - entry.used_at <= self.idle_ttl
+                ]
+                idle = [key for key, entry in self._entries.items() if now - entry.used_at > self.idle_ttl]
+                for key in idle:
+                    del self._entries[key]
+            for host, port in due:
+                try:
+                    self._lookup(host, port)
+                except OSError as e:
+                    log_info("Background DNS refresh failed", host=host, error=str(e))
+
+    def stop(self) -> None:
+        """
+        Stops the background refresh thread, if it runs.
+        """
+        self._stop.set()
+        refresher, self._refresher = self._refresher, None
+        if refresher is not None and refresher is not threading.current_thread():
+            refresher.join(timeout=1)
+
+
+def _is_ip_address(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host.strip("[]"))
+    except ValueError:
+        return False
+    return True
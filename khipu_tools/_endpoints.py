@@ -0,0 +1,156 @@
+import random
+import threading
+import time
+from collections.abc import Iterable, Sequence
+from typing import Callable, Optional, TypedDict, Union
+
+from khipu_tools import _fork
+from khipu_tools._util import log_info
+
+
+class EndpointStats(TypedDict):
+    healthy: bool
+    """False while the endpoint is ejected after repeated failures."""
+    latency: Optional[float]
+    """Moving average of the endpoint's response time, in seconds."""
+    requests: int
+    failures: int
+    consecutive_failures: int
+
+
+class _Endpoint:
+    __slots__ = ("url", "latency", "requests", "failures", "consecutive_failures", "ejected_until")
+
+    def __init__(self, url: str):
+        self.url = url
+        self.latency: Optional[float] = None
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+
+class EndpointSet:
+    """
+    Equivalent base URLs for one base address, e.g. several egress proxies
+    in front of the Khipu API. Each call goes to one of them: of two healthy
+    endpoints picked at random, the one with the lower average latency.
+
+    An endpoint that fails `failure_threshold` times in a row is ejected for
+    `cooldown` seconds and then gets traffic again; one success resets its
+    count. When every endpoint is ejected, the one due back first is used.
+    Endpoints on different hosts get their own connection pool in the HTTP
+    client, so a slow or broken one doesn't hold connections of the others.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        smoothing: float = 0.3,
+        _clock: Callable[[], float] = time.monotonic,
+    ):
+        if not urls:
+            raise ValueError("EndpointSet needs at least one URL")
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+        self._clock = _clock
+        self._endpoints = {url: _Endpoint(url) for url in urls}
+        self._lock = threading.Lock()
+        _fork.register(self)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+
+    @property
+    def urls(self) -> list[str]:
+        return list(self._endpoints)
+
+    def __len__(self) -> int:
+        return len(self._endpoints)
+
+    def choose(self, exclude: Iterable[str] = ()) -> str:
+        """
+        The endpoint for the next call, skipping the ones in `exclude` (those
+        already tried by this call) unless nothing else is left.
+        """
+        excluded = set(exclude)
+        now = self._clock()
+        with self._lock:
+            candidates = [e for e in self._endpoints.values() if e.url not in excluded] or list(
+                self._endpoints.values()
+            )
+            healthy = [e for e in candidates if e.ejected_until <= now]
+            if not healthy:
+                return min(candidates, key=lambda e: e.ejected_until).url
+            if len(healthy) == 1:
+                return healthy[0].url
+            # Endpoints without measurements sort first so they get measured.
+            first, second = random.sample(healthy, 2)
+            return min(first, second, key=lambda e: e.latency or 0.0).url
+
+    def record(self, url: str, ok: bool, latency: Optional[float] = None) -> None:
+        endpoint = self._endpoints.get(url)
+        if endpoint is None:
+            return
+        with self._lock:
+            endpoint.requests += 1
+            if latency is not None:
+                if endpoint.latency is None:
+                    endpoint.latency = latency
+                else:
+                    endpoint.latency += self.smoothing * (latency - endpoint.latency)
+            if ok:
+                endpoint.consecutive_failures = 0
+                return
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            if endpoint.consecutive_failures >= self.failure_threshold:
+                endpoint.ejected_until = self._clock() + self.cooldown
+                ejected = True
+            else:
+                ejected = False
+        if ejected:
+            log_info("Ejecting endpoint after repeated failures", url=url, cooldown=self.cooldown)
+
+    def stats(self) -> dict[str, EndpointStats]:
+        now = self._clock()
+        with self._lock:
+            return {
+                e.url: {
+                    "healthy": e.ejected_until <= now,
+                    "latency": e.latency,
+                    "requests": e.requests,
+                    "failures": e.failures,
+                    "consecutive_failures": e.consecutive_failures,
+                }
+                for e in self._endpoints.values()
+            }
+
+
+# Lists of URLs are turned into one shared EndpointSet per list, so the
+# health of an endpoint survives the per-call copies of the options.
+_shared_sets: dict[tuple[str, ...], EndpointSet] = {}
+
+
+def _as_endpoints(value: Union[str, Sequence[str], EndpointSet, None]) -> Union[str, EndpointSet, None]:
+    # A single URL stays a plain string, which keeps the common path as it was.
+    if value is None or isinstance(value, (str, EndpointSet)):
+        return value
+    urls = tuple(value)
+    if len(urls) == 1:
+        return urls[0]
+    endpoints = _shared_sets.get(urls)
+    if endpoints is None:
+        endpoints = _shared_sets.setdefault(urls, EndpointSet(urls))
+    return endpoints
+
+
+def _endpoint_urls(value: Union[str, EndpointSet, None]) -> list[str]:
+    if value is None:
+        return []
+    if isinstance(value, EndpointSet):
+        return value.urls
+    return [value]
@@ -95,6 +95,10 @@ class APIError(KhipuError):
 
 class APIConnectionError(KhipuError):
     should_retry: bool
+    connection_reset: bool
+    """The peer dropped the connection before sending any part of a response."""
+    connect_failed: bool
+    """No connection could be opened, so nothing was sent."""
 
     def __init__(
         self,
@@ -105,9 +109,48 @@ class APIConnectionError(KhipuError):
         headers=None,
         code=None,
         should_retry=False,
+        connection_reset=False,
+        connect_failed=False,
     ):
         super().__init__(message, http_body, http_status, json_body, headers, code)
         self.should_retry = should_retry
+        self.connection_reset = connection_reset
+        self.connect_failed = connect_failed
+
+
+class CircuitBreakerOpenError(APIConnectionError):
+    """
+    Raised without touching the network while the circuit for `route` is
+    open. `retry_after` is the number of seconds until a probe is allowed.
+    """
+
+    route: str
+    retry_after: float
+
+    def __init__(self, message, route, retry_after):
+        super().__init__(message, should_retry=False)
+        self.route = route
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimitExceededError(APIConnectionError):
+    """
+    Raised when a request is shed locally because too many calls to Khipu are
+    already in flight or queued.
+    """
+
+    def __init__(self, message):
+        super().__init__(message, should_retry=False)
+
+
+class DeadlineExceededError(APIConnectionError):
+    """
+    Raised when the `timeout` or `deadline` of a call runs out, or when the
+    remaining time is too short for another attempt to finish.
+    """
+
+    def __init__(self, message):
+        super().__init__(message, should_retry=False)
 
 
 class KhipuErrorWithParamCode(KhipuError):
@@ -0,0 +1,26 @@
+import os
+import weakref
+from typing import Any
+
+# A process forked by a pre-fork server (gunicorn, uwsgi, celery) inherits the
+# parent's sockets and pools, locks another thread may have been holding and
+# thread pools whose threads don't exist in the child. Objects owning such
+# state register here and get `_after_fork()` called in the child, so they
+# start over with fresh locks and pools while keeping their configuration.
+_instances: "weakref.WeakSet[Any]" = weakref.WeakSet()
+
+
+def register(obj: Any) -> None:
+    """
+    Calls `obj._after_fork()` in every child forked while `obj` is alive.
+    """
+    _instances.add(obj)
+
+
+def _after_fork_in_child() -> None:
+    for obj in list(_instances):
+        obj._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,47 @@
+from typing import Optional
+
+from khipu_tools._latency import LatencyHistogram
+from khipu_tools._retry import RetryBudget
+
+
+class HedgePolicy:
+    """
+    Opt-in hedging for GET requests. When an attempt hasn't answered after the
+    route's `percentile` latency (clamped to `[min_delay, max_delay]`), a
+    second identical request goes out on another pooled connection; the first
+    answer wins and the other one is dropped.
+
+    Hedging starts once a route has `min_samples` latencies recorded. Hedges
+    come out of `budget`, which by default allows 10% extra GETs, so they can
+    never double the traffic.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        min_delay: float = 0.01,
+        max_delay: Optional[float] = None,
+        min_samples: int = 20,
+        budget: Optional[RetryBudget] = None,
+        max_workers: int = 64,
+    ):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.budget = budget if budget is not None else RetryBudget(ratio=0.1, min_retries_per_second=0.5)
+        self.max_workers = max_workers
+
+    def delay(self, histogram: LatencyHistogram) -> Optional[float]:
+        """
+        Seconds to wait before hedging, or None to send a single request.
+        """
+        if histogram.count < self.min_samples:
+            return None
+        delay = histogram.percentile(self.percentile)
+        if delay is None:
+            return None
+        delay = max(self.min_delay, delay)
+        if self.max_delay is not None:
+            delay = min(self.max_delay, delay)
+        return delay
@@ -1,26 +1,179 @@
+import asyncio
+import datetime
+import http.client
+import os
 import random
+import ssl
 import textwrap
 import threading
-from collections.abc import Mapping
-from typing import Any, ClassVar, NoReturn, Optional, Union, cast, overload
+import time
+from collections.abc import Iterable, Mapping
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from typing import Any, Awaitable, ClassVar, NoReturn, Optional, Union, overload
 
 import requests
+import urllib3
 from requests import Session as RequestsSession
+from requests.adapters import HTTPAdapter
 from typing import Literal, TypedDict
 from typing_extensions import Never
-from khipu_tools._error import APIConnectionError
+from khipu_tools import _fork
+from khipu_tools._adaptive_timeouts import AdaptiveTimeouts
+from khipu_tools._circuit_breaker import CircuitBreaker
+from khipu_tools._compression import DEFAULT_ACCEPT_ENCODING, CompressionPolicy
+from khipu_tools._concurrency import AdaptiveConcurrencyLimiter
+from khipu_tools._connection_pool import (
+    PoolStats,
+    _InstrumentedPoolManager,
+    _keepalive_socket_options,
+    _PoolCounters,
+)
+from khipu_tools._deadline import Deadline
+from khipu_tools._dns import DNSCache
+from khipu_tools._error import APIConnectionError, CircuitBreakerOpenError, DeadlineExceededError
+from khipu_tools._hedging import HedgePolicy
+from khipu_tools._latency import LatencyRecorder
+from khipu_tools._retry import RetryBudget
+from khipu_tools._tls import TLSStats, create_ssl_context, tls_stats
+from khipu_tools._util import get_route, log_debug, log_info
 
+try:
+    import anyio
+    import httpx
+    from httpx import Client as HTTPXClientType
+    from httpx import Timeout as HTTPXTimeout
+except ImportError:
+    anyio = None
+    httpx = None
+
+
+IDEMPOTENT_METHODS = frozenset(["get", "delete"])
+RETRYABLE_STATUS_CODES = frozenset([429, 502, 503, 504])
+# Answers that guarantee the request was not processed, safe to retry on a POST.
+# A 503 may come from a proxy after Khipu processed the charge, so it's not one.
+RETRYABLE_STATUS_CODES_NOT_PROCESSED = frozenset([429])
+
+
+# RequestsClient options that HTTPXClient has no equivalent for.
+_REQUESTS_ONLY_OPTIONS = frozenset(
+    ["session", "pool_connections", "pool_block", "dns_cache", "max_idle", "tcp_keepalive"]
+)
+
+
+def new_default_http_client(*args: Any, http2: bool = False, **kwargs: Any) -> "HTTPClient":
+    """
+    Builds the client used when none is configured. With `http2=True` an
+    `HTTPXClient` that multiplexes concurrent calls over a few HTTP/2
+    connections is returned instead of `RequestsClient`; it serves both sync
+    and async requests.
+
+    With HTTP/2, `pool_maxsize` caps the connections of the httpx pool and
+    the other `RequestsClient` pool options raise a `TypeError`.
+    """
+    if http2:
+        kwargs.pop("async_fallback_client", None)
+        unsupported = _REQUESTS_ONLY_OPTIONS.intersection(kwargs)
+        if unsupported:
+            raise TypeError(f"The HTTP/2 client doesn't support {', '.join(sorted(unsupported))}")
+        if "pool_maxsize" in kwargs:
+            pool_maxsize = kwargs.pop("pool_maxsize")
+            kwargs.setdefault("max_connections", pool_maxsize)
+            kwargs.setdefault("max_keepalive_connections", pool_maxsize)
+        kwargs.setdefault("allow_sync_methods", True)
+        return HTTPXClient(*args, http2=True, **kwargs)
 
-def new_default_http_client(*args: Any, **kwargs: Any) -> "HTTPClient":
     impl = RequestsClient
     return impl(*args, **kwargs)
 
 
 def new_http_client_async_fallback(*args: Any, **kwargs: Any) -> "HTTPClient":
-    impl = NoImportFoundAsyncClient
+    if httpx:
+        impl = HTTPXClient
+    else:
+        impl = NoImportFoundAsyncClient
     return impl(*args, **kwargs)
 
 
+def _capped_timeouts(
+    connect: float, read: float, timeout: Optional[float], read_timeout: Optional[float]
+) -> tuple[float, float]:
+    """
+    `(connect, read)` timeouts of one attempt: the client's own values capped
+    by the time left before the deadline and by a learned read timeout.
+    """
+    if read_timeout is not None:
+        read = min(read, read_timeout)
+    if timeout is not None:
+        connect, read = min(connect, timeout), min(read, timeout)
+    return connect, read
+
+
+_RESET_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, ConnectionAbortedError, BrokenPipeError)
+
+
+def _exception_chain(e: BaseException) -> Iterable[BaseException]:
+    # requests keeps the urllib3 error in `args`, urllib3 in `__cause__`.
+    seen: list[BaseException] = []
+    current: Optional[BaseException] = e
+    while current is not None and not any(current is other for other in seen):
+        seen.append(current)
+        yield current
+        wrapped = next((arg for arg in current.args if isinstance(arg, BaseException)), None)
+        current = wrapped or current.__cause__ or current.__context__
+
+
+def _reset_before_response(e: BaseException) -> bool:
+    """
+    Whether `e` (or an error it wraps) says the connection was dropped
+    before any byte of the response arrived. urllib3 reports those as
+    "Connection aborted.", and as "Connection broken" once a response started.
+    """
+    for current in _exception_chain(e):
+        if isinstance(current, urllib3.exceptions.ProtocolError):
+            args = current.args
+            return len(args) == 2 and args[0] == "Connection aborted." and isinstance(args[1], _RESET_ERRORS)
+    return False
+
+
+def _failed_to_connect(e: BaseException) -> bool:
+    """
+    Whether `e` (or an error it wraps) happened while opening the
+    connection, before any part of the request was sent.
+    """
+    return any(
+        isinstance(current, (urllib3.exceptions.NewConnectionError, urllib3.exceptions.ConnectTimeoutError))
+        for current in _exception_chain(e)
+    )
+
+
+def _socket_options(tcp_keepalive: Optional[float]) -> dict[str, Any]:
+    if tcp_keepalive is None:
+        return {}
+    return {"socket_options": _keepalive_socket_options(tcp_keepalive)}
+
+
+def _warm_up_pools(
+    pool_manager: _InstrumentedPoolManager, dns_cache: DNSCache, urls: Iterable[str], connections: int
+) -> int:
+    opened = 0
+    for url in urls:
+        parts = urlsplit(url)
+        if not parts.hostname:
+            continue
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        try:
+            dns_cache.prefetch(parts.hostname, port)
+            opened += pool_manager.open_connections(url, connections)
+        except (OSError, urllib3.exceptions.HTTPError) as e:
+            # Warming up is best effort, the first request will try again.
+            log_info("Connection warm-up failed", url=url, error=str(e))
+    log_debug("Connection warm-up done", connections=opened)
+    return opened
+
+
 class HTTPClient:
     name: ClassVar[str]
 
@@ -39,23 +192,116 @@ class HTTPClient:
         verify_ssl_certs: bool = True,
         proxy: Optional[Union[str, _Proxy]] = None,
         async_fallback_client: Optional["HTTPClient"] = None,
+        retry_budget: Optional[RetryBudget] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        hedge_policy: Optional[HedgePolicy] = None,
+        concurrency_limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+        adaptive_timeouts: Optional[AdaptiveTimeouts] = None,
+        compression: Optional[CompressionPolicy] = None,
+        ssl_context: Optional[ssl.SSLContext] = None,
     ):
         self._verify_ssl_certs = False
 
         self._proxy = None
         self._async_fallback_client = async_fallback_client
+        self._retry_budget = retry_budget if retry_budget is not None else RetryBudget()
+        self._circuit_breaker = circuit_breaker
+        self._hedge_policy = hedge_policy
+        self._concurrency_limiter = concurrency_limiter
+        self._adaptive_timeouts = adaptive_timeouts
+        self._compression = compression if compression is not None else CompressionPolicy()
+        self._ssl_context = ssl_context
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
+        self._hedge_lock = threading.Lock()
+        self._latencies = LatencyRecorder()
+        self._pool_counters = _PoolCounters()
+
+        self._thread_local = threading.local()
+        _fork.register(self)
 
+    def _after_fork(self) -> None:
+        """
+        Runs in a forked child: drops whatever belongs to the parent process
+        (pools, locks, threads) so this client starts over with fresh ones.
+        """
+        # The executor's threads don't exist in the child, just forget it.
+        self._hedge_executor = None
+        self._hedge_lock = threading.Lock()
+        self._pool_counters = _PoolCounters()
         self._thread_local = threading.local()
 
+    def _get_ssl_context(self) -> ssl.SSLContext:
+        # One context per client: building one loads the whole CA bundle,
+        # and sharing it lets new connections resume earlier TLS sessions.
+        if self._ssl_context is None:
+            self._ssl_context = create_ssl_context()
+        return self._ssl_context
+
+    def tls_stats(self) -> TLSStats:
+        """
+        Full and resumed TLS handshakes of the connections this client opened.
+        """
+        return tls_stats(self._ssl_context)
+
+    def _should_replay(self, method: str, url: str, api_connection_error: Optional[APIConnectionError]) -> bool:
+        # A pooled connection the server or a load balancer closed while it
+        # sat idle fails before the request gets anywhere. Idempotent calls
+        # are sent again right away on a fresh connection; this doesn't count
+        # as a retry nor draw from the retry budget.
+        if api_connection_error is None or not api_connection_error.connection_reset:
+            return False
+        if method.lower() not in IDEMPOTENT_METHODS:
+            return False
+        self._pool_counters.record_replay()
+        log_info("Connection reset before any response, replaying request", method=method, url=url)
+        return True
+
     def _should_retry(
         self,
-        *args,
-        **kwargs,
-    ):
-        return False
+        method: str,
+        response: Optional[tuple[Any, int, Mapping[str, str]]],
+        api_connection_error: Optional[APIConnectionError],
+        num_retries: int,
+        max_network_retries: Optional[int],
+    ) -> bool:
+        max_network_retries = max_network_retries if max_network_retries is not None else 0
+        if num_retries >= max_network_retries:
+            return False
+
+        # Khipu has no idempotency keys, so a POST that may have reached the
+        # server (a timeout, a reset, a 502/504 from a gateway) is never sent
+        # twice. Only an explicit "not processed" answer is retried.
+        idempotent = method.lower() in IDEMPOTENT_METHODS
 
-    def _retry_after_header(self, response: Optional[tuple[Any, Any, Mapping[str, str]]] = None):
-        return None
+        if response is None:
+            # Subclasses decide which driver errors are worth retrying and
+            # flag them on the APIConnectionError they raise.
+            assert api_connection_error is not None
+            return idempotent and api_connection_error.should_retry
+
+        _, status_code, _ = response
+        if idempotent:
+            return status_code in RETRYABLE_STATUS_CODES
+        return status_code in RETRYABLE_STATUS_CODES_NOT_PROCESSED
+
+    def _retry_after_header(self, response: Optional[tuple[Any, Any, Mapping[str, str]]] = None) -> Optional[float]:
+        if response is None:
+            return None
+        _, _, rheaders = response
+        value = rheaders.get("retry-after") if rheaders is not None else None
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError, IndexError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+        return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
 
     def _sleep_time_seconds(
         self,
@@ -91,18 +337,389 @@ class HTTPClient:
         sleep_seconds *= 0.5 * (1 + random.uniform(0, 1))
         return sleep_seconds
 
+    def _retry_decision(
+        self,
+        method: str,
+        url: str,
+        response: Optional[tuple[Any, int, Mapping[str, str]]],
+        connection_error: Optional[APIConnectionError],
+        num_retries: int,
+        max_network_retries: Optional[int],
+        deadline: Optional[Deadline] = None,
+    ) -> Optional[float]:
+        """
+        Returns how long to sleep before the next attempt, or None when the
+        current outcome should be handed back to the caller.
+        """
+        if not self._should_retry(method, response, connection_error, num_retries, max_network_retries):
+            return None
+
+        sleep_time = self._sleep_time_seconds(num_retries + 1, response)
+        if deadline is not None:
+            # Don't start a retry that can't finish: the backoff plus a typical
+            # attempt on this route must fit in what is left.
+            needed = sleep_time + self._expected_attempt_time(url)
+            if needed >= deadline.remaining():
+                log_info(
+                    "Not retrying, the deadline would pass first",
+                    method=method,
+                    url=url,
+                    remaining_seconds="%.2f" % deadline.remaining(),
+                )
+                return None
+
+        if not self._retry_budget.try_acquire():
+            log_info("Retry budget exhausted, not retrying", method=method, url=url)
+            return None
+
+        if connection_error is not None:
+            log_info("Encountered a retryable error", error=connection_error.user_message)
+        log_info(
+            "Initiating retry",
+            retry=num_retries + 1,
+            method=method,
+            url=url,
+            sleep_seconds="%.2f" % sleep_time,
+        )
+        return sleep_time
+
+    def _expected_attempt_time(self, url: str) -> float:
+        """
+        Median latency observed for the route of `url`, 0 until there's data.
+        """
+        return self._latencies.histogram(get_route(url)).percentile(50) or 0.0
+
+    @staticmethod
+    def _raise_connection_error(connection_error: APIConnectionError, deadline: Optional[Deadline]) -> NoReturn:
+        if deadline is not None and deadline.expired():
+            raise DeadlineExceededError(
+                f"Deadline exceeded while waiting for Khipu: {connection_error.user_message}"
+            ) from connection_error
+        raise connection_error
+
+    @staticmethod
+    def _is_healthy_response(response: Optional[tuple[Any, int, Mapping[str, str]]]) -> bool:
+        """
+        False for connection errors and for answers that signal an overloaded
+        or failing server.
+        """
+        return response is not None and response[1] < 500 and response[1] != 429
+
+    def _before_attempt(self, url: str) -> str:
+        route = get_route(url)
+        if self._circuit_breaker is not None:
+            self._circuit_breaker.before_call(route)
+        return route
+
+    def _after_attempt(
+        self,
+        route: str,
+        response: Optional[tuple[Any, int, Mapping[str, str]]],
+        started: float,
+    ) -> None:
+        if self._circuit_breaker is not None:
+            success = response is not None and response[1] < 500
+            self._circuit_breaker.record(route, success, time.monotonic() - started)
+
+    def _limited_attempt(
+        self,
+        method: str,
+        url: str,
+        headers: Mapping[str, str],
+        post_data: Any,
+        timeout: Optional[float] = None,
+    ) -> tuple[Optional[tuple[Any, int, Mapping[str, str]]], Optional[APIConnectionError]]:
+        """
+        `_attempt` holding a slot of the concurrency limiter, if there is
+        one. The slot is taken for this attempt only, so it's free while the
+        call backs off, and the limiter learns the time of the attempt alone.
+        """
+        limiter = self._concurrency_limiter
+        if limiter is None:
+            return self._attempt(method, url, headers, post_data, timeout)
+        limiter.acquire(timeout=timeout)
+        started = time.monotonic()
+        try:
+            response, connection_error = self._attempt(method, url, headers, post_data, timeout)
+        except CircuitBreakerOpenError:
+            # Turned down before reaching Khipu: not a sign of overload.
+            limiter.cancel()
+            raise
+        except BaseException:
+            limiter.release(time.monotonic() - started, False)
+            raise
+        limiter.release(time.monotonic() - started, self._is_healthy_response(response))
+        return response, connection_error
+
+    async def _limited_attempt_async(
+        self,
+        method: str,
+        url: str,
+        headers: Mapping[str, str],
+        post_data: Any,
+        timeout: Optional[float] = None,
+    ) -> tuple[Optional[tuple[Any, int, Mapping[str, str]]], Optional[APIConnectionError]]:
+        limiter = self._concurrency_limiter
+        if limiter is None:
+            return await self._attempt_async(method, url, headers, post_data, timeout)
+        await limiter.acquire_async(self.sleep_async, timeout=timeout)
+        started = time.monotonic()
+        try:
+            response, connection_error = await self._attempt_async(method, url, headers, post_data, timeout)
+        except CircuitBreakerOpenError:
+            limiter.cancel()
+            raise
+        except BaseException:
+            limiter.release(time.monotonic() - started, False)
+            raise
+        limiter.release(time.monotonic() - started, self._is_healthy_response(response))
+        return response, connection_error
+
+    def _attempt(
+        self,
+        method: str,
+        url: str,
+        headers: Mapping[str, str],
+        post_data: Any,
+        timeout: Optional[float] = None,
+    ) -> tuple[Optional[tuple[Any, int, Mapping[str, str]]], Optional[APIConnectionError]]:
+        """
+        Makes a single (possibly hedged) attempt, reporting its outcome to the
+        circuit breaker.
+        """
+        route = self._before_attempt(url)
+        read_timeout = self._read_timeout(route)
+        started = time.monotonic()
+        response = None
+        try:
+            if self._hedge_policy is not None and method.lower() == "get":
+                response = self._hedged_request(route, method, url, headers, post_data, timeout, read_timeout)
+            else:
+                response = self._timed_request(route, method, url, headers, post_data, timeout, read_timeout)
+            return response, None
+        except APIConnectionError as e:
+            return None, e
+        finally:
+            self._after_attempt(route, response, started)
+
+    async def _attempt_async(
+        self,
+        method: str,
+        url: str,
+        headers: Mapping[str, str],
+        post_data: Any,
+        timeout: Optional[float] = None,
+    ) -> tuple[Optional[tuple[Any, int, Mapping[str, str]]], Optional[APIConnectionError]]:
+        route = self._before_attempt(url)
+        read_timeout = self._read_timeout(route)
+        started = time.monotonic()
+        response = None
+        try:
+            if self._hedge_policy is not None and method.lower() == "get":
+                response = await self._hedged_request_async(
+                    route, method, url, headers, post_data, timeout, read_timeout
+                )
+            else:
+                response = await self._timed_request_async(
+                    route, method, url, headers, post_data, timeout, read_timeout
+                )
+            return response, None
+        except APIConnectionError as e:
+            return None, e
+        finally:
+            self._after_attempt(route, response, started)
+
+    def _timed_request(
+        self,
+        route: str,
+        method: str,
+        url: str,
+        headers: Mapping[str, str],
+        post_data: Any,
+        timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+    ) -> tuple[Any, int, Mapping[str, str]]:
+        kwargs = self._timeout_kwargs(timeout, read_timeout)
+        started = time.monotonic()
+        try:
+            response = self.request(method, url, headers, post_data, **kwargs)
+        except APIConnectionError:
+            self._record_timed_out(route, started, read_timeout)
+            raise
+        self._latencies.record(route, time.monotonic() - started)
+        return response
+
+    async def _timed_request_async(
+        self,
+        route: str,
+        method: str,
+        url: str,
+        headers: Mapping[str, str],
+        post_data: Any,
+        timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+    ) -> tuple[Any, int, Mapping[str, str]]:
+        kwargs = self._timeout_kwargs(timeout, read_timeout)
+        started = time.monotonic()
+        try:
+            response = await self.request_async(method, url, headers, post_data, **kwargs)
+        except APIConnectionError:
+            self._record_timed_out(route, started, read_timeout)
+            raise
+        self._latencies.record(route, time.monotonic() - started)
+        return response
+
+    def _read_timeout(self, route: str) -> Optional[float]:
+        if self._adaptive_timeouts is None:
+            return None
+        return self._adaptive_timeouts.read_timeout(route, self._latencies.histogram(route))
+
+    @staticmethod
+    def _timeout_kwargs(timeout: Optional[float], read_timeout: Optional[float]) -> dict[str, float]:
+        # Only pass what is set, custom clients may not take these arguments.
+        kwargs = {}
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        if read_timeout is not None:
+            kwargs["read_timeout"] = read_timeout
+        return kwargs
+
+    def _record_timed_out(self, route: str, started: float, read_timeout: Optional[float]) -> None:
+        # An attempt cut short by a learned timeout still counts as a (slow)
+        # sample, otherwise a timeout that is too tight could never grow back.
+        elapsed = time.monotonic() - started
+        if read_timeout is not None and elapsed >= read_timeout:
+            self._latencies.record(route, elapsed)
+
+    def _get_hedge_executor(self) -> ThreadPoolExecutor:
+        if self._hedge_executor is None:
+            with self._hedge_lock:
+                if self._hedge_executor is None:
+                    assert self._hedge_policy is not None
+                    self._hedge_executor = ThreadPoolExecutor(
+                        max_workers=self._hedge_policy.max_workers,
+                        thread_name_prefix="khipu-hedge",
+                    )
+        return self._hedge_executor
+
+    def _shutdown_hedge_executor(self) -> None:
+        executor, self._hedge_executor = self._hedge_executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _hedged_request(
+        self,
+        route: str,
+        method: str,
+        url: str,
+        headers: Mapping[str, str],
+        post_data: Any,
+        timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+    ) -> tuple[Any, int, Mapping[str, str]]:
+        policy = self._hedge_policy
+        assert policy is not None
+        policy.budget.record_request()
+        delay = policy.delay(self._latencies.histogram(route))
+        if delay is None:
+            return self._timed_request(route, method, url, headers, post_data, timeout, read_timeout)
+
+        executor = self._get_hedge_executor()
+        args = (route, method, url, headers, post_data, timeout, read_timeout)
+        primary = executor.submit(self._timed_request, *args)
+        try:
+            return primary.result(timeout=delay)
+        except FutureTimeoutError:
+            pass
+        if not policy.budget.try_acquire():
+            return primary.result()
+
+        log_debug("Hedging slow request", method=method, url=url, delay_seconds="%.3f" % delay)
+        pending = {primary, executor.submit(self._timed_request, *args)}
+        error: Optional[APIConnectionError] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except APIConnectionError as e:
+                    error = e
+                    continue
+                # A thread can't be interrupted: the slower attempt finishes
+                # in the background and its answer is discarded.
+                for loser in pending:
+                    loser.cancel()
+                return response
+        assert error is not None
+        raise error
+
+    async def _hedged_request_async(
+        self,
+        route: str,
+        method: str,
+        url: str,
+        headers: Mapping[str, str],
+        post_data: Any,
+        timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+    ) -> tuple[Any, int, Mapping[str, str]]:
+        policy = self._hedge_policy
+        assert policy is not None
+        policy.budget.record_request()
+        delay = policy.delay(self._latencies.histogram(route))
+        if delay is None:
+            return await self._timed_request_async(route, method, url, headers, post_data, timeout, read_timeout)
+
+        responses: list[tuple[Any, int, Mapping[str, str]]] = []
+        errors: list[APIConnectionError] = []
+        in_flight = [0]
+
+        async with anyio.create_task_group() as task_group:
+
+            async def attempt(wait: float) -> None:
+                if wait:
+                    await anyio.sleep(wait)
+                    if not policy.budget.try_acquire():
+                        return
+                    log_debug("Hedging slow request", method=method, url=url, delay_seconds="%.3f" % delay)
+                in_flight[0] += 1
+                try:
+                    responses.append(
+                        await self._timed_request_async(route, method, url, headers, post_data, timeout, read_timeout)
+                    )
+                except APIConnectionError as e:
+                    errors.append(e)
+                    in_flight[0] -= 1
+                    # Nothing else is on the wire: stop waiting for a hedge.
+                    if in_flight[0] == 0:
+                        task_group.cancel_scope.cancel()
+                    return
+                # First answer wins, the other attempt is cancelled.
+                task_group.cancel_scope.cancel()
+
+            task_group.start_soon(attempt, 0)
+            task_group.start_soon(attempt, delay)
+
+        if responses:
+            return responses[0]
+        raise errors[-1]
+
     def request_with_retries(
         self,
         method: str,
         url: str,
         headers: Mapping[str, str],
         post_data: Any = None,
+        max_network_retries: Optional[int] = None,
+        deadline: Optional[Deadline] = None,
     ) -> tuple[str, int, Mapping[str, str]]:
         return self._request_with_retries_internal(
             method,
             url,
             headers,
             post_data,
+            max_network_retries=max_network_retries,
+            deadline=deadline,
         )
 
     def _request_with_retries_internal(
@@ -111,20 +728,91 @@ class HTTPClient:
         url: str,
         headers: Mapping[str, str],
         post_data: Any,
+        max_network_retries: Optional[int],
+        deadline: Optional[Deadline] = None,
     ) -> tuple[Any, int, Mapping[str, str]]:
+        self._retry_budget.record_request()
+        headers, post_data = self._compression.apply(headers, post_data)
+        num_retries = 0
+        replayed = False
 
-        try:
-            response = self.request(method, url, headers, post_data)
-            connection_error = None
-        except APIConnectionError as e:
-            connection_error = e
-            response = None
+        while True:
+            # Each attempt gets at most the time left before the deadline.
+            timeout = None
+            if deadline is not None:
+                deadline.check(f"sending {method.upper()} {url}")
+                timeout = deadline.remaining()
+            response, connection_error = self._limited_attempt(method, url, headers, post_data, timeout)
+            if not replayed and self._should_replay(method, url, connection_error):
+                replayed = True
+                continue
 
-        if response is not None:
-            return response
-        else:
-            assert connection_error is not None
-            raise connection_error
+            sleep_time = self._retry_decision(
+                method, url, response, connection_error, num_retries, max_network_retries, deadline
+            )
+            if sleep_time is not None:
+                num_retries += 1
+                time.sleep(sleep_time)
+            elif response is not None:
+                return response
+            else:
+                assert connection_error is not None
+                self._raise_connection_error(connection_error, deadline)
+
+    async def request_with_retries_async(
+        self,
+        method: str,
+        url: str,
+        headers: Mapping[str, str],
+        post_data: Any = None,
+        max_network_retries: Optional[int] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> tuple[Any, int, Mapping[str, str]]:
+        return await self._request_with_retries_internal_async(
+            method,
+            url,
+            headers,
+            post_data,
+            max_network_retries=max_network_retries,
+            deadline=deadline,
+        )
+
+    async def _request_with_retries_internal_async(
+        self,
+        method: str,
+        url: str,
+        headers: Mapping[str, str],
+        post_data: Any,
+        max_network_retries: Optional[int],
+        deadline: Optional[Deadline] = None,
+    ) -> tuple[Any, int, Mapping[str, str]]:
+        self._retry_budget.record_request()
+        headers, post_data = self._compression.apply(headers, post_data)
+        num_retries = 0
+        replayed = False
+
+        while True:
+            # Each attempt gets at most the time left before the deadline.
+            timeout = None
+            if deadline is not None:
+                deadline.check(f"sending {method.upper()} {url}")
+                timeout = deadline.remaining()
+            response, connection_error = await self._limited_attempt_async(method, url, headers, post_data, timeout)
+            if not replayed and self._should_replay(method, url, connection_error):
+                replayed = True
+                continue
+
+            sleep_time = self._retry_decision(
+                method, url, response, connection_error, num_retries, max_network_retries, deadline
+            )
+            if sleep_time is not None:
+                num_retries += 1
+                await self.sleep_async(sleep_time)
+            elif response is not None:
+                return response
+            else:
+                assert connection_error is not None
+                self._raise_connection_error(connection_error, deadline)
 
     def request(
         self,
@@ -133,15 +821,146 @@ class HTTPClient:
         headers: Optional[Mapping[str, str]],
         post_data: Any = None,
         *,
+        timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
         _usage: Optional[list[str]] = None,
     ) -> tuple[str, int, Mapping[str, str]]:
+        """
+        Makes a single request. When given, `timeout` caps the connect and
+        read timeouts of this call (the time left before its deadline) and
+        `read_timeout` caps the read timeout only.
+        """
         raise NotImplementedError("HTTPClient subclasses must implement `request`")
 
     def close(self):
         raise NotImplementedError("HTTPClient subclasses must implement `close`")
 
+    def warmup(self, urls: Iterable[str], connections: int = 1) -> int:
+        """
+        Resolves and caches the hosts of `urls` and opens up to `connections`
+        keep-alive connections to each, so the first calls don't pay for DNS
+        and the TCP/TLS handshakes. Returns the number of open connections.
+
+        Clients that can't open connections ahead of traffic do nothing.
+        """
+        return 0
+
+    async def request_async(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Mapping[str, str]],
+        post_data: Any = None,
+        *,
+        timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+    ) -> tuple[bytes, int, Mapping[str, str]]:
+        """
+        Clients that don't do async natively hand the request over to their
+        `async_fallback_client`, so every coroutine shares that client's pool.
+        """
+        if self._async_fallback_client is not None:
+            kwargs = self._timeout_kwargs(timeout, read_timeout)
+            return await self._async_fallback_client.request_async(method, url, headers, post_data, **kwargs)
+        raise NotImplementedError("HTTPClient subclasses must implement `request_async`")
+
+    async def request_stream_async(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Mapping[str, str]],
+        post_data: Any = None,
+    ) -> tuple[Any, int, Mapping[str, str]]:
+        if self._async_fallback_client is not None:
+            return await self._async_fallback_client.request_stream_async(method, url, headers, post_data)
+        raise NotImplementedError("HTTPClient subclasses must implement `request_stream_async`")
+
+    async def close_async(self):
+        if self._async_fallback_client is not None:
+            return await self._async_fallback_client.close_async()
+        raise NotImplementedError("HTTPClient subclasses must implement `close_async`")
+
+    def sleep_async(self, secs: float) -> Awaitable[None]:
+        if self._async_fallback_client is not None:
+            return self._async_fallback_client.sleep_async(secs)
+        raise NotImplementedError("HTTPClient subclasses must implement `sleep_async`")
+
+
+class _PooledHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose connection pools report into the owning client's counters.
+    """
+
+    def __init__(
+        self,
+        counters: _PoolCounters,
+        dns_cache: Optional[DNSCache] = None,
+        max_idle: Optional[float] = None,
+        tcp_keepalive: Optional[float] = None,
+        ssl_context: Optional[ssl.SSLContext] = None,
+        **kwargs,
+    ):
+        self._counters = counters
+        self._dns_cache = dns_cache
+        self._max_idle = max_idle
+        self._tcp_keepalive = tcp_keepalive
+        self._ssl_context = ssl_context
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        self.poolmanager = _InstrumentedPoolManager(
+            num_pools=connections,
+            maxsize=maxsize,
+            block=block,
+            counters=self._counters,
+            dns_cache=self._dns_cache,
+            max_idle=self._max_idle,
+            **_socket_options(self._tcp_keepalive),
+            **pool_kwargs,
+        )
+
+    def build_connection_pool_key_attributes(self, request, verify, cert=None):
+        host_params, pool_kwargs = super().build_connection_pool_key_attributes(request, verify, cert)
+        # Verified and without a client certificate: the client's own context
+        # does the job, instead of a new one per connection. It was built from
+        # REQUESTS_CA_BUNDLE when that is what turned `verify` into a path.
+        if self._ssl_context is not None and verify is not False and cert is None:
+            pool_kwargs["ssl_context"] = self._ssl_context
+        return host_params, pool_kwargs
+
+    def cert_verify(self, conn, url, verify, cert):
+        super().cert_verify(conn, url, verify, cert)
+        if self._ssl_context is not None and conn.conn_kw.get("ssl_context") is self._ssl_context:
+            # The context already trusts them, don't load them again per connection.
+            conn.ca_certs = None
+            conn.ca_cert_dir = None
+
 
 class RequestsClient(HTTPClient):
+    """
+    HTTP client built on requests. Every thread shares one `requests.Session`
+    and therefore one set of urllib3 pools: `pool_connections` is the number of
+    hosts to keep pools for, `pool_maxsize` the connections kept per host and
+    `pool_block` makes callers wait for a free connection instead of opening
+    an extra, unpooled one.
+
+    `timeout` is the read timeout of each attempt and `connect_timeout` (which
+    defaults to `timeout`) the time allowed to open a connection. With a
+    `dns_cache` new connections skip the DNS lookup.
+
+    Pooled connections idle for more than `max_idle` seconds are reconnected
+    before reuse; set it below the idle timeout of the load balancer in front
+    of Khipu. `tcp_keepalive` turns on TCP keepalive probes after that many
+    idle seconds, which keeps idle connections alive instead.
+
+    Every TLS connection shares one `ssl_context`, by default built for this
+    client from certifi's bundle (or `REQUESTS_CA_BUNDLE`), so connections
+    opened later resume an earlier TLS session; see `tls_stats()`.
+    """
+
     name = "requests"
 
     def __init__(
@@ -151,27 +970,133 @@ class RequestsClient(HTTPClient):
         verify_ssl_certs: bool = True,
         proxy: Optional[Union[str, HTTPClient._Proxy]] = None,
         async_fallback_client: Optional[HTTPClient] = None,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        pool_block: bool = False,
+        retry_budget: Optional[RetryBudget] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        hedge_policy: Optional[HedgePolicy] = None,
+        concurrency_limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+        connect_timeout: Optional[float] = None,
+        adaptive_timeouts: Optional[AdaptiveTimeouts] = None,
+        dns_cache: Optional[DNSCache] = None,
+        compression: Optional[CompressionPolicy] = None,
+        max_idle: Optional[float] = None,
+        tcp_keepalive: Optional[float] = None,
+        ssl_context: Optional[ssl.SSLContext] = None,
         **kwargs,
     ):
         super().__init__(
             verify_ssl_certs=verify_ssl_certs,
             proxy=proxy,
             async_fallback_client=async_fallback_client,
+            retry_budget=retry_budget,
+            circuit_breaker=circuit_breaker,
+            hedge_policy=hedge_policy,
+            concurrency_limiter=concurrency_limiter,
+            adaptive_timeouts=adaptive_timeouts,
+            compression=compression,
+            ssl_context=ssl_context,
         )
         self._session = session
+        self._owns_session = session is None
         self._timeout = timeout
+        self._connect_timeout = connect_timeout if connect_timeout is not None else timeout
+        self._pool_connections = pool_connections
+        self._pool_maxsize = pool_maxsize
+        self._pool_block = pool_block
+        self._dns_cache = dns_cache
+        self._max_idle = max_idle
+        self._tcp_keepalive = tcp_keepalive
+        self._session_lock = threading.Lock()
 
         assert requests is not None
         self.requests = requests
 
+    def _get_session(self) -> "RequestsSession":
+        session = self._session
+        if session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = self.requests.Session()
+                    adapter = _PooledHTTPAdapter(
+                        self._pool_counters,
+                        dns_cache=self._dns_cache,
+                        max_idle=self._max_idle,
+                        tcp_keepalive=self._tcp_keepalive,
+                        ssl_context=self._get_ssl_context(),
+                        pool_connections=self._pool_connections,
+                        pool_maxsize=self._pool_maxsize,
+                        pool_block=self._pool_block,
+                    )
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+                session = self._session
+        return session
+
+    def _after_fork(self) -> None:
+        super()._after_fork()
+        self._session_lock = threading.Lock()
+        if self._owns_session:
+            # Not closed on purpose: its sockets are shared with the parent.
+            self._session = None
+        elif self._session is not None:
+            for adapter in self._session.adapters.values():
+                if isinstance(adapter, HTTPAdapter):
+                    adapter.init_poolmanager(
+                        adapter._pool_connections, adapter._pool_maxsize, block=adapter._pool_block
+                    )
+
+    def _get_ssl_context(self) -> ssl.SSLContext:
+        if self._ssl_context is None:
+            # requests lets these variables replace certifi's bundle.
+            cafile = os.environ.get("REQUESTS_CA_BUNDLE") or os.environ.get("CURL_CA_BUNDLE")
+            self._ssl_context = create_ssl_context(cafile)
+        return self._ssl_context
+
+    def _get_pool_manager(self) -> Optional[_InstrumentedPoolManager]:
+        adapter = self._get_session().get_adapter("https://")
+        poolmanager = getattr(adapter, "poolmanager", None)
+        return poolmanager if isinstance(poolmanager, _InstrumentedPoolManager) else None
+
+    def pool_stats(self) -> PoolStats:
+        """
+        Live numbers for the connections held by this client's session.
+        """
+        poolmanager = self._get_pool_manager()
+        if poolmanager is None:
+            raise ValueError("Pool stats are not available for a user supplied session.")
+        return poolmanager.stats()
+
+    def warmup(self, urls: Iterable[str], connections: int = 1) -> int:
+        poolmanager = self._get_pool_manager()
+        if poolmanager is None:
+            log_info("Connection warm-up is not available for a user supplied session.")
+            return 0
+        if self._dns_cache is None:
+            self._dns_cache = DNSCache()
+            poolmanager.set_dns_cache(self._dns_cache)
+        return _warm_up_pools(poolmanager, self._dns_cache, urls, connections)
+
+    def _transport_timeout(
+        self, timeout: Optional[float], read_timeout: Optional[float] = None
+    ) -> tuple[float, float]:
+        return _capped_timeouts(self._connect_timeout, self._timeout, timeout, read_timeout)
+
     def request(
         self,
         method: str,
         url: str,
         headers: Optional[Mapping[str, str]],
         post_data=None,
+        *,
+        timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
     ) -> tuple[bytes, int, Mapping[str, str]]:
-        return self._request_internal(method, url, headers, post_data, is_streaming=False)
+        return self._request_internal(
+            method, url, headers, post_data, is_streaming=False, timeout=timeout, read_timeout=read_timeout
+        )
 
     def request_stream(
         self,
@@ -179,8 +1104,13 @@ class RequestsClient(HTTPClient):
         url: str,
         headers: Optional[Mapping[str, str]],
         post_data=None,
+        *,
+        timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
     ) -> tuple[Any, int, Mapping[str, str]]:
-        return self._request_internal(method, url, headers, post_data, is_streaming=True)
+        return self._request_internal(
+            method, url, headers, post_data, is_streaming=True, timeout=timeout, read_timeout=read_timeout
+        )
 
     @overload
     def _request_internal(
@@ -190,6 +1120,8 @@ class RequestsClient(HTTPClient):
         headers: Optional[Mapping[str, str]],
         post_data,
         is_streaming: Literal[True],
+        timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
     ) -> tuple[Any, int, Mapping[str, str]]: ...
 
     @overload
@@ -200,6 +1132,8 @@ class RequestsClient(HTTPClient):
         headers: Optional[Mapping[str, str]],
         post_data,
         is_streaming: Literal[False],
+        timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
     ) -> tuple[bytes, int, Mapping[str, str]]: ...
 
     def _request_internal(
@@ -209,6 +1143,8 @@ class RequestsClient(HTTPClient):
         headers: Optional[Mapping[str, str]],
         post_data,
         is_streaming: bool,
+        timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
     ) -> tuple[Union[bytes, Any], int, Mapping[str, str]]:
         kwargs = {}
         if self._verify_ssl_certs:
@@ -222,17 +1158,16 @@ class RequestsClient(HTTPClient):
         if is_streaming:
             kwargs["stream"] = True
 
-        if getattr(self._thread_local, "session", None) is None:
-            self._thread_local.session = self._session or self.requests.Session()
+        session = self._get_session()
 
         try:
             try:
-                result = cast("RequestsSession", self._thread_local.session).request(
+                result = session.request(
                     method,
                     url,
                     headers=headers,
                     data=post_data,
-                    timeout=self._timeout,
+                    timeout=self._transport_timeout(timeout, read_timeout),
                     **kwargs,
                 )
             except TypeError as e:
@@ -301,11 +1236,420 @@ class RequestsClient(HTTPClient):
             should_retry = False
 
         msg = textwrap.fill(msg) + f"\n\n(Network error: {err})"
-        raise APIConnectionError(msg, should_retry=should_retry) from e
+        raise APIConnectionError(
+            msg,
+            should_retry=should_retry,
+            connection_reset=_reset_before_response(e),
+            connect_failed=_failed_to_connect(e),
+        ) from e
+
+    def close(self):
+        # Closing the session clears every pool, so no connection survives.
+        if self._session is not None:
+            self._session.close()
+        if self._dns_cache is not None:
+            self._dns_cache.stop()
+        self._shutdown_hedge_executor()
+
+
+class Urllib3Client(HTTPClient):
+    """
+    HTTP client built directly on a urllib3 `PoolManager`, without the
+    `requests.Session` machinery (hooks, cookie jar, adapter lookup and
+    header merging) that `RequestsClient` runs on every call. It takes the
+    same pool, timeout, `dns_cache`, `max_idle` and `tcp_keepalive` options,
+    reports the same `pool_stats()` and maps errors the same way.
+    """
+
+    name = "urllib3"
+
+    def __init__(
+        self,
+        timeout: float = 80,
+        connect_timeout: Optional[float] = None,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        pool_block: bool = False,
+        dns_cache: Optional[DNSCache] = None,
+        max_idle: Optional[float] = None,
+        tcp_keepalive: Optional[float] = None,
+        **kwargs,
+    ):
+        if kwargs.get("compression") is None:
+            # urllib3, unlike requests and httpx, sends no Accept-Encoding.
+            kwargs["compression"] = CompressionPolicy(accept_encoding=DEFAULT_ACCEPT_ENCODING)
+        super().__init__(**kwargs)
+        self._dns_cache = dns_cache
+        self._max_idle = max_idle
+        self._tcp_keepalive = tcp_keepalive
+        self._timeout = timeout
+        self._connect_timeout = connect_timeout if connect_timeout is not None else timeout
+        self._pool_connections = pool_connections
+        self._pool_maxsize = pool_maxsize
+        self._pool_block = pool_block
+        self._pool_manager: Optional[_InstrumentedPoolManager] = None
+        self._pool_manager_lock = threading.Lock()
+
+    def _after_fork(self) -> None:
+        super()._after_fork()
+        self._pool_manager_lock = threading.Lock()
+        self._pool_manager = None
+
+    def _get_pool_manager(self) -> _InstrumentedPoolManager:
+        pool_manager = self._pool_manager
+        if pool_manager is None:
+            with self._pool_manager_lock:
+                if self._pool_manager is None:
+                    self._pool_manager = _InstrumentedPoolManager(
+                        num_pools=self._pool_connections,
+                        maxsize=self._pool_maxsize,
+                        block=self._pool_block,
+                        counters=self._pool_counters,
+                        dns_cache=self._dns_cache,
+                        max_idle=self._max_idle,
+                        cert_reqs="CERT_REQUIRED",
+                        ssl_context=self._get_ssl_context(),
+                        **_socket_options(self._tcp_keepalive),
+                    )
+                pool_manager = self._pool_manager
+        return pool_manager
+
+    def pool_stats(self) -> PoolStats:
+        """
+        Live numbers for the connections held by this client.
+        """
+        return self._get_pool_manager().stats()
+
+    def warmup(self, urls: Iterable[str], connections: int = 1) -> int:
+        pool_manager = self._get_pool_manager()
+        if self._dns_cache is None:
+            self._dns_cache = DNSCache()
+            pool_manager.set_dns_cache(self._dns_cache)
+        return _warm_up_pools(pool_manager, self._dns_cache, urls, connections)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Mapping[str, str]],
+        post_data=None,
+        *,
+        timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+    ) -> tuple[bytes, int, Mapping[str, str]]:
+        return self._request_internal(
+            method, url, headers, post_data, preload_content=True, timeout=timeout, read_timeout=read_timeout
+        )
+
+    def request_stream(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Mapping[str, str]],
+        post_data=None,
+        *,
+        timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+    ) -> tuple[Any, int, Mapping[str, str]]:
+        return self._request_internal(
+            method, url, headers, post_data, preload_content=False, timeout=timeout, read_timeout=read_timeout
+        )
+
+    def _request_internal(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Mapping[str, str]],
+        post_data,
+        preload_content: bool,
+        timeout: Optional[float],
+        read_timeout: Optional[float],
+    ) -> tuple[Any, int, Mapping[str, str]]:
+        connect, read = _capped_timeouts(self._connect_timeout, self._timeout, timeout, read_timeout)
+        try:
+            response = self._get_pool_manager().request(
+                method.upper(),
+                url,
+                body=post_data,
+                headers=headers,
+                timeout=urllib3.Timeout(connect=connect, read=read),
+                # Retries are handled by `request_with_retries`.
+                retries=False,
+                preload_content=preload_content,
+            )
+        except Exception as e:
+            self._handle_request_error(e)
+
+        content = response.data if preload_content else response
+        return content, response.status, response.headers
+
+    def _handle_request_error(self, e: Exception) -> NoReturn:
+        # Same policy as RequestsClient: certificate problems are final,
+        # timeouts and broken connections are worth retrying.
+        if isinstance(e, urllib3.exceptions.SSLError):
+            msg = (
+                "Could not verify Khipu's SSL certificate.  Please make "
+                "sure that your network is not intercepting certificates."
+            )
+            err = f"{type(e).__name__}: {str(e)}"
+            should_retry = False
+        elif isinstance(e, (urllib3.exceptions.TimeoutError, urllib3.exceptions.ProtocolError)):
+            msg = "Unexpected error communicating with Khipu."
+            err = f"{type(e).__name__}: {str(e)}"
+            should_retry = True
+        elif isinstance(e, urllib3.exceptions.HTTPError):
+            msg = "Unexpected error communicating with Khipu."
+            err = f"{type(e).__name__}: {str(e)}"
+            should_retry = False
+        else:
+            msg = (
+                "Unexpected error communicating with Khipu. "
+                "It looks like there's probably a configuration "
+                "issue locally."
+            )
+            err = f"A {type(e).__name__} was raised"
+            if str(e):
+                err += f" with error message {str(e)}"
+            else:
+                err += " with no error message"
+            should_retry = False
+
+        msg = textwrap.fill(msg) + f"\n\n(Network error: {err})"
+        raise APIConnectionError(
+            msg,
+            should_retry=should_retry,
+            connection_reset=_reset_before_response(e),
+            connect_failed=_failed_to_connect(e),
+        ) from e
 
     def close(self):
-        if getattr(self._thread_local, "session", None) is not None:
-            self._thread_local.session.close()
+        if self._pool_manager is not None:
+            self._pool_manager.clear()
+        if self._dns_cache is not None:
+            self._dns_cache.stop()
+        self._shutdown_hedge_executor()
+
+
+class HTTPXClient(HTTPClient):
+    """
+    HTTP client built on httpx. A single `httpx.AsyncClient` (and its
+    connection pool) is shared by every coroutine using this client, so many
+    concurrent requests don't need one thread each.
+
+    With `http2=True` (requires `khipu-tools[http2]`) requests to the same
+    `api_base` are multiplexed as streams over a few HTTP/2 connections
+    instead of taking one connection each. `http1=False` forces HTTP/2 with
+    prior knowledge, for cleartext servers that don't negotiate via ALPN.
+
+    `connect_timeout` sets the time allowed to open a connection separately
+    from `timeout`, which then covers reads, writes and pool waits.
+    """
+
+    name = "httpx"
+
+    _client: Optional["HTTPXClientType"]
+    # Keeps the task closing the async pool from `close` alive.
+    _closing: Optional["asyncio.Task[None]"] = None
+
+    def __init__(
+        self,
+        timeout: Optional[Union[float, "HTTPXTimeout"]] = 80,
+        allow_sync_methods: bool = False,
+        max_connections: Optional[int] = 100,
+        max_keepalive_connections: Optional[int] = 20,
+        http2: bool = False,
+        http1: bool = True,
+        connect_timeout: Optional[float] = None,
+        _lib=None,  # used for internal unit testing
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+
+        if _lib is None:
+            _lib = httpx
+        self.httpx = _lib
+        if self.httpx is None:
+            raise ImportError("Unexpected: tried to initialize HTTPXClient but the httpx module is not present.")
+
+        client_kwargs = {
+            "verify": self._get_ssl_context(),
+            "http1": http1,
+            "http2": http2,
+            "limits": self.httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            ),
+        }
+
+        self._client_kwargs = client_kwargs
+        self._allow_sync_methods = allow_sync_methods
+        self._create_clients()
+        if connect_timeout is not None and not isinstance(timeout, self.httpx.Timeout):
+            timeout = self.httpx.Timeout(timeout, connect=connect_timeout)
+        self._timeout = timeout
+
+    def _create_clients(self) -> None:
+        self._client_async = self.httpx.AsyncClient(**self._client_kwargs)
+        self._client = None
+        if self._allow_sync_methods:
+            self._client = self.httpx.Client(**self._client_kwargs)
+
+    def _after_fork(self) -> None:
+        super()._after_fork()
+        # New httpx clients, the inherited pools hold the parent's sockets.
+        self._create_clients()
+
+    def sleep_async(self, secs: float) -> Awaitable[None]:
+        return anyio.sleep(secs)
+
+    def _get_request_args_kwargs(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Mapping[str, str]],
+        post_data,
+        timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+    ) -> tuple[tuple[str, str], dict[str, Any]]:
+        kwargs: dict[str, Any] = {}
+
+        if timeout is not None or read_timeout is not None:
+            kwargs["timeout"] = self._capped_timeout(timeout, read_timeout)
+        elif self._timeout:
+            kwargs["timeout"] = self._timeout
+        return (method, url), {"headers": headers, "content": post_data, **kwargs}
+
+    def _capped_timeout(self, timeout: Optional[float], read_timeout: Optional[float] = None) -> "HTTPXTimeout":
+        base = self._timeout
+        if not isinstance(base, self.httpx.Timeout):
+            base = self.httpx.Timeout(base)
+
+        def cap(value: Optional[float], limit: Optional[float]) -> Optional[float]:
+            if limit is None:
+                return value
+            return limit if value is None else min(value, limit)
+
+        return self.httpx.Timeout(
+            connect=cap(base.connect, timeout),
+            read=cap(cap(base.read, read_timeout), timeout),
+            write=cap(base.write, timeout),
+            pool=cap(base.pool, timeout),
+        )
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Mapping[str, str]],
+        post_data=None,
+        *,
+        timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+    ) -> tuple[bytes, int, Mapping[str, str]]:
+        if self._client is None:
+            raise RuntimeError(
+                "HTTPXClient was initialized with allow_sync_methods=False, "
+                "so it cannot be used for synchronous requests."
+            )
+        args, kwargs = self._get_request_args_kwargs(method, url, headers, post_data, timeout, read_timeout)
+        try:
+            response = self._client.request(*args, **kwargs)
+        except Exception as e:
+            self._handle_request_error(e)
+
+        return response.content, response.status_code, response.headers
+
+    async def request_async(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Mapping[str, str]],
+        post_data=None,
+        *,
+        timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+    ) -> tuple[bytes, int, Mapping[str, str]]:
+        args, kwargs = self._get_request_args_kwargs(method, url, headers, post_data, timeout, read_timeout)
+        try:
+            response = await self._client_async.request(*args, **kwargs)
+        except Exception as e:
+            self._handle_request_error(e)
+
+        return response.content, response.status_code, response.headers
+
+    async def request_stream_async(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Mapping[str, str]],
+        post_data=None,
+        *,
+        timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+    ) -> tuple[Any, int, Mapping[str, str]]:
+        args, kwargs = self._get_request_args_kwargs(method, url, headers, post_data, timeout, read_timeout)
+        try:
+            response = await self._client_async.send(
+                request=self._client_async.build_request(*args, **kwargs),
+                stream=True,
+            )
+        except Exception as e:
+            self._handle_request_error(e)
+
+        return response.aiter_bytes(), response.status_code, response.headers
+
+    def _handle_request_error(self, e: Exception) -> NoReturn:
+        # Mirror RequestsClient: timeouts and connect errors are worth
+        # retrying, anything else points at a local problem.
+        if isinstance(e, (self.httpx.TimeoutException, self.httpx.NetworkError)):
+            msg = "Unexpected error communicating with Khipu."
+            should_retry = True
+        else:
+            msg = (
+                "Unexpected error communicating with Khipu. "
+                "It looks like there's probably a configuration "
+                "issue locally."
+            )
+            should_retry = False
+
+        err = f"A {type(e).__name__} was raised"
+        if str(e):
+            err += f" with error message {str(e)}"
+        msg = textwrap.fill(msg) + f"\n\n(Network error: {err})"
+        # httpcore's way of saying a pooled connection was found closed.
+        connection_reset = isinstance(e, self.httpx.RemoteProtocolError) and "without sending a response" in str(e)
+        connect_failed = isinstance(e, (self.httpx.ConnectError, self.httpx.ConnectTimeout))
+        raise APIConnectionError(
+            msg, should_retry=should_retry, connection_reset=connection_reset, connect_failed=connect_failed
+        ) from e
+
+    def close(self):
+        """
+        Closes both pools and the hedging threads. The async pool can only
+        be closed from a coroutine: with no event loop running in this
+        thread one is run for it, otherwise its closing is scheduled on the
+        running loop. Prefer `close_async` from async code.
+        """
+        if self._client is not None:
+            self._client.close()
+        self._shutdown_hedge_executor()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            try:
+                anyio.run(self._client_async.aclose)
+            except RuntimeError:
+                # Connections opened on an event loop that is closed by now
+                # can't be closed from another one; they go away with it.
+                pass
+        else:
+            self._closing = loop.create_task(self._client_async.aclose())
+
+    async def close_async(self):
+        if self._client is not None:
+            self._client.close()
+        self._shutdown_hedge_executor()
+        await self._client_async.aclose()
 
 
 class NoImportFoundAsyncClient(HTTPClient):
@@ -322,7 +1666,7 @@ class NoImportFoundAsyncClient(HTTPClient):
         )
 
     async def request_async(
-        self, method: str, url: str, headers: Mapping[str, str], post_data=None
+        self, method: str, url: str, headers: Mapping[str, str], post_data=None, *, timeout=None, read_timeout=None
     ) -> tuple[bytes, int, Mapping[str, str]]:
         self.raise_async_client_import_error()
 
@@ -331,3 +1675,6 @@ class NoImportFoundAsyncClient(HTTPClient):
 
     async def close_async(self):
         self.raise_async_client_import_error()
+
+    def sleep_async(self, secs: float) -> Awaitable[None]:
+        self.raise_async_client_import_error()
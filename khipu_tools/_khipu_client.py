@@ -4,14 +4,19 @@ import khipu_tools
 from khipu_tools._api_mode import ApiMode
 from khipu_tools._api_requestor import _APIRequestor
 from khipu_tools._client_options import _ClientOptions
+from khipu_tools._endpoints import _endpoint_urls
 from khipu_tools._error import AuthenticationError
 from khipu_tools._http_client import (
     HTTPClient,
+    HTTPXClient,
     new_default_http_client,
     new_http_client_async_fallback,
 )
 from khipu_tools._khipu_object import KhipuObject
 from khipu_tools._khipu_response import KhipuResponse
+from khipu_tools._lanes import PriorityLanes
+from khipu_tools._middleware import MiddlewareChain
+from khipu_tools._rate_limiter import RateLimiter
 from khipu_tools._request_options import extract_options_from_dict
 from khipu_tools._requestor_options import BaseAddresses, RequestorOptions
 from khipu_tools._util import _convert_to_khipu_object, get_api_mode
@@ -24,6 +29,12 @@ class KhipuClient:
         *,
         base_addresses: BaseAddresses = {},
         http_client: Optional[HTTPClient] = None,
+        max_network_retries: Optional[int] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        lanes: Optional[PriorityLanes] = None,
+        priority: Optional[str] = None,
+        middleware: Optional[MiddlewareChain] = None,
+        http2: Optional[bool] = None,
     ):
 
         if api_key is None:
@@ -37,26 +48,46 @@ class KhipuClient:
         requestor_options = RequestorOptions(
             api_key=api_key,
             base_addresses=base_addresses,
+            max_network_retries=(
+                max_network_retries if max_network_retries is not None else khipu_tools.max_network_retries
+            ),
+            priority=priority,
         )
 
         if http_client is None:
+            if http2 is None:
+                http2 = khipu_tools.http2
             http_client = new_default_http_client(
-                async_fallback_client=new_http_client_async_fallback(),
+                http2=http2,
+                async_fallback_client=None if http2 else new_http_client_async_fallback(),
             )
 
         self._requestor = _APIRequestor(
             options=requestor_options,
             client=http_client,
+            rate_limiter=rate_limiter,
+            lanes=lanes,
+            middleware=middleware,
         )
 
         self._options = _ClientOptions()
 
+    def warmup(self, connections: int = 1) -> int:
+        """
+        Resuelve el DNS de las `base_addresses` configuradas y abre hasta
+        `connections` conexiones persistentes hacia cada una antes del primer
+        request. Retorna la cantidad de conexiones abiertas.
+        """
+        urls = [url for value in self._requestor.base_addresses.values() for url in _endpoint_urls(value)]
+        return self._requestor._get_http_client().warmup(urls, connections)
+
     def raw_request(self, method_: str, url_: str, **params):
         params = params.copy()
         options, params = extract_options_from_dict(params)
         api_mode = get_api_mode(url_)
-        base_address = params.pop("api")
+        base_address = params.pop("base", "api")
 
+        timings: dict[str, float] = {}
         rbody, rcode, rheaders = self._requestor.request_raw(
             method_,
             url_,
@@ -64,10 +95,10 @@ class KhipuClient:
             options=options,
             base_address=base_address,
             api_mode=api_mode,
-            usage=["raw_request"],
+            timings=timings,
         )
 
-        return self._requestor._interpret_response(rbody, rcode, rheaders, api_mode)
+        return self._requestor._interpret_response(rbody, rcode, rheaders, api_mode, timings)
 
     def deserialize(
         self,
@@ -82,3 +113,65 @@ class KhipuClient:
             requestor=self._requestor,
             api_mode=api_mode,
         )
+
+
+class AsyncKhipuClient(KhipuClient):
+    """
+    Variante de `KhipuClient` pensada para asyncio. Todas las llamadas comparten
+    el pool de conexiones de un único `HTTPXClient`.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        *,
+        base_addresses: BaseAddresses = {},
+        http_client: Optional[HTTPClient] = None,
+        max_network_retries: Optional[int] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        lanes: Optional[PriorityLanes] = None,
+        priority: Optional[str] = None,
+        middleware: Optional[MiddlewareChain] = None,
+        http2: Optional[bool] = None,
+    ):
+        if http_client is None:
+            http_client = HTTPXClient(http2=http2 if http2 is not None else khipu_tools.http2)
+
+        super().__init__(
+            api_key,
+            base_addresses=base_addresses,
+            http_client=http_client,
+            max_network_retries=max_network_retries,
+            rate_limiter=rate_limiter,
+            lanes=lanes,
+            priority=priority,
+            middleware=middleware,
+        )
+
+    async def raw_request_async(self, method_: str, url_: str, **params) -> KhipuResponse:
+        params = params.copy()
+        options, params = extract_options_from_dict(params)
+        api_mode = get_api_mode(url_)
+        base_address = params.pop("base", "api")
+
+        timings: dict[str, float] = {}
+        rbody, rcode, rheaders = await self._requestor.request_raw_async(
+            method_,
+            url_,
+            params=params,
+            options=options,
+            base_address=base_address,
+            api_mode=api_mode,
+            timings=timings,
+        )
+
+        return self._requestor._interpret_response(rbody, rcode, rheaders, api_mode, timings)
+
+    async def close_async(self):
+        await self._requestor._get_http_client().close_async()
+
+    async def __aenter__(self) -> "AsyncKhipuClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close_async()
@@ -1,15 +1,22 @@
-import json
-from collections import OrderedDict
 from collections.abc import Mapping
+from types import MappingProxyType
+
+from khipu_tools._json import get_json_codec
+
+
+_NO_TIMINGS: Mapping[str, float] = MappingProxyType({})
 
 
 class KhipuResponseBase:
     code: int
     headers: Mapping[str, str]
+    timings: Mapping[str, float]
+    """Seconds each middleware spent on this call, by middleware name."""
 
     def __init__(self, code: int, headers: Mapping[str, str]):
         self.code = code
         self.headers = headers
+        self.timings = _NO_TIMINGS
 
 
 class KhipuResponse(KhipuResponseBase):
@@ -19,4 +26,4 @@ class KhipuResponse(KhipuResponseBase):
     def __init__(self, body: str, code: int, headers: Mapping[str, str]):
         KhipuResponseBase.__init__(self, code, headers)
         self.body = body
-        self.data = json.loads(body, object_pairs_hook=OrderedDict)
+        self.data = get_json_codec().loads(body)
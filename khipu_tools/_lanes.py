@@ -0,0 +1,194 @@
+import threading
+import time
+from collections.abc import Sequence
+from typing import Awaitable, Callable, Literal, Optional, TypedDict
+
+from khipu_tools import _fork
+from khipu_tools._error import ConcurrencyLimitExceededError
+from khipu_tools._http_client import HTTPClient, new_default_http_client, new_http_client_async_fallback
+
+
+class LaneStats(TypedDict):
+    in_flight: int
+    queued: int
+    shed: int
+    """Calls rejected since the lane was created."""
+
+
+class Lane:
+    """
+    A named class of traffic with at most `max_concurrency` calls in flight
+    and its own HTTP client, so its connections can't be taken by other
+    lanes. Without an `http_client` one is created with a pool the size of
+    `max_concurrency`.
+
+    Calls over the cap wait in a queue of at most `max_queue` callers for up
+    to `max_wait` seconds. While a higher priority lane has callers waiting,
+    this lane's calls are held back (`on_backlog="delay"`) or rejected right
+    away (`on_backlog="shed"`).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        max_queue: int = 100,
+        max_wait: float = 5.0,
+        on_backlog: Literal["delay", "shed"] = "delay",
+        http_client: Optional[HTTPClient] = None,
+    ):
+        if on_backlog not in ("delay", "shed"):
+            raise ValueError(f"Unknown backlog policy {on_backlog!r}")
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.on_backlog = on_backlog
+        self._owns_client = http_client is None
+        self.http_client = http_client or new_default_http_client(
+            pool_maxsize=max_concurrency,
+            async_fallback_client=new_http_client_async_fallback(),
+        )
+        self.in_flight = 0
+        self.queued = 0
+        self.shed = 0
+
+    def close(self) -> None:
+        if self._owns_client:
+            self.http_client.close()
+
+
+class PriorityLanes:
+    """
+    Lanes listed from the highest priority to the lowest. Calls pick a lane
+    by name through the `priority` request option or `KhipuClient(priority=...)`;
+    calls that don't go to `default`, the first lane unless told otherwise.
+
+    Interactive traffic such as checkout goes in a high priority lane and
+    batch jobs in a lower one: each lane is capped on its own, and the batch
+    lane backs off as soon as checkout calls start queueing.
+    """
+
+    def __init__(self, lanes: Sequence[Lane], default: Optional[str] = None):
+        if not lanes:
+            raise ValueError("PriorityLanes needs at least one lane")
+        self._lanes = list(lanes)
+        self._by_name = {lane.name: lane for lane in self._lanes}
+        self.default = default if default is not None else self._lanes[0].name
+        self.lane(self.default)
+        self._condition = threading.Condition()
+        _fork.register(self)
+
+    def _after_fork(self) -> None:
+        # Calls in flight belong to the parent's threads, not to this process.
+        self._condition = threading.Condition()
+        for lane in self._lanes:
+            lane.in_flight = 0
+            lane.queued = 0
+
+    def lane(self, name: Optional[str]) -> Lane:
+        lane = self._by_name.get(name if name is not None else self.default)
+        if lane is None:
+            raise ValueError(f"Unknown priority lane {name!r}, expected one of {list(self._by_name)}")
+        return lane
+
+    def _backlogged_above(self, lane: Lane) -> bool:
+        for other in self._lanes:
+            if other is lane:
+                return False
+            if other.queued > 0:
+                return True
+        return False
+
+    def _try_enter(self, lane: Lane) -> bool:
+        if lane.in_flight < lane.max_concurrency and not self._backlogged_above(lane):
+            lane.in_flight += 1
+            return True
+        return False
+
+    def _check_admission(self, lane: Lane) -> None:
+        if lane.queued >= lane.max_queue:
+            raise self._shed(lane, "queue is full")
+        if lane.on_backlog == "shed" and self._backlogged_above(lane):
+            raise self._shed(lane, "higher priority calls are waiting")
+
+    def _shed(self, lane: Lane, reason: str) -> ConcurrencyLimitExceededError:
+        lane.shed += 1
+        return ConcurrencyLimitExceededError(
+            f"Request shed from lane {lane.name!r}: {reason} "
+            f"(limit={lane.max_concurrency}, in_flight={lane.in_flight}, queued={lane.queued})."
+        )
+
+    def _max_wait(self, lane: Lane, timeout: Optional[float]) -> float:
+        return lane.max_wait if timeout is None else min(lane.max_wait, timeout)
+
+    def acquire(self, name: Optional[str], timeout: Optional[float] = None) -> Lane:
+        """
+        Takes a slot in lane `name`, waiting if needed. Returns the lane,
+        which must be handed back to `release`.
+        """
+        lane = self.lane(name)
+        with self._condition:
+            if self._try_enter(lane):
+                return lane
+            self._check_admission(lane)
+            lane.queued += 1
+            try:
+                deadline = time.monotonic() + self._max_wait(lane, timeout)
+                while not self._try_enter(lane):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self._shed(lane, "timed out waiting for a slot")
+                    self._condition.wait(remaining)
+            finally:
+                lane.queued -= 1
+                # Lower lanes may have been waiting on this queue to drain.
+                self._condition.notify_all()
+        return lane
+
+    async def acquire_async(
+        self, name: Optional[str], sleep: Callable[[float], Awaitable[None]], timeout: Optional[float] = None
+    ) -> Lane:
+        # A threading.Condition can't be awaited, so async callers poll with
+        # a short, growing pause.
+        lane = self.lane(name)
+        with self._condition:
+            if self._try_enter(lane):
+                return lane
+            self._check_admission(lane)
+            lane.queued += 1
+        try:
+            deadline = time.monotonic() + self._max_wait(lane, timeout)
+            pause = 0.001
+            while True:
+                with self._condition:
+                    if self._try_enter(lane):
+                        return lane
+                if time.monotonic() >= deadline:
+                    with self._condition:
+                        raise self._shed(lane, "timed out waiting for a slot")
+                await sleep(pause)
+                pause = min(pause * 2, 0.05)
+        finally:
+            with self._condition:
+                lane.queued -= 1
+                self._condition.notify_all()
+
+    def release(self, lane: Lane) -> None:
+        with self._condition:
+            lane.in_flight -= 1
+            self._condition.notify_all()
+
+    def stats(self) -> dict[str, LaneStats]:
+        with self._condition:
+            return {
+                lane.name: {"in_flight": lane.in_flight, "queued": lane.queued, "shed": lane.shed}
+                for lane in self._lanes
+            }
+
+    def close(self) -> None:
+        """
+        Closes the HTTP clients the lanes created for themselves.
+        """
+        for lane in self._lanes:
+            lane.close()
@@ -0,0 +1,108 @@
+import math
+import threading
+from typing import Optional
+
+from khipu_tools import _fork
+
+
+class LatencyHistogram:
+    """
+    Streaming latency summary with log-spaced buckets, in the spirit of an
+    HDR histogram: constant memory, O(1) inserts and percentiles accurate to
+    `precision` (2% by default) between `lowest` and `highest` seconds.
+
+    Once `max_count` samples have been seen every bucket is halved, so old
+    observations fade and the summary follows latency changes.
+    """
+
+    def __init__(
+        self,
+        lowest: float = 0.001,
+        highest: float = 600.0,
+        precision: float = 0.02,
+        max_count: int = 10_000,
+    ):
+        self.lowest = lowest
+        self.highest = highest
+        self.precision = precision
+        self.max_count = max_count
+        self._log_base = math.log1p(precision)
+        self._buckets = [0] * (self._index(highest) + 1)
+        self._count = 0
+        self._lock = threading.Lock()
+        _fork.register(self)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+
+    def _index(self, value: float) -> int:
+        if value <= self.lowest:
+            return 0
+        return int(math.log(value / self.lowest) / self._log_base) + 1
+
+    def _value(self, index: int) -> float:
+        if index == 0:
+            return self.lowest
+        return self.lowest * math.exp(index * self._log_base)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def record(self, seconds: float) -> None:
+        index = min(self._index(seconds), len(self._buckets) - 1)
+        with self._lock:
+            self._buckets[index] += 1
+            self._count += 1
+            if self._count >= self.max_count:
+                self._decay()
+
+    def _decay(self) -> None:
+        self._buckets = [n // 2 for n in self._buckets]
+        self._count = sum(self._buckets)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """
+        Returns the latency under which `p` percent of the samples fall, or
+        None when nothing was recorded yet.
+        """
+        with self._lock:
+            if self._count == 0:
+                return None
+            target = max(1, math.ceil(self._count * p / 100.0))
+            seen = 0
+            for index, n in enumerate(self._buckets):
+                seen += n
+                if seen >= target:
+                    return self._value(index)
+        return self.highest
+
+
+class LatencyRecorder:
+    """
+    One `LatencyHistogram` per route, created on first use.
+    """
+
+    def __init__(self, **histogram_kwargs):
+        self._histogram_kwargs = histogram_kwargs
+        self._histograms: dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+        _fork.register(self)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+
+    def histogram(self, route: str) -> LatencyHistogram:
+        histogram = self._histograms.get(route)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.get(route)
+                if histogram is None:
+                    histogram = self._histograms[route] = LatencyHistogram(**self._histogram_kwargs)
+        return histogram
+
+    def record(self, route: str, seconds: float) -> None:
+        self.histogram(route).record(seconds)
+
+    def routes(self) -> list[str]:
+        return list(self._histograms)
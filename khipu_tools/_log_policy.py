@@ -0,0 +1,77 @@
+import random
+import re
+from collections.abc import Iterable, Mapping
+from typing import Callable, Optional
+from urllib.parse import urlsplit
+
+import khipu_tools
+
+# Params that identify the payer or carry their data.
+DEFAULT_REDACTED = (
+    "payer_name",
+    "payer_email",
+    "personal_identifier",
+    "fixed_payer_personal_identifier",
+    "bank_account_number",
+    "responsible_user_email",
+)
+
+
+class LogPolicy:
+    """
+    What the request logs keep of each call to Khipu. Only applies when
+    `khipu_tools.log` or the "khipu" logger has the level enabled; with
+    logging off none of this runs.
+
+    `sample_rates` logs only a fraction of the calls to a route, given as
+    its path (`{"/v3/banks": 0.01}`); other routes are always logged, and
+    calls that fail are logged whatever their rate. The values of the
+    `redact` params are replaced in URLs and bodies, and bodies are cut at
+    `max_body` characters (None keeps them whole).
+    """
+
+    def __init__(
+        self,
+        sample_rates: Optional[Mapping[str, float]] = None,
+        max_body: Optional[int] = 2048,
+        redact: Iterable[str] = DEFAULT_REDACTED,
+        _random: Callable[[], float] = random.random,
+    ):
+        self.sample_rates = dict(sample_rates or {})
+        self.max_body = max_body
+        self._random = _random
+        names = "|".join(re.escape(name) for name in redact)
+        # `"name": "value"` in JSON bodies and `name=value` in query strings.
+        self._json = re.compile(rf'("(?:{names})"\s*:\s*)"(?:[^"\\]|\\.)*"') if names else None
+        self._query = re.compile(rf"((?:^|[?&])(?:{names})=)[^&#]*") if names else None
+
+    def sampled(self, url: str) -> bool:
+        if not self.sample_rates:
+            return True
+        path = urlsplit(url).path
+        rate = self.sample_rates.get("/" + "/".join(path.split("/", 3)[1:3]))
+        return rate is None or self._random() < rate
+
+    def url(self, url: str) -> str:
+        if self._query is None or "?" not in url:
+            return url
+        return self._query.sub(r"\1[redacted]", url)
+
+    def body(self, body: object) -> object:
+        if body is None:
+            return None
+        text = body.decode("utf-8", "replace") if isinstance(body, (bytes, bytearray)) else str(body)
+        if self._json is not None:
+            text = self._json.sub(r'\1"[redacted]"', text)
+        if self._query is not None and not text.startswith(("{", "[")):
+            text = self._query.sub(r"\1[redacted]", text)
+        if self.max_body is not None and len(text) > self.max_body:
+            text = f"{text[: self.max_body]}...({len(text)} chars)"
+        return text
+
+
+_default_policy = LogPolicy()
+
+
+def get_log_policy() -> LogPolicy:
+    return khipu_tools.log_policy or _default_policy
@@ -0,0 +1,144 @@
+import time
+from collections.abc import Mapping, Sequence
+from typing import Awaitable, Callable, Optional, TypedDict
+
+from khipu_tools._latency import LatencyRecorder
+from khipu_tools._protocol import KhipuRequest
+
+RawResponse = tuple[object, int, Mapping[str, str]]
+CallNext = Callable[[KhipuRequest], RawResponse]
+CallNextAsync = Callable[[KhipuRequest], Awaitable[RawResponse]]
+
+
+class MiddlewareStats(TypedDict):
+    samples: int
+    p50: Optional[float]
+    """Seconds spent in the middleware itself, without the calls it made."""
+    p99: Optional[float]
+
+
+class Middleware:
+    """
+    Runs around every call sent to Khipu. `handle` gets the request and
+    `call_next`, which sends it on to the next middleware and, after the
+    last one, to Khipu. A middleware may pass on a changed request
+    (`request._replace(headers=...)`), return an answer without calling
+    `call_next`, or wrap it in `try` to see the answer or the error.
+
+    The answer is the raw `(body, status, headers)` of the HTTP response,
+    before it's parsed. `handle_async` does the same for async calls; both
+    just pass the call on unless overridden.
+    """
+
+    @property
+    def name(self) -> str:
+        return type(self).__name__
+
+    def handle(self, request: KhipuRequest, call_next: CallNext) -> RawResponse:
+        return call_next(request)
+
+    async def handle_async(self, request: KhipuRequest, call_next: CallNextAsync) -> RawResponse:
+        return await call_next(request)
+
+
+class MiddlewareChain:
+    """
+    Middleware run in order, the first one outermost. Set it on
+    `khipu_tools.middleware` for module level calls or pass it to
+    `KhipuClient(middleware=...)`.
+
+    The time each middleware spends on a call is recorded, not counting
+    the middleware after it nor the HTTP call. Each response has the times
+    of its own call in `KhipuResponse.timings` (`obj.last_response.timings`),
+    and `stats` aggregates them per middleware. An empty chain is skipped
+    altogether.
+    """
+
+    def __init__(self, middleware: Sequence[Middleware] = ()):
+        self._middleware = tuple(middleware)
+        self._names = tuple(m.name for m in self._middleware)
+        if len(set(self._names)) != len(self._names):
+            raise ValueError(f"Middleware names must be unique, got {list(self._names)}")
+        self._timings = LatencyRecorder(lowest=1e-6, highest=60.0)
+
+    def __len__(self) -> int:
+        return len(self._middleware)
+
+    def send(
+        self, request: KhipuRequest, transport: CallNext, timings: Optional[dict[str, float]] = None
+    ) -> RawResponse:
+        """
+        Runs `request` through the chain, with `transport` sending it at
+        the end. The time of each middleware is also put in `timings`.
+        """
+        middleware = self._middleware
+        names = self._names
+        recorder = self._timings
+        clock = time.perf_counter
+
+        def call(index: int, request: KhipuRequest) -> RawResponse:
+            if index == len(middleware):
+                return transport(request)
+            downstream = 0.0
+
+            def call_next(request: KhipuRequest) -> RawResponse:
+                nonlocal downstream
+                started = clock()
+                try:
+                    return call(index + 1, request)
+                finally:
+                    downstream += clock() - started
+
+            started = clock()
+            try:
+                return middleware[index].handle(request, call_next)
+            finally:
+                spent = clock() - started - downstream
+                recorder.record(names[index], spent)
+                if timings is not None:
+                    timings[names[index]] = spent
+
+        return call(0, request)
+
+    async def send_async(
+        self, request: KhipuRequest, transport: CallNextAsync, timings: Optional[dict[str, float]] = None
+    ) -> RawResponse:
+        middleware = self._middleware
+        names = self._names
+        recorder = self._timings
+        clock = time.perf_counter
+
+        async def call(index: int, request: KhipuRequest) -> RawResponse:
+            if index == len(middleware):
+                return await transport(request)
+            downstream = 0.0
+
+            async def call_next(request: KhipuRequest) -> RawResponse:
+                nonlocal downstream
+                started = clock()
+                try:
+                    return await call(index + 1, request)
+                finally:
+                    downstream += clock() - started
+
+            started = clock()
+            try:
+                return await middleware[index].handle_async(request, call_next)
+            finally:
+                spent = clock() - started - downstream
+                recorder.record(names[index], spent)
+                if timings is not None:
+                    timings[names[index]] = spent
+
+        return await call(0, request)
+
+    def stats(self) -> dict[str, MiddlewareStats]:
+        stats: dict[str, MiddlewareStats] = {}
+        for name in self._names:
+            histogram = self._timings.histogram(name)
+            stats[name] = {
+                "samples": histogram.count,
+                "p50": histogram.percentile(50),
+                "p99": histogram.percentile(99),
+            }
+        return stats
@@ -1,12 +1,22 @@
+import datetime
 from decimal import Decimal
-from typing import ClassVar, Optional, TypeVar
+from typing import Any, ClassVar, Optional, TypeVar, Union
 
 from typing import Literal
-from typing_extensions import Unpack
+from typing_extensions import NotRequired, Unpack
 
 from khipu_tools._api_resource import APIResource
 from khipu_tools._khipu_object import KhipuObject
+from khipu_tools._prepared import PreparedRequest
 from khipu_tools._request_options import RequestOptions
+from khipu_tools._schema import (
+    Currency,
+    ParamSchema,
+    amount_precision,
+    check_amount,
+    check_date,
+    required_with,
+)
 
 T = TypeVar("T", bound=KhipuObject)
 
@@ -22,7 +32,7 @@ class Payments(APIResource[T]):
 
         amount: str
         """ El monto del cobro. Sin separador de miles y usando '.' como separador de decimales. Hasta 4 lugares decimales, dependiendo de la moneda. """
-        currency: Literal["CLP", "CLF", "ARS", "PEN", "MXN", "USD", "EUR", "BOB", "COP"]
+        currency: Currency
         """El código de moneda en formato ISO-4217."""
         subject: str
         """Motivo."""
@@ -44,9 +54,9 @@ class Payments(APIResource[T]):
         """La dirección del web-service que utilizará khipu para notificar cuando el pago esté conciliado."""
         contract_url: Optional[str]
         """La dirección URL del archivo PDF con el contrato a firmar mediante este pago. El cobrador debe estar habilitado para este servicio y el campo fixed_payer_personal_identifier es obligatorio."""
-        notify_api_version: Literal["3.0"]
+        notify_api_version: NotRequired[Literal["3.0"]]
         """Versión de la API de notificaciones para recibir avisos por web-service. Solo está soportada la version 3.0. para versiones anteriores pyeden usar la libreria pykhipu"""
-        expires_date: Optional[str]
+        expires_date: Optional[Union[str, datetime.datetime]]
         """Fecha máxima para ejecutar el pago (en formato ISO-8601). El cliente podrá realizar varios intentos de pago hasta dicha fecha. Cada intento tiene un plazo individual de 3 horas para su ejecución."""
         send_email: Optional[bool]
         """Si es True, se enviará una solicitud de cobro al correo especificado en payer_email."""
@@ -64,13 +74,23 @@ class Payments(APIResource[T]):
         """Comisión para el integrador. Sólo es válido si la cuenta de cobro tiene una cuenta de integrador asociada."""
         collect_account_uuid: Optional[str]
         """Para cuentas de cobro con más cuenta propia. Permite elegir la cuenta donde debe ocurrir la transferencia."""
-        confirm_timeout_date: Optional[str]
+        confirm_timeout_date: Optional[Union[str, datetime.datetime]]
         """Fecha de rendición del cobro. Es también la fecha final para poder reembolsar el cobro. Formato ISO-8601."""
         mandatory_payment_method: Optional[str]
         """El cobro sólo se podrá pagar utilizando el medio de pago especificado. Los posibles valores para este campo se encuentran en el campo id de la respuesta del endpoint /api/3.0/merchants/paymentMethods."""
         psp_client_merchant_name: Optional[str]
         """Nombre del comercio final para quien un proveedor de servicios de pago procesa un pago. Requerido para transacciones de clientes PSP; no aplicable para otros."""
 
+    _create_schema: ClassVar[ParamSchema] = ParamSchema(
+        PaymentParams,
+        checks={"amount": check_amount, "expires_date": check_date, "confirm_timeout_date": check_date},
+        rules=[
+            amount_precision,
+            required_with("send_email", ["payer_name", "payer_email"]),
+            required_with("contract_url", ["fixed_payer_personal_identifier"]),
+        ],
+    )
+
     class PaymentCreateResponse(KhipuObject):
         payment_id: str
         """Identificador único del pago, es una cadena alfanumérica de 12 caracteres. Como este identificador es único, se puede usar, por ejemplo, para evitar procesar una notificación repetida. (Khipu espera un código 200 al notificar un pago, si esto no ocurre se reintenta hasta por dos días)."""
@@ -188,12 +208,40 @@ class Payments(APIResource[T]):
             "post",
             cls.class_url(),
             params=params,
+            schema=cls._create_schema,
+        )
+        if not isinstance(result, KhipuObject):
+            raise TypeError("Expected KhipuObject object from API, got %s" % (type(result).__name__))
+
+        return result
+
+    @classmethod
+    async def create_async(
+        cls, **params: Unpack["Payments.PaymentParams"]
+    ) -> KhipuObject["Payments.PaymentCreateResponse"]:
+        """
+        Versión asíncrona de `create`.
+        """
+        result = await cls._static_request_async(
+            "post",
+            cls.class_url(),
+            params=params,
+            schema=cls._create_schema,
         )
         if not isinstance(result, KhipuObject):
             raise TypeError("Expected KhipuObject object from API, got %s" % (type(result).__name__))
 
         return result
 
+    @classmethod
+    def prepare(cls, **params: Any) -> PreparedRequest:
+        """
+        Prepara la creación de muchos pagos que solo difieren en algunos campos, por ejemplo cobros de
+        suscripciones. Los parámetros comunes se validan y codifican una sola vez; cada
+        `send(amount=..., transaction_id=..., payer_email=...)` agrega solo los suyos.
+        """
+        return PreparedRequest(cls.class_url(), params, cls._create_schema)
+
     @classmethod
     def get(cls, **params: Unpack["Payments.PaymentInfo"]) -> KhipuObject["Payments"]:
         """
@@ -202,6 +250,22 @@ class Payments(APIResource[T]):
         result = cls._static_request(
             "get",
             f"{cls.class_url()}/{params['payment_id']}",
+            params={k: v for k, v in params.items() if k != "payment_id"},
+        )
+        if not isinstance(result, KhipuObject):
+            raise TypeError("Expected KhipuObject object from API, got %s" % (type(result).__name__))
+
+        return result
+
+    @classmethod
+    async def get_async(cls, **params: Unpack["Payments.PaymentInfo"]) -> KhipuObject["Payments"]:
+        """
+        Versión asíncrona de `get`.
+        """
+        result = await cls._static_request_async(
+            "get",
+            f"{cls.class_url()}/{params['payment_id']}",
+            params={k: v for k, v in params.items() if k != "payment_id"},
         )
         if not isinstance(result, KhipuObject):
             raise TypeError("Expected KhipuObject object from API, got %s" % (type(result).__name__))
@@ -216,6 +280,20 @@ class Payments(APIResource[T]):
         result = cls._static_request(
             "delete",
             f"{cls.class_url()}/{params['payment_id']}",
+            params={k: v for k, v in params.items() if k != "payment_id"},
+        )
+
+        return result
+
+    @classmethod
+    async def delete_async(cls, **params: Unpack["Payments.PaymentInfo"]) -> bool:
+        """
+        Versión asíncrona de `delete`.
+        """
+        result = await cls._static_request_async(
+            "delete",
+            f"{cls.class_url()}/{params['payment_id']}",
+            params={k: v for k, v in params.items() if k != "payment_id"},
         )
 
         return result
@@ -235,3 +313,20 @@ class Payments(APIResource[T]):
             raise TypeError("Expected KhipuObject object from API, got %s" % (type(result).__name__))
 
         return result
+
+    @classmethod
+    async def refund_async(
+        cls, **params: Unpack["Payments.PaymentInfo"]
+    ) -> KhipuObject["Payments.PaymentRefundResponse"]:
+        """
+        Versión asíncrona de `refund`.
+        """
+        result = await cls._static_request_async(
+            "post",
+            f"{cls.class_url()}/{params['payment_id']}/refunds",
+            params=params,
+        )
+        if not isinstance(result, KhipuObject):
+            raise TypeError("Expected KhipuObject object from API, got %s" % (type(result).__name__))
+
+        return result
@@ -6,6 +6,7 @@ from typing_extensions import Unpack
 from khipu_tools._api_resource import APIResource
 from khipu_tools._khipu_object import KhipuObject
 from khipu_tools._request_options import RequestOptions
+from khipu_tools._schema import Currency, ParamSchema, amount_precision, check_amount
 
 T = TypeVar("T", bound=KhipuObject)
 
@@ -21,9 +22,13 @@ class Predict(APIResource[T]):
         """Identificador del banco de origen"""
         amount: str
         """Monto del pago"""
-        currency: str
+        currency: Currency
         """Moneda en formato ISO-4217"""
 
+    _get_schema: ClassVar[ParamSchema] = ParamSchema(
+        PredictParams, checks={"amount": check_amount}, rules=[amount_precision]
+    )
+
     result: Literal[
         "ok",
         "new_destinatary_amount_exceeded",
@@ -49,6 +54,23 @@ class Predict(APIResource[T]):
             "get",
             cls.class_url(),
             params=params,
+            schema=cls._get_schema,
+        )
+        if not isinstance(result, KhipuObject):
+            raise TypeError("Expected KhipuObject object from API, got %s" % (type(result).__name__))
+
+        return result
+
+    @classmethod
+    async def get_async(cls, **params: Unpack["Predict.PredictParams"]) -> KhipuObject["Predict"]:
+        """
+        Versión asíncrona de `get`.
+        """
+        result = await cls._static_request_async(
+            "get",
+            cls.class_url(),
+            params=params,
+            schema=cls._get_schema,
         )
         if not isinstance(result, KhipuObject):
             raise TypeError("Expected KhipuObject object from API, got %s" % (type(result).__name__))
@@ -0,0 +1,122 @@
+from collections.abc import Mapping
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+from khipu_tools._api_requestor import _APIRequestor
+from khipu_tools._base_address import BaseAddress
+from khipu_tools._deadline import Deadline
+from khipu_tools._json import JSONCodec, get_json_codec
+from khipu_tools._protocol import KhipuRequest, parse_response, to_khipu_object
+from khipu_tools._request_options import RequestOptions, extract_options_from_dict
+from khipu_tools._schema import ParamSchema
+
+if TYPE_CHECKING:
+    from khipu_tools._khipu_object import KhipuObject
+
+# Options a call may set on its own; the others are fixed by the template.
+_PER_CALL_OPTIONS = frozenset(["timeout", "deadline"])
+
+
+def _join_objects(first: Union[str, bytes], second: Union[str, bytes]) -> Union[str, bytes]:
+    # '{"a": 1}' and '{"b": 2}' make '{"a": 1,"b": 2}'.
+    if len(second) <= 2:
+        return first
+    if len(first) <= 2:
+        return second
+    comma = b"," if isinstance(first, bytes) else ","
+    return first[:-1] + comma + second[1:]  # type: ignore[operator]
+
+
+class PreparedRequest:
+    """
+    A POST sent many times with the same params but a few. The constant
+    params are checked and serialized once, along with the URL, the headers
+    and the options; each `send` only checks and serializes its own params
+    and splices them into the body.
+
+    A call may pass `timeout` and `deadline`. Calls with other options, or
+    that repeat a constant param, take the regular path and are checked and
+    encoded in full. The URL is fixed when the template is prepared, so a
+    template made before changing `khipu_tools.api_base` keeps the old one;
+    a new `khipu_tools.api_key` is picked up by the next call.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        params: Mapping[str, Any],
+        schema: Optional[ParamSchema] = None,
+        *,
+        base_address: BaseAddress = "api",
+        requestor: Optional[_APIRequestor] = None,
+    ):
+        options, constant = extract_options_from_dict(params)
+        self._url = url
+        self._base_address = base_address
+        self._schema = schema
+        self._options = options
+        self._requestor = (requestor or _APIRequestor._global_instance())._replace_options(options)
+        self._constant = schema.encode_fields(constant)[0] if schema is not None else dict(constant)
+        # Each call replaces the body, the deadline and the params.
+        self._template = self._requestor._build_request("post", url, {}, options, base_address=base_address)
+        self._encoded: Optional[tuple[JSONCodec, Union[str, bytes]]] = None
+
+    def _current_template(self) -> KhipuRequest:
+        # Built again only if the API key is changed, for the new headers.
+        template = self._template
+        if template.options["api_key"] != self._requestor._options.api_key:
+            template = self._template = self._requestor._build_request(
+                "post", self._url, {}, self._options, base_address=self._base_address
+            )
+        return template
+
+    def _constant_body(self) -> tuple[JSONCodec, Union[str, bytes]]:
+        # Serialized again only if khipu_tools.json_codec is changed.
+        codec = get_json_codec()
+        encoded = self._encoded
+        if encoded is None or encoded[0] is not codec:
+            encoded = self._encoded = (codec, codec.dumps(self._constant))
+        return encoded
+
+    def _prepare_call(self, params: Mapping[str, Any]) -> Optional[KhipuRequest]:
+        options, fields = extract_options_from_dict(params)
+        if not _PER_CALL_OPTIONS.issuperset(options) or not self._constant.keys().isdisjoint(fields):
+            return None
+        if self._schema is not None:
+            fields = self._schema.encode(fields, base=self._constant)
+        codec, constant_body = self._constant_body()
+        body = _join_objects(constant_body, codec.dumps(fields))
+        return self._current_template()._replace(
+            body=body,
+            payload=body,
+            deadline=Deadline.from_options(options.get("timeout"), options.get("deadline")),
+            params={**self._constant, **fields},
+        )
+
+    def _regular_call(self, params: Mapping[str, Any]) -> tuple[dict[str, Any], RequestOptions]:
+        options, fields = extract_options_from_dict(params)
+        merged = {**self._constant, **fields}
+        if self._schema is not None:
+            merged = self._schema.encode(merged)
+        return merged, {**self._options, **options}
+
+    def send(self, **params: Any) -> "KhipuObject":
+        call = self._prepare_call(params)
+        if call is None:
+            merged, options = self._regular_call(params)
+            return self._requestor.request(
+                "post", self._url, params=merged, options=options, base_address=self._base_address
+            )
+        timings: dict[str, float] = {}
+        rbody, rcode, rheaders = self._requestor._send(call, timings)
+        return to_khipu_object(call, parse_response(rbody, rcode, rheaders, timings), self._requestor)
+
+    async def send_async(self, **params: Any) -> "KhipuObject":
+        call = self._prepare_call(params)
+        if call is None:
+            merged, options = self._regular_call(params)
+            return await self._requestor.request_async(
+                "post", self._url, params=merged, options=options, base_address=self._base_address
+            )
+        timings: dict[str, float] = {}
+        rbody, rcode, rheaders = await self._requestor._send_async(call, timings)
+        return to_khipu_object(call, parse_response(rbody, rcode, rheaders, timings), self._requestor)
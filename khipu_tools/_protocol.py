@@ -0,0 +1,260 @@
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, NamedTuple, NoReturn, Optional, cast
+from urllib.parse import parse_qs, urlencode, urlsplit, urlunsplit
+
+import khipu_tools
+import khipu_tools._error as error
+from khipu_tools._api_mode import ApiMode
+from khipu_tools._base_address import BaseAddress
+from khipu_tools._deadline import Deadline
+from khipu_tools._encode import _api_encode
+from khipu_tools._endpoints import EndpointSet
+from khipu_tools._json import get_json_codec
+from khipu_tools._khipu_response import KhipuResponse
+from khipu_tools._request_options import RequestOptions, merge_options
+from khipu_tools._requestor_options import RequestorOptions
+from khipu_tools._schema import _EncodedParams
+from khipu_tools._util import _convert_to_khipu_object
+
+if TYPE_CHECKING:
+    from khipu_tools._api_requestor import _APIRequestor
+    from khipu_tools._khipu_object import KhipuObject
+
+# Bounds the header sets kept per API key.
+_MAX_CACHED_HEADERS = 64
+
+# The app_info the User-Agent was built from, and the User-Agent.
+_user_agent: tuple[Any, str] = (None, "")
+_headers: dict[Optional[str], Mapping[str, str]] = {}
+
+
+class KhipuRequest(NamedTuple):
+    """
+    A call to Khipu as plain data, ready to be handed to any HTTP client.
+    Built by `build_request`; the answer goes back through `parse_response`.
+    """
+
+    method: str
+    url: str
+    """Absolute URL, including the query string."""
+    headers: Mapping[str, str]
+    body: Any
+    """The JSON body of a POST as str or bytes, None otherwise."""
+    options: RequestOptions
+    """The options of the call merged over the requestor's."""
+    max_network_retries: Optional[int]
+    deadline: Optional[Deadline]
+    base_address: BaseAddress
+    api_mode: ApiMode
+    params: Mapping[str, Any]
+    """The params sent, kept on the resulting object."""
+    payload: Any
+    """What gets logged: the query string or the body."""
+
+
+def format_app_info(info) -> str:
+    str = info["name"]
+    if info["version"]:
+        str += "/{}".format(info["version"])
+    if info["url"]:
+        str += " ({})".format(info["url"])
+    return str
+
+
+def user_agent() -> str:
+    global _user_agent
+    # set_app_info replaces app_info, so checking its identity is enough.
+    app_info, agent = _user_agent
+    if not agent or app_info is not khipu_tools.app_info:
+        app_info = khipu_tools.app_info
+        agent = f"khipu_tools/{khipu_tools.VERSION}"
+        if app_info:
+            agent += " " + format_app_info(app_info)
+        _user_agent = (app_info, agent)
+    return agent
+
+
+def request_headers(api_key: Optional[str]) -> Mapping[str, str]:
+    """
+    The headers of a call, shared by every call with the same API key.
+    The mapping is read-only: copy it to add headers.
+    """
+    agent = user_agent()
+    headers = _headers.get(api_key)
+    if headers is None or headers["User-Agent"] is not agent:
+        if len(_headers) >= _MAX_CACHED_HEADERS:
+            _headers.clear()
+        headers = MappingProxyType(
+            {
+                "User-Agent": agent,
+                "x-api-key": api_key,
+                "Content-Type": "application/json",
+            }
+        )
+        _headers[api_key] = headers
+    return headers
+
+
+def build_request(
+    requestor_options: RequestorOptions,
+    method: str,
+    url: str,
+    params: Optional[Mapping[str, Any]] = None,
+    options: Optional[RequestOptions] = None,
+    *,
+    base_address: BaseAddress,
+    api_mode: ApiMode,
+) -> KhipuRequest:
+    """
+    Turns a resource call into the request to send, without doing any I/O.
+    """
+    request_options = merge_options(requestor_options, options)
+
+    if request_options.get("api_key") is None:
+        raise error.AuthenticationError("No API key provided.")
+
+    base = requestor_options.base_addresses.get(base_address)
+    if isinstance(base, EndpointSet):
+        # Built on the first endpoint, the failover loop swaps it for the chosen one.
+        base = base.urls[0]
+    abs_url = "{}{}".format(base, url)
+
+    params = params or {}
+    if params and (method == "get" or method == "delete") and "?" in url:
+        # if we're sending params in the querystring, then we have to make sure we're not
+        # duplicating anything we got back from the server already (like in a list iterator)
+        # so, we parse the querystring the server sends back so we can merge with
+        # what we (or the user) are trying to send
+        existing_params = {}
+        for k, v in parse_qs(urlsplit(url).query).items():
+            # note: server sends back "expand[]" but users supply "expand", so we
+            # strip the brackets from the key name
+            if k.endswith("[]"):
+                existing_params[k[:-2]] = v
+            else:
+                # all querystrings are pulled out as lists.
+                # We want to keep the querystrings that actually are lists, but flatten
+                # the ones that are single values
+                existing_params[k] = v[0] if len(v) == 1 else v
+
+        params = {
+            **existing_params,
+            # user_supplied params take precedence over server params
+            **params,
+        }
+
+    headers = request_headers(request_options.get("api_key"))
+
+    # Only the form that is sent gets encoded: a query string for GET and
+    # DELETE, a JSON body for POST. It is also what gets logged.
+    if method == "get" or method == "delete":
+        encoded_params = ""
+        if params:
+            if isinstance(params, _EncodedParams):
+                # Checked and flattened by the resource's schema already.
+                encoded_params = params.query()
+            else:
+                encoded_params = urlencode(list(_api_encode(params, api_mode)))
+
+                # Don't use strict form encoding by changing the square bracket control
+                # characters back to their literals. This is fine by the server, and
+                # makes these parameter strings easier to read.
+                encoded_params = encoded_params.replace("%5B", "[").replace("%5D", "]")
+
+            # if we're sending query params, we've already merged the incoming ones with the server's "url"
+            # so we can overwrite the whole thing
+            if "?" in abs_url or "#" in abs_url:
+                scheme, netloc, path, _, fragment = urlsplit(abs_url)
+                abs_url = urlunsplit((scheme, netloc, path, encoded_params, fragment))
+            else:
+                abs_url = f"{abs_url}?{encoded_params}"
+        post_data = None
+    elif method == "post":
+        post_data = get_json_codec().dumps(params)
+        encoded_params = post_data
+    else:
+        raise error.APIConnectionError(f"Unrecognized HTTP method {method!r}.")
+
+    supplied_headers = request_options.get("headers")
+    if supplied_headers:
+        headers = {**headers, **supplied_headers}
+
+    return KhipuRequest(
+        method,
+        abs_url,
+        headers,
+        post_data,
+        request_options,
+        request_options.get("max_network_retries"),
+        Deadline.from_options(request_options.get("timeout"), request_options.get("deadline")),
+        base_address,
+        api_mode,
+        params,
+        encoded_params,
+    )
+
+
+def parse_response(
+    rbody: object,
+    rcode: int,
+    rheaders: Mapping[str, str],
+    timings: Optional[Mapping[str, float]] = None,
+) -> KhipuResponse:
+    """
+    Turns a raw answer into a `KhipuResponse`, raising the matching error
+    for answers that aren't a result. `timings` are the middleware timings
+    of the call, kept on the response.
+    """
+    try:
+        resp = KhipuResponse(
+            cast(str, rbody),
+            rcode,
+            rheaders,
+        )
+    except Exception:
+        if rcode == 429:
+            _raise_error_response(rbody, rcode, None, rheaders)
+        raise error.APIError(
+            f"Invalid response body from API: {rcode} -- " f"HTTP response  was: {rbody})",
+            cast(bytes, rbody),
+            rcode,
+            cast(bytes, rbody),
+            rheaders,
+        )
+    if rcode == 429:
+        _raise_error_response(rbody, rcode, resp.data, rheaders)
+    if timings:
+        resp.timings = timings
+    return resp
+
+
+def _raise_error_response(
+    rbody: object,
+    rcode: int,
+    resp: object,
+    rheaders: Mapping[str, str],
+) -> NoReturn:
+    message = resp.get("message") if isinstance(resp, dict) else None
+    if rcode == 429:
+        raise error.RateLimitError(
+            message or "Too many requests made to the Khipu API too quickly.",
+            cast(bytes, rbody),
+            rcode,
+            resp,
+            dict(rheaders),
+        )
+    raise error.APIError(message or f"Unexpected API error: {rcode}", cast(bytes, rbody), rcode, resp, dict(rheaders))
+
+
+def to_khipu_object(request: KhipuRequest, response: KhipuResponse, requestor: "_APIRequestor") -> "KhipuObject":
+    """
+    The result of `request` as a `KhipuObject` bound to `requestor`, which
+    follow-up calls made from the object go through.
+    """
+    return _convert_to_khipu_object(
+        resp=response,
+        params=request.params,
+        requestor=requestor,
+        api_mode=request.api_mode,
+    )
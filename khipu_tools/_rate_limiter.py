@@ -0,0 +1,170 @@
+import threading
+import time
+from collections.abc import Mapping
+from typing import Awaitable, Callable, Optional
+
+from khipu_tools import _fork
+from khipu_tools._error import RateLimitError
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        # Server feedback: no request before `paused_until`, and no faster
+        # than `server_rate` until `server_rate_until`.
+        self.paused_until = 0.0
+        self.server_rate: Optional[float] = None
+        self.server_rate_until = 0.0
+
+    def _effective_rate(self, now: float) -> float:
+        if self.server_rate is not None and now < self.server_rate_until:
+            return min(self.rate, self.server_rate)
+        return self.rate
+
+    def refill(self, now: float) -> None:
+        elapsed = max(0.0, now - max(self.updated, self.paused_until))
+        self.tokens = min(self.capacity, self.tokens + elapsed * self._effective_rate(now))
+        self.updated = max(now, self.updated)
+
+    def reserve(self, now: float) -> float:
+        """Takes a token if there is one, otherwise returns the seconds to wait."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        rate = self._effective_rate(now)
+        return (1 - self.tokens) / rate if rate > 0 else float("inf")
+
+
+class RateLimiter:
+    """
+    Client-side token bucket per API key: `rate` requests per second with
+    bursts of up to `burst`. By default callers wait for a token (at most
+    `max_wait` seconds); with `block=False` they get a `RateLimitError` right
+    away instead.
+
+    The buckets follow Khipu's answers: a 429 with `Retry-After` pauses the
+    key, and `X-RateLimit-Remaining`/`X-RateLimit-Reset` slow it down so the
+    remaining quota lasts until the window resets.
+    """
+
+    def __init__(
+        self,
+        rate: float = 10.0,
+        burst: Optional[float] = None,
+        block: bool = True,
+        max_wait: Optional[float] = 30.0,
+        _clock: Callable[[], float] = time.monotonic,
+    ):
+        if rate <= 0:
+            raise ValueError("rate must be > 0")
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.block = block
+        self.max_wait = max_wait
+        self._clock = _clock
+        self._lock = threading.Lock()
+        self._buckets: dict[str, _TokenBucket] = {}
+        _fork.register(self)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+
+    def _bucket(self, key: str, now: float) -> _TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _TokenBucket(self.rate, self.burst, now)
+        return bucket
+
+    def _reserve(self, key: str, block: Optional[bool], waited: float, timeout: Optional[float]) -> float:
+        with self._lock:
+            wait = self._bucket(key, self._clock()).reserve(self._clock())
+        if wait <= 0:
+            return 0.0
+        if not (self.block if block is None else block):
+            raise RateLimitError(f"Client-side rate limit reached, next request allowed in {wait:.2f}s.")
+        if self.max_wait is not None and waited + wait > self.max_wait:
+            raise RateLimitError(f"Client-side rate limit reached, waiting {wait:.2f}s would exceed max_wait.")
+        if timeout is not None and waited + wait > timeout:
+            raise RateLimitError(
+                f"Client-side rate limit reached, waiting {wait:.2f}s would exceed the call's timeout."
+            )
+        return wait
+
+    def acquire(self, key: str, block: Optional[bool] = None, timeout: Optional[float] = None) -> None:
+        """
+        Takes one token for `key`, sleeping until one is available unless
+        `block` (or the limiter's default) is False. `timeout` further caps
+        the wait, for calls with a deadline.
+        """
+        waited = 0.0
+        while True:
+            wait = self._reserve(key, block, waited, timeout)
+            if wait == 0:
+                return
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(
+        self,
+        key: str,
+        sleep: Callable[[float], Awaitable[None]],
+        block: Optional[bool] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        waited = 0.0
+        while True:
+            wait = self._reserve(key, block, waited, timeout)
+            if wait == 0:
+                return
+            await sleep(wait)
+            waited += wait
+
+    def update_from_headers(self, key: str, status_code: int, headers: Optional[Mapping[str, str]]) -> None:
+        if not headers:
+            return
+        retry_after = _header_float(headers, "retry-after")
+        remaining = _header_float(headers, "x-ratelimit-remaining")
+        reset = _header_float(headers, "x-ratelimit-reset")
+        if retry_after is None and remaining is None:
+            return
+
+        with self._lock:
+            now = self._clock()
+            bucket = self._bucket(key, now)
+            bucket.refill(now)
+            if reset is not None and reset > 1e9:
+                # Epoch timestamp rather than seconds from now.
+                reset = max(0.0, reset - time.time())
+
+            if status_code == 429:
+                pause = retry_after if retry_after is not None else reset
+                bucket.tokens = 0.0
+                bucket.paused_until = max(bucket.paused_until, now + (pause if pause is not None else 1.0))
+            elif remaining is not None:
+                bucket.tokens = min(bucket.tokens, remaining)
+                if reset is not None and reset > 0:
+                    if remaining <= 0:
+                        bucket.paused_until = max(bucket.paused_until, now + reset)
+                    else:
+                        bucket.server_rate = remaining / reset
+                        bucket.server_rate_until = now + reset
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+def _header_float(headers: Mapping[str, str], name: str) -> Optional[float]:
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
@@ -10,6 +10,11 @@ class RequestOptions(TypedDict):
     api_key: NotRequired["str|None"]
     content_type: NotRequired["str|None"]
     headers: NotRequired["Mapping[str, str]|None"]
+    max_network_retries: NotRequired["int|None"]
+    rate_limit_block: NotRequired["bool|None"]
+    timeout: NotRequired["float|None"]
+    deadline: NotRequired["float|None"]
+    priority: NotRequired["str|None"]
 
 
 def merge_options(
@@ -21,27 +26,55 @@ def merge_options(
             "api_key": requestor.api_key,
             "content_type": None,
             "headers": None,
+            "max_network_retries": requestor.max_network_retries,
+            "rate_limit_block": None,
+            "timeout": None,
+            "deadline": None,
+            "priority": requestor.priority,
         }
 
     return {
         "api_key": request.get("api_key") or requestor.api_key,
         "content_type": request.get("content_type"),
         "headers": request.get("headers"),
+        "max_network_retries": (
+            request.get("max_network_retries")
+            if request.get("max_network_retries") is not None
+            else requestor.max_network_retries
+        ),
+        "rate_limit_block": request.get("rate_limit_block"),
+        "timeout": request.get("timeout"),
+        "deadline": request.get("deadline"),
+        "priority": request.get("priority") or requestor.priority,
     }
 
 
+_OPTION_KEYS = frozenset(
+    [
+        "api_key",
+        "content_type",
+        "headers",
+        "max_network_retries",
+        "rate_limit_block",
+        "timeout",
+        "deadline",
+        "priority",
+    ]
+)
+
+
 def extract_options_from_dict(
     d: Optional[Mapping[str, Any]],
 ) -> tuple[RequestOptions, dict[str, Any]]:
     if not d:
         return {}, {}
     options: RequestOptions = {}
+    if _OPTION_KEYS.isdisjoint(d):
+        # Most calls carry no options: hand the params back without copying,
+        # callers don't modify them.
+        return options, d if isinstance(d, dict) else dict(d)
     d_copy = dict(d)
-    for key in [
-        "api_key",
-        "content_type",
-        "headers",
-    ]:
+    for key in _OPTION_KEYS:
         if key in d_copy:
             options[key] = d_copy.pop(key)
 
@@ -2,40 +2,95 @@ from typing import Optional
 
 import khipu_tools
 from khipu_tools._base_address import BaseAddresses
+from khipu_tools._endpoints import _as_endpoints
 
 
 class RequestorOptions:
     api_key: Optional[str]
     base_addresses: BaseAddresses
+    max_network_retries: Optional[int]
+    priority: Optional[str]
 
     def __init__(
         self,
         api_key: Optional[str] = None,
         base_addresses: BaseAddresses = {},
+        max_network_retries: Optional[int] = None,
+        priority: Optional[str] = None,
     ):
         self.api_key = api_key
         self.base_addresses = {}
+        self.max_network_retries = max_network_retries
+        self.priority = priority
 
         if base_addresses.get("api"):
-            self.base_addresses["api"] = base_addresses.get("api")
+            self.base_addresses["api"] = _as_endpoints(base_addresses.get("api"))
 
     def to_dict(self):
         return {
             "api_key": self.api_key,
             "base_addresses": self.base_addresses,
+            "max_network_retries": self.max_network_retries,
+            "priority": self.priority,
         }
 
 
 class _GlobalRequestorOptions(RequestorOptions):
     def __init__(self):
-        pass
+        self._api_base = None
+        self._base_addresses: BaseAddresses = {}
 
     @property
     def base_addresses(self):
-        return {
-            "api": khipu_tools.api_base,
-        }
+        # Rebuilt only when `khipu_tools.api_base` is assigned a new value.
+        api_base = khipu_tools.api_base
+        if api_base is not self._api_base or not self._base_addresses:
+            self._base_addresses = {"api": _as_endpoints(api_base)}
+            self._api_base = api_base
+        return self._base_addresses
 
     @property
     def api_key(self):
         return khipu_tools.api_key
+
+    @property
+    def max_network_retries(self):
+        return khipu_tools.max_network_retries
+
+    @property
+    def priority(self):
+        return None
+
+
+class _OverriddenRequestorOptions(RequestorOptions):
+    """
+    Another requestor's options with the API key and retries replaced by
+    the ones of a call. The rest is read from `parent` on each access, so
+    overrides of the global options keep following the module settings.
+    """
+
+    def __init__(
+        self,
+        parent: RequestorOptions,
+        api_key: Optional[str],
+        max_network_retries: Optional[int],
+    ):
+        self._parent = parent
+        self._api_key = api_key
+        self._max_network_retries = max_network_retries
+
+    @property
+    def base_addresses(self):
+        return self._parent.base_addresses
+
+    @property
+    def api_key(self):
+        return self._api_key if self._api_key is not None else self._parent.api_key
+
+    @property
+    def max_network_retries(self):
+        return self._max_network_retries if self._max_network_retries is not None else self._parent.max_network_retries
+
+    @property
+    def priority(self):
+        return self._parent.priority
@@ -0,0 +1,88 @@
+import threading
+import time
+from typing import Callable
+
+from khipu_tools import _fork
+
+
+class RetryBudget:
+    """
+    Caps retries to a share of the traffic a client actually sends, so that a
+    Khipu incident doesn't get multiplied by every caller retrying at once.
+
+    Over a sliding window of `ttl` seconds a client may retry
+    `min_retries_per_second * ttl + ratio * requests` times. With the defaults
+    a quiet client can still retry a handful of calls, while a busy one adds at
+    most 20% extra load.
+    """
+
+    def __init__(
+        self,
+        ratio: float = 0.2,
+        min_retries_per_second: float = 1.0,
+        ttl: int = 10,
+        _clock: Callable[[], float] = time.monotonic,
+    ):
+        if ratio < 0:
+            raise ValueError("ratio must be >= 0")
+        if ttl < 1:
+            raise ValueError("ttl must be at least one second")
+
+        self.ratio = ratio
+        self.min_retries_per_second = min_retries_per_second
+        self.ttl = int(ttl)
+        self._clock = _clock
+        self._lock = threading.Lock()
+        self._stamps = [-1] * self.ttl
+        self._requests = [0] * self.ttl
+        self._retries = [0] * self.ttl
+        _fork.register(self)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+
+    def _slot(self) -> int:
+        second = int(self._clock())
+        slot = second % self.ttl
+        if self._stamps[slot] != second:
+            self._stamps[slot] = second
+            self._requests[slot] = 0
+            self._retries[slot] = 0
+        return slot
+
+    def _totals(self) -> tuple[int, int]:
+        oldest = int(self._clock()) - self.ttl
+        requests = retries = 0
+        for stamp, req, ret in zip(self._stamps, self._requests, self._retries):
+            if stamp > oldest:
+                requests += req
+                retries += ret
+        return requests, retries
+
+    def record_request(self) -> None:
+        """Counts a first attempt, which earns `ratio` retries."""
+        with self._lock:
+            self._requests[self._slot()] += 1
+
+    def try_acquire(self) -> bool:
+        """Takes one retry from the budget, returning False when it's spent."""
+        with self._lock:
+            slot = self._slot()
+            requests, retries = self._totals()
+            allowed = self.min_retries_per_second * self.ttl + self.ratio * requests
+            if retries + 1 > allowed:
+                return False
+            self._retries[slot] += 1
+            return True
+
+    def available(self) -> float:
+        with self._lock:
+            self._slot()
+            requests, retries = self._totals()
+            return max(0.0, self.min_retries_per_second * self.ttl + self.ratio * requests - retries)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stamps = [-1] * self.ttl
+            self._requests = [0] * self.ttl
+            self._retries = [0] * self.ttl
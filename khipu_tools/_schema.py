@@ -0,0 +1,248 @@
+import datetime
+import re
+from collections.abc import Iterable, Mapping
+from decimal import Decimal
+from typing import Any, Callable, Literal, Optional, Union
+from urllib.parse import quote_plus
+
+from dateutil.parser import isoparse
+from typing_extensions import NotRequired, Required, get_args, get_origin
+
+from khipu_tools._error import InvalidRequestError
+from khipu_tools._request_options import _OPTION_KEYS
+
+Currency = Literal["CLP", "CLF", "ARS", "PEN", "MXN", "USD", "EUR", "BOB", "COP"]
+
+# Decimal places Khipu accepts in amounts of each currency.
+CURRENCY_DECIMALS: dict[str, int] = {"CLP": 0, "CLF": 4}
+_DEFAULT_DECIMALS = 2
+
+_AMOUNT = re.compile(r"\d+(?:\.(\d+))?")
+# Characters quote_plus leaves as they are.
+_UNRESERVED = re.compile(r"[A-Za-z0-9_.~-]*")
+
+_Check = Callable[[str, Any], None]
+Rule = Callable[[Mapping[str, Any]], None]
+
+
+class _EncodedParams(dict):
+    """
+    Params already checked and flattened by a `ParamSchema`: every value is
+    a string, number or bool, so they go in a query string as they are.
+    """
+
+    def query(self) -> str:
+        # Same output as urlencode, without quoting what needs no quoting.
+        return "&".join([f"{_quote(key)}={_quote(value)}" for key, value in self.items()])
+
+
+def _quote(value: Any) -> str:
+    text = value if isinstance(value, str) else str(value)
+    return text if _UNRESERVED.fullmatch(text) else quote_plus(text)
+
+
+def _invalid(param: str, message: str) -> InvalidRequestError:
+    return InvalidRequestError(message, param)
+
+
+def _check_type(types: tuple[type, ...], label: str) -> _Check:
+    def check(name: str, value: Any) -> None:
+        # bool is an int, but never a valid amount or count.
+        if not isinstance(value, types) or (isinstance(value, bool) and bool not in types):
+            raise _invalid(name, f"Invalid {name} {value!r}: expected {label}.")
+
+    return check
+
+
+def _check_literal(allowed: tuple[Any, ...]) -> _Check:
+    choices = frozenset(allowed)
+
+    def check(name: str, value: Any) -> None:
+        if value not in choices:
+            raise _invalid(name, f"Invalid {name} {value!r}: expected one of {', '.join(map(str, allowed))}.")
+
+    return check
+
+
+def _compile_check(hint: Any) -> Optional[_Check]:
+    """
+    The check for one annotation, or None for annotations that aren't
+    checked (forward references, nested types).
+    """
+    origin = get_origin(hint)
+    if origin is Union:
+        checks = [_compile_check(arg) for arg in get_args(hint) if arg is not type(None)]
+        return checks[0] if len(checks) == 1 else None
+    if origin is Literal:
+        return _check_literal(get_args(hint))
+    if hint is str:
+        return _check_type((str,), "a string")
+    if hint is bool:
+        return _check_type((bool,), "true or false")
+    if hint is int:
+        return _check_type((int,), "an integer")
+    return None
+
+
+def _unwrap(hint: Any) -> tuple[Any, bool]:
+    """
+    The annotation without NotRequired/Required, and whether the key must
+    be given: keys marked NotRequired or that accept None can be left out.
+    """
+    origin = get_origin(hint)
+    if origin is NotRequired:
+        return get_args(hint)[0], False
+    if origin is Required:
+        hint = get_args(hint)[0]
+    optional = get_origin(hint) is Union and type(None) in get_args(hint)
+    return hint, not optional
+
+
+def _encode_value(name: str, value: Any) -> Any:
+    if isinstance(value, datetime.date):
+        # Khipu takes dates in ISO-8601, and a datetime without an offset
+        # would be read in Khipu's time zone, not the caller's.
+        if isinstance(value, datetime.datetime) and value.utcoffset() is None:
+            raise _invalid(name, f"Invalid {name} {value!r}: the datetime needs a timezone (tzinfo).")
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return format(value, "f")
+    return value
+
+
+class ParamSchema:
+    """
+    Checks and encodes the params of a resource method. It is compiled once
+    from the method's TypedDict: a check per field from its annotation, the
+    required keys, and `rules` for constraints between fields. `checks`
+    replaces the check of a field.
+
+    `encode` runs in a single pass over the params and raises
+    `InvalidRequestError` naming the first bad param, before anything is
+    sent. Keys the schema doesn't know pass through unchecked, so params
+    added to the API later can still be sent.
+    """
+
+    def __init__(
+        self,
+        typed_dict: type,
+        rules: Iterable[Rule] = (),
+        checks: Optional[Mapping[str, _Check]] = None,
+    ):
+        self._checks: dict[str, _Check] = {}
+        required = []
+        for name, hint in typed_dict.__annotations__.items():
+            if name in _OPTION_KEYS:
+                continue
+            hint, is_required = _unwrap(hint)
+            if is_required:
+                required.append(name)
+            check = (checks or {}).get(name) or _compile_check(hint)
+            if check is not None:
+                self._checks[name] = check
+        self._required = tuple(required)
+        self._rules = tuple(rules)
+
+    def encode_fields(self, params: Mapping[str, Any]) -> tuple[dict[str, Any], bool]:
+        """
+        Checks and encodes each param on its own, leaving out the required
+        keys and the rules. Returns the params and whether they are flat.
+        """
+        encoded = _EncodedParams()
+        flat = True
+        checks = self._checks
+        for name, value in params.items():
+            if value is None:
+                continue
+            check = checks.get(name)
+            if check is not None:
+                check(name, value)
+            elif isinstance(value, (dict, list, tuple)):
+                flat = False
+            encoded[name] = _encode_value(name, value)
+        return encoded, flat
+
+    def encode(self, params: Mapping[str, Any], base: Optional[Mapping[str, Any]] = None) -> dict[str, Any]:
+        """
+        `base` holds params encoded earlier that will be sent along with
+        these, and counts for the required keys and the rules.
+        """
+        encoded, flat = self.encode_fields(params)
+        for name in self._required:
+            if name not in encoded and (base is None or name not in base):
+                raise _invalid(name, f"Missing required param {name}.")
+        if self._rules:
+            merged = encoded if base is None else {**base, **encoded}
+            for rule in self._rules:
+                rule(merged)
+        # Nested values of unknown keys need the generic encoding.
+        return encoded if flat else dict(encoded)
+
+
+def check_amount(name: str, value: Any) -> None:
+    """
+    A positive amount given as a string, an integer or a Decimal, with '.'
+    as the decimal separator and no thousands separator.
+    """
+    if isinstance(value, bool) or not isinstance(value, (str, int, float, Decimal)):
+        raise _invalid(name, f"Invalid {name} {value!r}: expected a number or a numeric string.")
+    if isinstance(value, int):
+        if value <= 0:
+            raise _invalid(name, f"Invalid {name} {value!r}: expected a positive number.")
+        return
+    text = value if isinstance(value, str) else format(value, "f") if isinstance(value, Decimal) else repr(value)
+    # The pattern only lets digits and a dot through: anything else but
+    # zeros and the dot makes it positive.
+    if _AMOUNT.fullmatch(text) is None or not text.strip("0."):
+        raise _invalid(name, f"Invalid {name} {value!r}: expected a positive number like '1000' or '10.50'.")
+
+
+def check_date(name: str, value: Any) -> None:
+    """
+    A date as an ISO-8601 string, or as a `date` or a timezone-aware
+    `datetime`, which is sent in ISO-8601.
+    """
+    if isinstance(value, datetime.date):
+        return
+    if isinstance(value, str):
+        try:
+            isoparse(value)
+            return
+        except (ValueError, OverflowError):
+            pass
+    raise _invalid(name, f"Invalid {name} {value!r}: expected an ISO-8601 string or a datetime.")
+
+
+def amount_precision(params: Mapping[str, Any]) -> None:
+    """
+    Amounts may not have more decimal places than their currency: none for
+    CLP, 4 for CLF and 2 for the others.
+    """
+    amount = params.get("amount")
+    if amount is None or isinstance(amount, int):
+        return
+    places = _AMOUNT.fullmatch(amount if isinstance(amount, str) else str(amount))
+    decimals = len((places.group(1) or "").rstrip("0")) if places else 0
+    currency = params.get("currency")
+    allowed = CURRENCY_DECIMALS.get(currency, _DEFAULT_DECIMALS)
+    if decimals > allowed:
+        raise _invalid(
+            "amount",
+            f"Invalid amount {amount!r}: {currency} amounts take at most {allowed} decimal places.",
+        )
+
+
+def required_with(field: str, required: Iterable[str], when: Callable[[Any], bool] = bool) -> Rule:
+    """
+    A rule requiring the `required` params when `when(params[field])` holds,
+    by default when `field` is given and truthy.
+    """
+    required = tuple(required)
+
+    def rule(params: Mapping[str, Any]) -> None:
+        if field in params and when(params[field]):
+            for name in required:
+                if name not in params:
+                    raise _invalid(name, f"Missing param {name}, required when {field} is {params[field]!r}.")
+
+    return rule
@@ -0,0 +1,127 @@
+import os
+import socket
+import ssl
+import threading
+import weakref
+from typing import Any, Optional, TypedDict
+
+import requests
+
+from khipu_tools import _fork
+
+
+class TLSStats(TypedDict):
+    full_handshakes: int
+    """TLS handshakes that negotiated a new session."""
+    resumed_handshakes: int
+    """TLS handshakes that resumed a session from an earlier connection."""
+    resumption_rate: float
+    """Share of handshakes that were resumed, between 0 and 1."""
+
+
+class _ResumingSSLContext(ssl.SSLContext):
+    """
+    SSLContext that remembers the last TLS session per host and offers it
+    when a new connection to that host is opened, so a pool that replaces
+    connections pays an abbreviated handshake instead of a full one.
+    """
+
+    def __init__(self, protocol: int = ssl.PROTOCOL_TLS_CLIENT):
+        # SSLContext is set up in __new__, this only adds our own state.
+        self._sessions: dict[tuple[str, int], ssl.SSLSession] = {}
+        self._latest: dict[tuple[str, int], "weakref.ref[ssl.SSLSocket]"] = {}
+        self._full_handshakes = 0
+        self._resumed_handshakes = 0
+        self._sessions_lock = threading.Lock()
+        _fork.register(self)
+
+    def _after_fork(self) -> None:
+        # Sessions are plain data and stay valid in the child.
+        self._sessions_lock = threading.Lock()
+
+    def wrap_socket(self, sock, *args, server_hostname=None, session=None, **kwargs):  # type: ignore[override]
+        key = _session_key(sock, server_hostname)
+        if session is None and key is not None:
+            # The newest connection to the host may have received a ticket
+            # since it was stored; clients without a pool hook rely on this.
+            latest = self._latest.get(key)
+            if latest is not None:
+                self.remember(latest())
+            session = self._sessions.get(key)
+        ssl_sock = super().wrap_socket(sock, *args, server_hostname=server_hostname, session=session, **kwargs)
+        with self._sessions_lock:
+            if ssl_sock.session_reused:
+                self._resumed_handshakes += 1
+            else:
+                self._full_handshakes += 1
+            if key is not None:
+                self._latest[key] = weakref.ref(ssl_sock)
+        self.remember(ssl_sock)
+        return ssl_sock
+
+    def remember(self, ssl_sock: Any) -> None:
+        """
+        Stores the session of `ssl_sock` for the next connection to its host.
+        TLS 1.3 servers send their tickets after the handshake, so this is
+        called again when a connection goes back to the pool.
+        """
+        if not isinstance(ssl_sock, ssl.SSLSocket):
+            return
+        key = _session_key(ssl_sock, ssl_sock.server_hostname)
+        if key is None:
+            return
+        try:
+            session = ssl_sock.session
+        except (OSError, ValueError):
+            return
+        if session is None:
+            return
+        with self._sessions_lock:
+            current = self._sessions.get(key)
+            # Don't replace a session that carries a ticket with one that doesn't (yet).
+            if current is None or session.has_ticket or not current.has_ticket:
+                self._sessions[key] = session
+
+    def stats(self) -> TLSStats:
+        with self._sessions_lock:
+            full, resumed = self._full_handshakes, self._resumed_handshakes
+        total = full + resumed
+        return {
+            "full_handshakes": full,
+            "resumed_handshakes": resumed,
+            "resumption_rate": resumed / total if total else 0.0,
+        }
+
+
+def _session_key(sock: socket.socket, server_hostname: Optional[str]) -> Optional[tuple[str, int]]:
+    if not server_hostname:
+        return None
+    try:
+        port = sock.getpeername()[1]
+    except (OSError, IndexError):
+        return None
+    return server_hostname, port
+
+
+def create_ssl_context(cafile: Optional[str] = None) -> _ResumingSSLContext:
+    """
+    Client-side context trusting `cafile`, a CA bundle or a directory of
+    certificates (certifi's bundle by default), with TLS 1.2 as the minimum
+    and session resumption enabled. Loading the CAs is the expensive part,
+    so each HTTP client builds one and shares it across its connections.
+    """
+    context = _ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.options |= ssl.OP_NO_COMPRESSION
+    cafile = cafile or requests.certs.where()
+    if os.path.isdir(cafile):
+        context.load_verify_locations(capath=cafile)
+    else:
+        context.load_verify_locations(cafile)
+    return context
+
+
+def tls_stats(context: Optional[ssl.SSLContext]) -> TLSStats:
+    if isinstance(context, _ResumingSSLContext):
+        return context.stats()
+    return {"full_handshakes": 0, "resumed_handshakes": 0, "resumption_rate": 0.0}
@@ -9,13 +9,14 @@ from typing import (
     TYPE_CHECKING,
     Any,
     Dict,
+    Literal,
     Optional,
     TypeVar,
     Union,
     cast,
     overload,
 )
-from urllib.parse import parse_qsl, quote_plus
+from urllib.parse import parse_qsl, quote_plus, urlsplit
 
 import typing_extensions
 
@@ -45,7 +46,20 @@ def _console_log_level():
         return None
 
 
+def log_enabled(level: Literal["debug", "info"]) -> bool:
+    """
+    Whether a message at `level` goes anywhere, to the console or to the
+    "khipu" logger. Callers check it before building what they log.
+    """
+    console = _console_log_level()
+    if console == "debug" or console == level:
+        return True
+    return logger.isEnabledFor(logging.DEBUG if level == "debug" else logging.INFO)
+
+
 def log_debug(message, **params):
+    if not log_enabled("debug"):
+        return
     msg = logfmt(dict(message=message, **params))
     if _console_log_level() == "debug":
         print(msg, file=sys.stderr)
@@ -53,12 +67,17 @@ def log_debug(message, **params):
 
 
 def log_info(message, **params):
+    if not log_enabled("info"):
+        return
     msg = logfmt(dict(message=message, **params))
     if _console_log_level() in ["debug", "info"]:
         print(msg, file=sys.stderr)
     logger.info(msg)
 
 
+_WHITESPACE = re.compile(r"\s")
+
+
 def logfmt(props):
     def fmt(key, val):
         # Handle case where val is a bytes or bytesarray
@@ -70,10 +89,10 @@ def logfmt(props):
         # translated incorrectly.
         if not isinstance(val, str):
             val = str(val)
-        if re.search(r"\s", val):
+        if _WHITESPACE.search(val):
             val = repr(val)
         # key should already be a string
-        if re.search(r"\s", key):
+        if _WHITESPACE.search(key):
             key = repr(key)
         return f"{key}={val}"
 
@@ -288,6 +307,17 @@ def get_api_mode(url):
     return "V3"
 
 
+def get_route(url: str) -> str:
+    """
+    Groups an absolute URL by base address and endpoint, dropping ids and the
+    query string: `https://host/v3/payments/abc/refunds?x=1` becomes
+    `https://host/v3/payments`.
+    """
+    scheme, netloc, path, _, _ = urlsplit(url)
+    segments = path.split("/", 3)[1:3]
+    return "{}://{}/{}".format(scheme, netloc, "/".join(segments))
+
+
 class class_method_variant:
     def __init__(self, class_method_name):
         self.class_method_name = class_method_name
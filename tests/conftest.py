@@ -0,0 +1,72 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import khipu_tools
+
+
+class KhipuHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, code, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def do_GET(self):
+        self.server.requests.append(("GET", self.path, dict(self.headers), None))
+        if self.path.startswith("/v3/banks"):
+            self._reply(200, {"banks": [{"bank_id": "SDdGj", "name": "Banco Estado"}]})
+        elif self.path.startswith("/v3/predict"):
+            self._reply(200, {"result": "ok", "max_amount": 5000000})
+        elif self.path.startswith("/v3/payments/"):
+            self._reply(200, {"payment_id": self.path.rsplit("/", 1)[-1], "status": "pending"})
+        else:
+            self._reply(404, {"message": "not found"})
+
+    def do_POST(self):
+        body = self._read_body()
+        self.server.requests.append(("POST", self.path, dict(self.headers), body))
+        if self.path.endswith("/refunds"):
+            self._reply(200, {"message": "refunded"})
+        else:
+            self._reply(201, {"payment_id": "gqzdy6chjne9", "payment_url": "https://khipu.com/payment/info/x"})
+
+    def do_DELETE(self):
+        self.server.requests.append(("DELETE", self.path, dict(self.headers), None))
+        self._reply(200, {"message": "deleted"})
+
+
+@pytest.fixture
+def khipu_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KhipuHandler)
+    server.daemon_threads = True
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def khipu_api(khipu_server, monkeypatch):
+    """Points the module level configuration at the local server."""
+    monkeypatch.setattr(khipu_tools, "api_key", "test-key")
+    monkeypatch.setattr(khipu_tools, "api_base", "http://127.0.0.1:%d" % khipu_server.server_port)
+    monkeypatch.setattr(khipu_tools, "default_http_client", None)
+    yield khipu_server
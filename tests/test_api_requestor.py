@@ -0,0 +1,85 @@
+import datetime
+import json
+
+import pytest
+
+import khipu_tools
+from khipu_tools._api_requestor import _APIRequestor
+from khipu_tools._error import RateLimitError
+from khipu_tools._protocol import build_request, parse_response, to_khipu_object
+
+
+def test_requestors_and_headers_are_reused_across_calls(khipu_api):
+    requestor = _APIRequestor._global_instance()
+    assert requestor._replace_options({}) is requestor
+    other = requestor._replace_options({"api_key": "other-key"})
+    assert requestor._replace_options({"api_key": "other-key"}) is other
+
+    khipu_tools.Payments.get(payment_id="pay1")
+    khipu_tools.Payments.get(payment_id="pay2", api_key="other-key", headers={"X-Trace": "abc"})
+    khipu_tools.Banks.get()
+
+    (_, path, first, _), (_, _, second, _), (_, _, third, _) = khipu_api.requests
+    assert path == "/v3/payments/pay1"
+    assert first["x-api-key"] == third["x-api-key"] == "test-key"
+    assert second["x-api-key"] == "other-key" and second["X-Trace"] == "abc"
+    assert "X-Trace" not in third
+    assert requestor.request_headers("get", "V3", {"api_key": "test-key"}) is requestor.request_headers(
+        "get", "V3", {"api_key": "test-key"}
+    )
+
+    khipu_tools.set_app_info("tienda", version="1.0")
+    try:
+        khipu_tools.Banks.get()
+    finally:
+        khipu_tools.app_info = None
+    assert khipu_api.requests[-1][2]["User-Agent"].endswith(" tienda/1.0")
+
+
+class _RecordingCodec(khipu_tools.StdlibJSONCodec):
+    name = "recording"
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def dumps(self, value):
+        self.calls.append("dumps")
+        return super().dumps(value).encode("utf-8")
+
+    def loads(self, body):
+        self.calls.append("loads")
+        return super().loads(body)
+
+
+def test_json_codec_is_used_both_ways_and_dates_are_sent_in_iso_8601(khipu_api, monkeypatch):
+    codec = _RecordingCodec()
+    monkeypatch.setattr(khipu_tools, "json_codec", codec)
+    expires = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+    payment = khipu_tools.Payments.create(amount=1000, currency="CLP", subject="Prueba", expires_date=expires)
+    khipu_tools.Banks.get()
+
+    assert payment.payment_id == "gqzdy6chjne9"
+    assert codec.calls == ["dumps", "loads", "loads"]
+    (_, _, _, body), (method, path, _, _) = khipu_api.requests
+    assert json.loads(body)["expires_date"] == "2025-01-01T00:00:00+00:00"
+    assert (method, path) == ("GET", "/v3/banks")
+
+
+def test_protocol_builds_and_parses_without_an_http_client(monkeypatch):
+    monkeypatch.setattr(khipu_tools, "api_key", "test-key")
+    options = _APIRequestor._global_instance()._options
+    request = build_request(
+        options, "get", "/v3/payments/pay1", {"foo": "a b"}, {"timeout": 5}, base_address="api", api_mode="V3"
+    )
+
+    assert (request.method, request.body, request.payload) == ("get", None, "foo=a+b")
+    assert request.url == "https://payment-api.khipu.com/v3/payments/pay1?foo=a+b"
+    assert request.headers["x-api-key"] == "test-key"
+    assert request.deadline is not None
+
+    payment = to_khipu_object(request, parse_response('{"payment_id": "pay1"}', 200, {}), _APIRequestor())
+    assert payment.payment_id == "pay1"
+    with pytest.raises(RateLimitError):
+        parse_response('{"message": "slow down"}', 429, {})
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+import khipu_tools
+
+pytest.importorskip("httpx")
+
+
+def test_async_resources_share_fallback_client(khipu_api):
+    async def run():
+        return await asyncio.gather(
+            khipu_tools.Banks.get_async(),
+            khipu_tools.Predict.get_async(payer_email="a@b.cl", bank_id="SDdGj", amount="1000", currency="CLP"),
+            khipu_tools.Payments.create_async(amount="1000", currency="CLP", subject="Prueba"),
+            *[khipu_tools.Payments.get_async(payment_id="pay%d" % i) for i in range(20)],
+        )
+
+    banks, predict, payment, *payments = asyncio.run(run())
+
+    assert banks.banks[0]["bank_id"] == "SDdGj"
+    assert predict.result == "ok"
+    assert payment.payment_id == "gqzdy6chjne9"
+    assert [p.payment_id for p in payments] == ["pay%d" % i for i in range(20)]
+    assert isinstance(khipu_tools.default_http_client._async_fallback_client, khipu_tools.HTTPXClient)
+
+
+def test_async_khipu_client_raw_request(khipu_server):
+    async def run():
+        async with khipu_tools.AsyncKhipuClient(
+            "test-key",
+            base_addresses={"api": "http://127.0.0.1:%d" % khipu_server.server_port},
+        ) as client:
+            return await client.raw_request_async("delete", "/v3/payments/abc")
+
+    resp = asyncio.run(run())
+
+    assert resp.code == 200
+    assert resp.data == {"message": "deleted"}
+    assert khipu_server.requests[-1][0] == "DELETE"
+    assert khipu_server.requests[-1][2]["x-api-key"] == "test-key"
+
+
+def _recording(method, used):
+    def call(*args, **kwargs):
+        used.append(method.__name__)
+        return method(*args, **kwargs)
+
+    return call
+
+
+def test_http2_setting_sends_sync_and_async_calls_through_one_httpx_client(khipu_api, monkeypatch):
+    pytest.importorskip("h2")
+    monkeypatch.setattr(khipu_tools, "http2", True)
+    client = khipu_tools.ensure_default_http_client()
+    assert isinstance(client, khipu_tools.HTTPXClient) and client._client_kwargs["http2"] is True
+    used = []
+    monkeypatch.setattr(client, "request", _recording(client.request, used))
+    monkeypatch.setattr(client, "request_async", _recording(client.request_async, used))
+
+    khipu_tools.Banks.get()
+    asyncio.run(khipu_tools.Banks.get_async())
+
+    assert used == ["request", "request_async"]
+    assert len(khipu_api.requests) == 2
+    assert isinstance(
+        khipu_tools.KhipuClient("key", http2=True)._requestor._get_http_client(), khipu_tools.HTTPXClient
+    )
+
+
+def test_http2_client_maps_or_rejects_requests_pool_options():
+    pytest.importorskip("h2")
+    client = khipu_tools.new_default_http_client(http2=True, pool_maxsize=4)
+    assert client._client_kwargs["limits"].max_connections == 4
+
+    with pytest.raises(TypeError, match="pool_block"):
+        khipu_tools.new_default_http_client(http2=True, pool_block=True)
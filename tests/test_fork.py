@@ -0,0 +1,73 @@
+import os
+import signal
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import khipu_tools
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+
+
+def _fork(work):
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            work()
+            code = 0
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            os._exit(code)
+    return pid
+
+
+def _wait(pid, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            return os.waitstatus_to_exitcode(status) if hasattr(os, "waitstatus_to_exitcode") else status
+        time.sleep(0.05)
+    os.kill(pid, signal.SIGKILL)
+    os.waitpid(pid, 0)
+    return "timeout"
+
+
+def test_forked_workers_start_with_fresh_pools(khipu_api):
+    # The "master" initializes everything before forking, like a preloaded app.
+    khipu_tools.Banks.get()
+    client = khipu_tools.default_http_client
+    parent_session = client._get_session()
+
+    # Keep the parent busy so locks and connections are in use while forking.
+    stop = threading.Event()
+
+    def hammer_parent():
+        while not stop.is_set():
+            khipu_tools.Banks.get()
+
+    background = threading.Thread(target=hammer_parent, daemon=True)
+    background.start()
+
+    def worker():
+        assert khipu_tools._APIRequestor._instance is None
+        assert client._get_session() is not parent_session
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            payments = list(executor.map(lambda i: khipu_tools.Payments.get(payment_id="pay%d" % i), range(40)))
+        assert [p.payment_id for p in payments] == ["pay%d" % i for i in range(40)]
+        assert client.pool_stats()["checkouts"] == 40
+
+    try:
+        pids = [_fork(worker) for _ in range(4)]
+        assert [_wait(pid) for pid in pids] == [0, 0, 0, 0]
+    finally:
+        stop.set()
+        background.join()
+
+    assert client._get_session() is parent_session
+    assert khipu_tools.Banks.get().banks[0]["bank_id"] == "SDdGj"
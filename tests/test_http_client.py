@@ -0,0 +1,542 @@
+import gzip
+import random
+import shutil
+import socket
+import ssl
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import khipu_tools
+from khipu_tools._adaptive_timeouts import AdaptiveTimeouts
+from khipu_tools._circuit_breaker import CircuitBreaker
+from khipu_tools._compression import DEFAULT_ACCEPT_ENCODING, CompressionPolicy
+from khipu_tools._concurrency import AdaptiveConcurrencyLimiter
+from khipu_tools._deadline import Deadline
+from khipu_tools._dns import DNSCache
+from khipu_tools._error import (
+    APIConnectionError,
+    CircuitBreakerOpenError,
+    ConcurrencyLimitExceededError,
+    DeadlineExceededError,
+    RateLimitError,
+)
+from khipu_tools._hedging import HedgePolicy
+from khipu_tools._latency import LatencyHistogram
+from khipu_tools._protocol import request_headers
+from khipu_tools._http_client import HTTPClient, HTTPXClient, RequestsClient, Urllib3Client
+from khipu_tools._retry import RetryBudget
+from khipu_tools._tls import create_ssl_context
+from khipu_tools._util import get_route
+from tests.conftest import KhipuHandler
+
+
+def test_requests_client_shares_one_pool_across_threads(khipu_server):
+    client = RequestsClient(pool_maxsize=4, pool_block=True)
+    url = "http://127.0.0.1:%d/v3/banks" % khipu_server.server_port
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: client.request("get", url, {}), range(40)))
+
+    assert all(code == 200 for _, code, _ in results)
+    stats = client.pool_stats()
+    assert stats["checkouts"] == 40
+    assert stats["in_use"] == 0
+    assert 1 <= stats["idle"] <= 4
+
+    client.close()
+    assert client.pool_stats()["open"] == 0
+
+
+def test_urllib3_client_reuses_pooled_connections_and_maps_errors(khipu_server):
+    client = Urllib3Client(pool_maxsize=2)
+    url = "http://127.0.0.1:%d/v3/banks" % khipu_server.server_port
+
+    results = [client.request("get", url, {}) for _ in range(5)]
+
+    assert all(code == 200 for _, code, _ in results)
+    assert results[0][2]["Content-Type"] == "application/json"
+    assert client.pool_stats()["idle"] == 1
+    client.close()
+
+    with pytest.raises(APIConnectionError) as exc_info:
+        client.request("get", "http://127.0.0.1:1/v3/banks", {}, timeout=1)
+    assert exc_info.value.should_retry
+
+
+def test_warmup_resolves_once_and_opens_idle_connections(khipu_server):
+    lookups = []
+
+    def resolver(host, port, *args):
+        lookups.append(host)
+        return socket.getaddrinfo("127.0.0.1", port, *args)
+
+    cache = DNSCache(refresh=False, _resolver=resolver)
+    client = RequestsClient(pool_maxsize=4, dns_cache=cache)
+    url = "http://khipu.test:%d/v3/banks" % khipu_server.server_port
+
+    assert client.warmup([url], connections=3) == 3
+    assert client.pool_stats()["idle"] == 3
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        results = list(executor.map(lambda _: client.request("get", url, {}), range(9)))
+    assert all(code == 200 for _, code, _ in results)
+    assert lookups == ["khipu.test"]
+    client.close()
+
+
+class DropsReusedConnections(KhipuHandler):
+    """Answers the first request of each connection and hangs up on the next one."""
+
+    served = 0
+
+    def _serve(self, handler):
+        if self.served:
+            self._read_body()
+            self.server.dropped.append(self.command)
+            self.close_connection = True
+            return
+        self.served += 1
+        handler(self)
+
+    def do_GET(self):
+        self._serve(KhipuHandler.do_GET)
+
+    def do_POST(self):
+        self._serve(KhipuHandler.do_POST)
+
+
+@pytest.fixture
+def dropping_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DropsReusedConnections)
+    server.daemon_threads = True
+    server.requests = []
+    server.dropped = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("client_class", [RequestsClient, Urllib3Client])
+def test_idempotent_calls_are_replayed_once_after_a_reset(dropping_server, client_class):
+    client = client_class()
+    base = "http://127.0.0.1:%d" % dropping_server.server_port
+
+    for _ in range(3):
+        _, code, _ = client.request_with_retries("get", base + "/v3/banks", {})
+        assert code == 200
+    assert client.pool_stats()["replays"] == 2
+
+    with pytest.raises(APIConnectionError) as exc_info:
+        client.request_with_retries("post", base + "/v3/payments", {}, b"amount=1000")
+    assert exc_info.value.connection_reset
+    # Each GET was replayed once, the POST was sent once and not replayed.
+    assert dropping_server.dropped == ["GET", "GET", "POST"]
+    client.close()
+
+
+def test_connections_idle_longer_than_max_idle_are_reopened(khipu_server):
+    client = Urllib3Client(max_idle=0.05, tcp_keepalive=30)
+    url = "http://127.0.0.1:%d/v3/banks" % khipu_server.server_port
+
+    client.request("get", url, {})
+    client.request("get", url, {})
+    time.sleep(0.1)
+    client.request("get", url, {})
+
+    stats = client.pool_stats()
+    assert stats["stale_closed"] == 1
+    assert stats["replays"] == 0
+    client.close()
+
+
+@pytest.fixture(scope="module")
+def tls_server(tmp_path_factory):
+    if shutil.which("openssl") is None:
+        pytest.skip("needs the openssl command to make a certificate")
+    directory = tmp_path_factory.mktemp("tls")
+    cert, key = str(directory / "cert.pem"), str(directory / "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=127.0.0.1"]
+        + ["-addext", "subjectAltName=IP:127.0.0.1", "-keyout", key, "-out", cert],
+        check=True,
+        capture_output=True,
+    )
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KhipuHandler)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    server.daemon_threads = True
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server, cert
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("client_class", [RequestsClient, Urllib3Client])
+def test_new_connections_resume_the_tls_session(tls_server, client_class):
+    server, cafile = tls_server
+    context = create_ssl_context(cafile)
+    client = client_class(ssl_context=context)
+    url = "https://127.0.0.1:%d/v3/banks" % server.server_port
+
+    for _ in range(3):
+        _, code, _ = client.request("get", url, {})
+        assert code == 200
+        # Drop the pooled connection so the next call opens a new one.
+        client.close()
+
+    assert client.tls_stats() == {"full_handshakes": 1, "resumed_handshakes": 2, "resumption_rate": 2 / 3}
+
+
+def test_calls_fail_over_to_a_healthy_endpoint(khipu_api, monkeypatch):
+    alive = khipu_tools.api_base
+    endpoints = khipu_tools.EndpointSet(["http://127.0.0.1:1", alive], failure_threshold=1)
+    monkeypatch.setattr(khipu_tools, "api_base", endpoints)
+    monkeypatch.setattr(khipu_tools, "max_network_retries", 0)
+    # Pick in list order, so the dead endpoint is tried first.
+    monkeypatch.setattr(random, "sample", lambda population, k: population[:k])
+
+    # Nothing could be sent to the dead endpoint, so even a POST moves on.
+    payment = khipu_tools.Payments.create(amount="1000", currency="CLP", subject="Prueba")
+    banks = [khipu_tools.Banks.get() for _ in range(5)]
+
+    assert payment.payment_id == "gqzdy6chjne9"
+    assert all(b.banks[0]["bank_id"] == "SDdGj" for b in banks)
+    stats = endpoints.stats()
+    assert stats["http://127.0.0.1:1"]["healthy"] is False
+    assert stats["http://127.0.0.1:1"]["failures"] == 1
+    assert stats[alive]["requests"] == 6
+    assert stats[alive]["latency"] is not None
+
+
+def test_local_shedding_and_post_gateway_errors_do_not_fail_over(monkeypatch):
+    endpoints = khipu_tools.EndpointSet(["https://a.example.test", "https://b.example.test"], failure_threshold=1)
+    monkeypatch.setattr(khipu_tools, "api_key", "test-key")
+    monkeypatch.setattr(khipu_tools, "api_base", endpoints)
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_queue=0)
+    limiter.acquire()
+    client = ScriptedClient([(b'{"message": "unavailable"}', 503, {})], concurrency_limiter=limiter)
+    monkeypatch.setattr(khipu_tools, "default_http_client", client)
+
+    for _ in range(3):
+        with pytest.raises(ConcurrencyLimitExceededError):
+            khipu_tools.Banks.get()
+    assert all(stats["healthy"] for stats in endpoints.stats().values())
+
+    limiter.release(0.01, True)
+    khipu_tools.Payments.create(amount="1000", currency="CLP", subject="Prueba")
+    assert client.calls == 1
+
+
+class ScriptedClient(HTTPClient):
+    name = "scripted"
+
+    def __init__(self, outcomes, **kwargs):
+        super().__init__(**kwargs)
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self.timeouts = []
+        self.read_timeouts = []
+
+    def request(self, method, url, headers, post_data=None, timeout=None, read_timeout=None):
+        self.calls += 1
+        self.sent = (headers, post_data)
+        self.timeouts.append(timeout)
+        self.read_timeouts.append(read_timeout)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(time, "sleep", recorded.append)
+    return recorded
+
+
+def test_retries_idempotent_calls_on_retryable_status(sleeps):
+    client = ScriptedClient([(b"", 503, {}), (b"", 429, {"retry-after": "3"}), (b"{}", 200, {})])
+
+    _, code, _ = client.request_with_retries("get", "https://example.test/v3/banks", {}, max_network_retries=2)
+
+    assert code == 200
+    assert client.calls == 3
+    assert sleeps[1] == 3
+
+
+def test_post_is_not_replayed_after_ambiguous_failures(sleeps):
+    client = ScriptedClient([APIConnectionError("reset", should_retry=True), (b"", 502, {})])
+
+    with pytest.raises(APIConnectionError):
+        client.request_with_retries("post", "https://example.test/v3/payments", {}, max_network_retries=3)
+    _, code, _ = client.request_with_retries("post", "https://example.test/v3/payments", {}, max_network_retries=3)
+
+    assert code == 502
+    assert client.calls == 2
+    assert sleeps == []
+
+
+def test_retry_budget_stops_retry_storms(sleeps):
+    budget = RetryBudget(ratio=0.0, min_retries_per_second=0.1, ttl=10)
+    client = ScriptedClient([(b"", 503, {})] * 10, retry_budget=budget)
+
+    for _ in range(3):
+        client.request_with_retries("get", "https://example.test/v3/banks", {}, max_network_retries=2)
+
+    # one retry allowed by the budget, then every call gets a single attempt
+    assert client.calls == 4
+
+
+def test_deadline_caps_attempts_and_skips_retries_that_cannot_finish(sleeps):
+    url = "https://example.test/v3/payments"
+    client = ScriptedClient([(b"", 503, {"retry-after": "3"}), (b"{}", 201, {})])
+
+    _, code, _ = client.request_with_retries("post", url, {}, max_network_retries=2, deadline=Deadline.from_options(2))
+
+    assert code == 503
+    assert client.calls == 1
+    assert 0 < client.timeouts[0] <= 2
+    assert sleeps == []
+
+    with pytest.raises(DeadlineExceededError):
+        client.request_with_retries("post", url, {}, deadline=Deadline(time.monotonic() - 1))
+    assert client.calls == 1
+
+
+def test_adaptive_read_timeout_follows_route_latency():
+    url = "https://example.test/v3/banks"
+    timeouts = AdaptiveTimeouts(multiplier=3, min_timeout=0.01, min_samples=5, refresh_every=1)
+    client = ScriptedClient([(b"{}", 200, {})] * 2, adaptive_timeouts=timeouts)
+
+    client.request_with_retries("get", url, {})
+    assert client.read_timeouts == [None]
+
+    for _ in range(5):
+        client._latencies.record(get_route(url), 0.1)
+    client.request_with_retries("get", url, {})
+    assert client.read_timeouts[-1] == pytest.approx(0.3, rel=0.05)
+
+    restored = AdaptiveTimeouts()
+    restored.load(timeouts.snapshot())
+    assert restored.read_timeout(get_route(url), LatencyHistogram()) == pytest.approx(1.0)
+
+
+def test_large_bodies_are_gzipped_once_and_reused_by_retries(sleeps):
+    compression = CompressionPolicy(accept_encoding="gzip", request_threshold=100)
+    client = ScriptedClient([(b"", 503, {}), (b"{}", 201, {})] * 2, compression=compression)
+    body = '{"custom": "%s"}' % ("<item>cart</item>" * 50)
+
+    client.request_with_retries("post", "https://example.test/v3/payments", {}, body, max_network_retries=1)
+    headers, post_data = client.sent
+    assert headers == {"Accept-Encoding": "gzip", "Content-Encoding": "gzip"}
+    assert gzip.decompress(post_data).decode("utf-8") == body
+    assert len(post_data) < len(body) / 5
+
+    client.request_with_retries("post", "https://example.test/v3/payments", {}, '{"amount": 1}', max_network_retries=1)
+    assert client.sent == ({"Accept-Encoding": "gzip"}, '{"amount": 1}')
+
+
+def test_default_compression_leaves_the_shared_headers_alone(khipu_server):
+    headers = request_headers("test-key")
+    assert CompressionPolicy().apply(headers, '{"amount": 1}')[0] is headers
+
+    client = Urllib3Client()
+    url = "http://127.0.0.1:%d/v3/banks" % khipu_server.server_port
+    client.request_with_retries("get", url, headers)
+    client.close()
+
+    assert khipu_server.requests[-1][2]["Accept-Encoding"] == DEFAULT_ACCEPT_ENCODING
+
+
+def test_circuit_breaker_is_per_route_and_probes_when_half_open():
+    now = [0.0]
+    changes = []
+    breaker = CircuitBreaker(
+        minimum_calls=3, open_duration=5, on_state_change=lambda *c: changes.append(c), _clock=lambda: now[0]
+    )
+    client = ScriptedClient([(b"", 500, {})] * 3 + [(b"{}", 200, {})] * 2, circuit_breaker=breaker)
+    payments = "https://example.test/v3/payments/abc"
+
+    for _ in range(3):
+        client.request_with_retries("get", payments, {}, max_network_retries=0)
+    with pytest.raises(CircuitBreakerOpenError) as excinfo:
+        client.request_with_retries("get", payments, {}, max_network_retries=0)
+
+    assert excinfo.value.route == "https://example.test/v3/payments"
+    assert client.calls == 3
+    assert client.request_with_retries("get", "https://example.test/v3/banks", {})[1] == 200
+
+    now[0] = 6.0
+    assert client.request_with_retries("get", payments, {})[1] == 200
+    assert breaker.state("https://example.test/v3/payments") == "closed"
+    assert [c[1:] for c in changes] == [("closed", "open"), ("open", "half_open"), ("half_open", "closed")]
+
+
+class SlowFirstClient(HTTPClient):
+    name = "slow-first"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.calls = 0
+
+    def request(self, method, url, headers, post_data=None):
+        self.calls += 1
+        if self.calls == 1:
+            time.sleep(0.5)
+            return b"slow", 200, {}
+        return b"fast", 200, {}
+
+    async def request_async(self, method, url, headers, post_data=None):
+        import anyio
+
+        self.calls += 1
+        if self.calls == 1:
+            await anyio.sleep(0.5)
+            return b"slow", 200, {}
+        return b"fast", 200, {}
+
+
+def _warm(client, url):
+    for _ in range(20):
+        client._latencies.record(get_route(url), 0.005)
+
+
+def test_hedged_get_returns_the_first_answer():
+    client = SlowFirstClient(hedge_policy=HedgePolicy())
+    url = "https://example.test/v3/payments/abc"
+    _warm(client, url)
+
+    started = time.monotonic()
+    body, _, _ = client.request_with_retries("get", url, {})
+
+    assert body == b"fast"
+    assert client.calls == 2
+    assert time.monotonic() - started < 0.4
+
+
+def test_hedged_get_async_cancels_the_loser():
+    anyio = pytest.importorskip("anyio")
+    client = SlowFirstClient(hedge_policy=HedgePolicy())
+    url = "https://example.test/v3/payments/abc"
+    _warm(client, url)
+
+    body, _, _ = anyio.run(client.request_with_retries_async, "get", url, {})
+
+    assert body == b"fast"
+    assert client.calls == 2
+
+
+def test_adaptive_concurrency_grows_on_flat_latency_and_backs_off():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2, max_queue=0)
+
+    limiter.acquire()
+    limiter.acquire()
+    with pytest.raises(ConcurrencyLimitExceededError):
+        limiter.acquire()
+    assert (limiter.in_flight, limiter.queue_depth) == (2, 0)
+
+    limiter.release(0.01, True)
+    limiter.release(0.01, True)
+    assert limiter.limit == 3
+
+    limiter.acquire()
+    limiter.release(0.5, True)
+    assert limiter.limit == 2
+
+
+def test_client_sheds_requests_over_the_concurrency_limit():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_wait=0.05)
+    client = SlowFirstClient(concurrency_limiter=limiter)
+    url = "https://example.test/v3/banks"
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        slow = executor.submit(client.request_with_retries, "get", url, {})
+        time.sleep(0.1)
+        with pytest.raises(ConcurrencyLimitExceededError):
+            client.request_with_retries("get", url, {})
+        assert slow.result()[0] == b"slow"
+
+
+def test_concurrency_slot_is_held_per_attempt_not_through_backoff(monkeypatch):
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=4)
+    releases = []
+    release = limiter.release
+    monkeypatch.setattr(
+        limiter, "release", lambda latency, success: (releases.append(success), release(latency, success))
+    )
+    in_flight_while_sleeping = []
+    monkeypatch.setattr(time, "sleep", lambda seconds: in_flight_while_sleeping.append(limiter.in_flight))
+    client = ScriptedClient([(b"", 429, {"retry-after": "1"}), (b"{}", 200, {})], concurrency_limiter=limiter)
+
+    _, code, _ = client.request_with_retries("get", "https://example.test/v3/banks", {}, max_network_retries=1)
+
+    assert code == 200
+    assert in_flight_while_sleeping == [0]
+    assert releases == [False, True]
+    assert limiter.in_flight == 0
+
+
+def test_circuit_breaker_fast_fails_leave_the_concurrency_limit_alone():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=18)
+    breaker = CircuitBreaker(minimum_calls=1, open_duration=60)
+    client = ScriptedClient([(b"", 500, {})], circuit_breaker=breaker, concurrency_limiter=limiter)
+    url = "https://example.test/v3/banks"
+    client.request_with_retries("get", url, {}, max_network_retries=0)
+    limit = limiter.limit
+
+    for _ in range(20):
+        with pytest.raises(CircuitBreakerOpenError):
+            client.request_with_retries("get", url, {}, max_network_retries=0)
+
+    assert limiter.limit == limit
+    assert limiter.in_flight == 0
+
+
+def test_calls_are_not_retried_unless_asked(monkeypatch, sleeps):
+    client = ScriptedClient([(b'{"message": "busy"}', 429, {})] * 4 + [(b'{"message": "unavailable"}', 503, {})])
+    monkeypatch.setattr(khipu_tools, "api_key", "test-key")
+    monkeypatch.setattr(khipu_tools, "default_http_client", client)
+
+    with pytest.raises(RateLimitError):
+        khipu_tools.Payments.create(amount="1000", currency="CLP", subject="Prueba")
+    assert client.calls == 1
+
+    with pytest.raises(RateLimitError):
+        khipu_tools.Payments.create(amount="1000", currency="CLP", subject="Prueba", max_network_retries=2)
+    assert client.calls == 4
+
+    # A 503 may have been processed behind a proxy, so a POST isn't sent again.
+    khipu_tools.Payments.create(amount="1000", currency="CLP", subject="Prueba", max_network_retries=2)
+    assert client.calls == 5
+
+
+def test_httpx_client_close_closes_both_transports(khipu_server):
+    anyio = pytest.importorskip("anyio")
+    pytest.importorskip("httpx")
+    url = "http://127.0.0.1:%d/v3/banks" % khipu_server.server_port
+
+    shared = HTTPXClient(allow_sync_methods=True, hedge_policy=HedgePolicy())
+    shared.request("get", url, {})
+    shared._get_hedge_executor()
+
+    async def use_and_close():
+        await shared.request_async("get", url, {})
+        await shared.close_async()
+
+    anyio.run(use_and_close)
+    assert shared._client.is_closed and shared._client_async.is_closed
+    assert shared._hedge_executor is None
+
+    sync = HTTPXClient(allow_sync_methods=True)
+    sync.request("get", url, {})
+    sync.close()
+    assert sync._client.is_closed and sync._client_async.is_closed
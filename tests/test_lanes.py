@@ -0,0 +1,58 @@
+import threading
+import time
+
+import pytest
+
+import khipu_tools
+from khipu_tools._error import ConcurrencyLimitExceededError
+from khipu_tools._lanes import Lane, PriorityLanes
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_low_priority_lane_is_shed_or_delayed_while_checkout_queues():
+    lanes = PriorityLanes(
+        [
+            Lane("checkout", max_concurrency=1),
+            Lane("reports", max_concurrency=4),
+            Lane("batch", max_concurrency=4, on_backlog="shed"),
+        ]
+    )
+    held = lanes.acquire("checkout")
+    waiter = threading.Thread(target=lambda: lanes.release(lanes.acquire("checkout")))
+    waiter.start()
+    _wait_for(lambda: lanes.stats()["checkout"]["queued"] == 1)
+
+    with pytest.raises(ConcurrencyLimitExceededError):
+        lanes.acquire("batch")
+    delayed = []
+    reporter = threading.Thread(target=lambda: delayed.append(lanes.acquire("reports")))
+    reporter.start()
+    time.sleep(0.05)
+    assert delayed == []
+
+    lanes.release(held)
+    waiter.join()
+    reporter.join()
+    assert [lane.name for lane in delayed] == ["reports"]
+    lanes.release(lanes.acquire("batch"))
+    assert lanes.stats()["batch"] == {"in_flight": 0, "queued": 0, "shed": 1}
+
+
+def test_calls_use_the_pool_of_their_lane(khipu_api, monkeypatch):
+    lanes = PriorityLanes([Lane("checkout", max_concurrency=2), Lane("batch", max_concurrency=1)])
+    monkeypatch.setattr(khipu_tools, "priority_lanes", lanes)
+
+    khipu_tools.Payments.create(amount="1000", currency="CLP", subject="Prueba")
+    for i in range(3):
+        khipu_tools.Payments.get(payment_id="pay%d" % i, priority="batch")
+
+    assert lanes.lane("checkout").http_client.pool_stats()["checkouts"] == 1
+    assert lanes.lane("batch").http_client.pool_stats()["checkouts"] == 3
+    assert khipu_tools.default_http_client is None
+    lanes.close()
@@ -0,0 +1,28 @@
+import logging
+
+import khipu_tools
+from khipu_tools import _util
+from khipu_tools._log_policy import LogPolicy
+
+
+def test_nothing_is_formatted_while_logging_is_off(khipu_api, monkeypatch):
+    def fail(props):
+        raise AssertionError("formatted a log line while logging is off")
+
+    monkeypatch.setattr(_util, "logfmt", fail)
+    khipu_tools.Payments.create(amount=1000, currency="CLP", subject="Prueba", payer_email="ana@example.cl")
+
+
+def test_calls_are_sampled_redacted_and_truncated(khipu_api, monkeypatch, caplog):
+    monkeypatch.setattr(khipu_tools, "log_policy", LogPolicy(sample_rates={"/v3/banks": 0.0}, max_body=40))
+    caplog.set_level(logging.DEBUG, logger="khipu")
+
+    khipu_tools.Banks.get()
+    khipu_tools.Payments.create(amount=1000, currency="CLP", subject="Prueba", payer_email="ana@example.cl")
+    khipu_tools.Predict.get(payer_email="ana@example.cl", bank_id="SDdGj", amount="1000", currency="CLP")
+
+    logged = "\n".join(record.getMessage() for record in caplog.records if record.name == "khipu")
+    assert "/v3/banks" not in logged
+    assert "ana@example.cl" not in logged
+    assert 'post_data=\'{"amount": 1000, "currency": "CLP", "sub...(85 chars)\'' in logged
+    assert "payer_email=[redacted]&bank_id=SDdGj" in logged
@@ -0,0 +1,66 @@
+import khipu_tools
+from khipu_tools._middleware import Middleware, MiddlewareChain
+
+
+class _Signing(Middleware):
+    def __init__(self):
+        self.seen = []
+
+    def handle(self, request, call_next):
+        try:
+            answer = call_next(request._replace(headers={**request.headers, "X-Signature": "firma"}))
+        except Exception as e:
+            self.seen.append(type(e).__name__)
+            raise
+        self.seen.append(answer[1])
+        return answer
+
+
+class _Cache(Middleware):
+    name = "cache"
+
+    def __init__(self):
+        self.cached = {}
+
+    def handle(self, request, call_next):
+        if request.method == "get" and request.url in self.cached:
+            return self.cached[request.url]
+        answer = self.cached[request.url] = call_next(request)
+        return answer
+
+
+def test_middleware_runs_in_order_and_can_short_circuit(khipu_api, monkeypatch):
+    signing, cache = _Signing(), _Cache()
+    chain = MiddlewareChain([signing, cache])
+    monkeypatch.setattr(khipu_tools, "middleware", chain)
+
+    first = khipu_tools.Payments.get(payment_id="pay1")
+    second = khipu_tools.Payments.get(payment_id="pay1")
+
+    assert first.payment_id == second.payment_id
+    assert len(khipu_api.requests) == 1
+    assert khipu_api.requests[0][2]["X-Signature"] == "firma"
+    assert signing.seen == [200, 200]
+    stats = chain.stats()
+    assert list(stats) == ["_Signing", "cache"]
+    assert stats["cache"]["samples"] == 2 and stats["cache"]["p50"] < 0.5
+    for payment in (first, second):
+        assert set(payment.last_response.timings) == {"_Signing", "cache"}
+        assert all(0 <= spent < 0.5 for spent in payment.last_response.timings.values())
+
+
+def test_client_middleware_replaces_the_global_chain(khipu_api, monkeypatch):
+    monkeypatch.setattr(khipu_tools, "middleware", MiddlewareChain([_Cache()]))
+    signing = _Signing()
+    client = khipu_tools.KhipuClient(
+        "client-key",
+        base_addresses={"api": "http://127.0.0.1:%d" % khipu_api.server_port},
+        middleware=MiddlewareChain([signing]),
+    )
+
+    client.raw_request("get", "/v3/banks")
+    response = client.raw_request("get", "/v3/banks")
+
+    assert signing.seen == [200, 200]
+    assert len(khipu_api.requests) == 2
+    assert list(response.timings) == ["_Signing"]
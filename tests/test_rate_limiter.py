@@ -0,0 +1,60 @@
+import pytest
+
+from khipu_tools._api_requestor import _APIRequestor
+from khipu_tools._error import RateLimitError
+from khipu_tools._rate_limiter import RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_buckets_are_per_api_key_and_can_reject_immediately():
+    clock = FakeClock()
+    limiter = RateLimiter(rate=2, burst=2, block=False, _clock=clock)
+
+    limiter.acquire("key-a")
+    limiter.acquire("key-a")
+    with pytest.raises(RateLimitError):
+        limiter.acquire("key-a")
+    limiter.acquire("key-b")
+
+    clock.now += 0.5
+    limiter.acquire("key-a")
+
+
+def test_headers_pause_and_slow_down_the_bucket():
+    clock = FakeClock()
+    limiter = RateLimiter(rate=100, burst=10, block=False, _clock=clock)
+
+    limiter.update_from_headers("key", 429, {"retry-after": "2"})
+    with pytest.raises(RateLimitError):
+        limiter.acquire("key")
+    clock.now += 2.5
+    limiter.acquire("key")
+
+    # 5 requests left for the next 10 seconds, then one every 2 seconds
+    limiter.update_from_headers("key", 200, {"x-ratelimit-remaining": "5", "x-ratelimit-reset": "10"})
+    for _ in range(5):
+        limiter.acquire("key")
+    with pytest.raises(RateLimitError):
+        limiter.acquire("key")
+    clock.now += 1
+    with pytest.raises(RateLimitError):
+        limiter.acquire("key")
+    clock.now += 1
+    limiter.acquire("key")
+
+
+def test_429_is_raised_as_rate_limit_error():
+    requestor = _APIRequestor()
+
+    with pytest.raises(RateLimitError) as excinfo:
+        requestor._interpret_response(b'{"message": "slow down"}', 429, {"retry-after": "1"}, "V3")
+
+    assert excinfo.value.http_status == 429
+    assert excinfo.value.user_message == "slow down"
@@ -0,0 +1,78 @@
+import datetime
+import json
+from decimal import Decimal
+
+import pytest
+
+import khipu_tools
+from khipu_tools._error import InvalidRequestError
+
+
+@pytest.mark.parametrize(
+    "params, param",
+    [
+        ({"amount": "1000", "currency": "XXX", "subject": "Prueba"}, "currency"),
+        ({"amount": "1000.5", "currency": "CLP", "subject": "Prueba"}, "amount"),
+        ({"amount": "10.12345", "currency": "CLF", "subject": "Prueba"}, "amount"),
+        ({"amount": "1.000,50", "currency": "USD", "subject": "Prueba"}, "amount"),
+        ({"amount": True, "currency": "USD", "subject": "Prueba"}, "amount"),
+        ({"amount": "1000", "currency": "CLP"}, "subject"),
+        (
+            {"amount": "1000", "currency": "CLP", "subject": "Prueba", "send_email": True, "payer_name": "Ana"},
+            "payer_email",
+        ),
+        ({"amount": "1000", "currency": "CLP", "subject": "Prueba", "send_email": "yes"}, "send_email"),
+        ({"amount": "1000", "currency": "CLP", "subject": datetime.datetime(2025, 1, 1)}, "subject"),
+        ({"amount": "1000", "currency": "CLP", "subject": "Prueba", "expires_date": 1735689600}, "expires_date"),
+        ({"amount": "1000", "currency": "CLP", "subject": "Prueba", "expires_date": "not a date"}, "expires_date"),
+        (
+            {"amount": "1000", "currency": "CLP", "subject": "Prueba", "expires_date": datetime.datetime(2025, 1, 1)},
+            "expires_date",
+        ),
+    ],
+)
+def test_invalid_payments_fail_before_reaching_khipu(khipu_api, params, param):
+    with pytest.raises(InvalidRequestError) as exc_info:
+        khipu_tools.Payments.create(**params)
+
+    assert exc_info.value.param == param
+    assert khipu_api.requests == []
+
+
+def test_valid_params_are_encoded_once(khipu_api):
+    khipu_tools.Payments.create(amount=Decimal("10.50"), currency="USD", subject="Prueba", body=None)
+    khipu_tools.Payments.create(amount="1000.00", currency="CLP", subject="Prueba", send_email=False)
+    khipu_tools.Predict.get(payer_email="ana@example.cl", bank_id="SDdGj", amount=1000, currency="CLP")
+
+    (_, _, _, first), (_, _, _, second), (_, path, _, _) = khipu_api.requests
+    assert first == b'{"amount": "10.50", "currency": "USD", "subject": "Prueba"}'
+    assert second == b'{"amount": "1000.00", "currency": "CLP", "subject": "Prueba", "send_email": false}'
+    assert path == "/v3/predict?payer_email=ana%40example.cl&bank_id=SDdGj&amount=1000&currency=CLP"
+
+
+def test_prepared_payments_only_encode_the_fields_that_change(khipu_api, monkeypatch):
+    template = khipu_tools.Payments.prepare(currency="CLP", subject="Suscripción", send_email=True, payer_name="Ana")
+
+    template.send(amount="9990", transaction_id="sub-1", payer_email="ana@example.cl")
+    monkeypatch.setattr(khipu_tools, "api_key", "rotated-key")
+    template.send(amount="9990", transaction_id="sub-2", payer_email="ana@example.cl", subject="Otro", timeout=5)
+    with pytest.raises(InvalidRequestError) as exc_info:
+        template.send(amount="9990.5", transaction_id="sub-3", payer_email="ana@example.cl")
+    with pytest.raises(InvalidRequestError):
+        template.send(amount="9990", transaction_id="sub-4")
+
+    assert exc_info.value.param == "amount"
+    first, second = [json.loads(body) for _, _, _, body in khipu_api.requests]
+    assert first == {
+        "currency": "CLP",
+        "subject": "Suscripción",
+        "send_email": True,
+        "payer_name": "Ana",
+        "amount": "9990",
+        "transaction_id": "sub-1",
+        "payer_email": "ana@example.cl",
+    }
+    assert second == {**first, "subject": "Otro", "transaction_id": "sub-2"}
+    call = template._prepare_call({"amount": "9990", "transaction_id": "sub-5", "payer_email": "ana@example.cl"})
+    assert call.params == {**first, "transaction_id": "sub-5"}
+    assert [headers["x-api-key"] for _, _, headers, _ in khipu_api.requests] == ["test-key", "rotated-key"]